@@ -7,87 +7,868 @@ Contains fixtures and configuration for the test suite.
 """
 
 import os
+import html
+import base64
 import pytest
 import logging
-from datetime import datetime
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("tv2play_samsung_test.log"),
-        logging.StreamHandler()
-    ]
-)
+from tvqa import workers, scheduler, replay, devtools_log, cache_modes, device_profiles, screenshots, artifacts, logs
+from tvqa import commands, phases
+from tvqa.browser_pool import BrowserPool, instrumentation_hooks
+from tvqa.platforms import PLATFORMS
+from tvqa.readiness import AppReadiness
+from tvqa.replay import HarRecorder, ReplayServer
+from tvqa.perf_collector import PerfCollector
+from tvqa.perf_store import PerfStore, MIN_CURRENT, format_verdict, run_mode
+from tvqa.visual_diff import VisualDiff, BASELINES_DIR, format_result
+from tvqa.responsive import ResponsiveSweep
+from tvqa.remote import RemoteControl, latency_table
+from tvqa.crawler import FocusCrawler, MAX_STATES
+from tvqa import playback
+from tvqa.playback import PlaybackMonitor, StreamServer
+from tvqa import soak
+from tvqa.soak import SoakRun
+from tvqa import tracing
+from tvqa.tracing import TraceRecorder
+from tvqa import network
+from tvqa.network import NetworkRecorder
+from tvqa.drivers import DriverService, DRIVER_CACHE_DIR
 
 logger = logging.getLogger(__name__)
 
+# Per-test wall time (setup + call + teardown) of this run, keyed by node id
+test_durations = {}
+
+# Chrome trace summaries of the tests run by this process
+trace_summaries = []
+
+# Performance verdicts of this run against the rolling baseline
+perf_verdicts_key = pytest.StashKey()
+
+# Summary of the Chrome trace recorded for a test
+trace_summary_key = pytest.StashKey()
+
+# User agent of the Samsung TV browser used by the chrome_driver fixture
+SAMSUNG_USER_AGENT = PLATFORMS["samsung"]["user_agent"]
+
+def pytest_addoption(parser):
+    """Command line options for the shared browser infrastructure."""
+    group = parser.getgroup("tvqa", "TV 2 Play test infrastructure")
+    group.addoption("--pool-size", type=int, default=1,
+                    help="Number of warm browsers launched per worker (default: 1)")
+    group.addoption("--headless", action="store_true",
+                    help="Run pooled browsers in headless mode")
+    group.addoption("--durations-path", default=scheduler.DURATIONS_PATH,
+                    help="JSON store of per-test durations used by the scheduler")
+    group.addoption("--record", action="store_true",
+                    help="Record every HTTP exchange of the browsers into the replay archive")
+    group.addoption("--replay", action="store_true",
+                    help="Serve the apps from the replay archive instead of the network")
+    group.addoption("--replay-dir", default=replay.ARCHIVE_DIR,
+                    help=f"Directory of recorded HAR archives (default: {replay.ARCHIVE_DIR})")
+    group.addoption("--replay-latency-ms", type=float, default=0,
+                    help="Artificial latency added to every replayed response")
+    group.addoption("--replay-bandwidth-kbps", type=float, default=None,
+                    help="Artificial bandwidth limit of the replay server")
+    group.addoption("--cache-mode", choices=["cold", "warm", "both"], default="both",
+                    help="Cache state for load measurements (default: both, side by side)")
+    group.addoption("--perf-history", default="artifacts/perf_history.sqlite",
+                    help="SQLite store of performance samples from previous runs")
+    group.addoption("--app-build", default=os.environ.get("APP_BUILD", "unknown"),
+                    help="Build identifier of the app under test (default: $APP_BUILD)")
+    group.addoption("--baseline-runs", type=int, default=20,
+                    help="Number of previous runs forming the performance baseline (default: 20)")
+    group.addoption("--perf-alpha", type=float, default=0.05,
+                    help="Significance level of the performance regression test (default: 0.05)")
+    group.addoption("--perf-gate", action="store_true",
+                    help="Fail the run when a significant performance regression is found")
+    group.addoption("--perf-min-samples", type=int, default=MIN_CURRENT,
+                    help="Samples a metric series needs in this run before it is compared with the baseline "
+                         f"(default: {MIN_CURRENT})")
+    group.addoption("--no-perf-compare", action="store_true",
+                    help="Store performance samples without comparing them; the caller compares the whole run "
+                         "(used by run_tests.py --parallel)")
+    group.addoption("--ready-timeout", type=float, default=20,
+                    help="Seconds to wait for the app to become ready (default: 20)")
+    group.addoption("--network-idle-ms", type=int, default=500,
+                    help="Quiet network period that counts as idle (default: 500)")
+    group.addoption("--dom-idle-ms", type=int, default=300,
+                    help="Period without DOM mutations that counts as idle (default: 300)")
+    group.addoption("--device-profile", choices=["auto", "none", *device_profiles.PROFILES], default="auto",
+                    help="Device profile performance tests run under: the platform's own (auto, default), "
+                         "a named profile, or none for an unthrottled desktop browser")
+    group.addoption("--baselines-dir", default=BASELINES_DIR,
+                    help=f"Directory of visual baselines per platform and resolution (default: {BASELINES_DIR})")
+    group.addoption("--update-baselines", action="store_true",
+                    help="Store the captures of this run as the new visual baselines")
+    group.addoption("--visual-gate", action="store_true",
+                    help="Fail tests whose captures differ from the visual baselines")
+    group.addoption("--parallel-sweep", action="store_true",
+                    help="Spread responsive sweep resolutions over the other pooled browsers (needs --pool-size > 1)")
+    group.addoption("--crawl", action="store_true",
+                    help="Run the focus-graph crawl of every app (skipped otherwise)")
+    group.addoption("--full-crawl", action="store_true",
+                    help="Crawl from scratch instead of only re-exploring changed states")
+    group.addoption("--crawl-max-states", type=int, default=MAX_STATES,
+                    help=f"Upper bound on the states a crawl visits (default: {MAX_STATES})")
+    group.addoption("--test-stream", default=playback.STREAM_PATH,
+                    help=f"Local video served to the playback tests, generated if missing "
+                         f"(default: {playback.STREAM_PATH})")
+    group.addoption("--qoe-gate", action="store_true",
+                    help="Fail playback tests that exceed their platform's QoE budget")
+    group.addoption("--soak", action="store_true",
+                    help="Run the soak tests: repeat navigation loops and fail on memory growth")
+    group.addoption("--soak-minutes", type=float, default=None,
+                    help="Length of every soak run (default: a fixed number of iterations)")
+    group.addoption("--soak-iterations", type=int, default=soak.ITERATIONS,
+                    help=f"Navigation loops per soak run without --soak-minutes (default: {soak.ITERATIONS})")
+    group.addoption("--soak-sample-every", type=int, default=1,
+                    help="Sample memory every N navigation loops")
+    group.addoption("--chrome-trace", action="store_true",
+                    help="Record a Chrome performance trace of every browser test and summarise it in the report")
+    group.addoption("--driver-cache-dir", default=DRIVER_CACHE_DIR,
+                    help=f"Where chromedriver binaries are cached per Chrome build (default: {DRIVER_CACHE_DIR})")
+    group.addoption("--keep-uncompressed", type=int, default=artifacts.KEEP_UNCOMPRESSED,
+                    help=f"Number of recent runs whose artifacts stay uncompressed (default: {artifacts.KEEP_UNCOMPRESSED})")
+    group.addoption("--artifact-max-age-days", type=float, default=artifacts.MAX_AGE_DAYS,
+                    help=f"Delete run artifacts older than this (default: {artifacts.MAX_AGE_DAYS})")
+    group.addoption("--artifact-budget-mb", type=float, default=artifacts.MAX_BYTES / 1024 ** 2,
+                    help="Delete the oldest run artifacts while all runs take more than this")
+    group.addoption("--no-retention", action="store_true",
+                    help="Do not compress or delete old run artifacts at startup")
+
+def runs_tests(config):
+    """False for invocations that run no tests (--collect-only, --help), which must not start a run."""
+    return not (config.getoption("collectonly") or config.getoption("help"))
+
+def pytest_configure(config):
+    """Open the run's artifact directory, start the screenshot writer, and the replay
+    server before test modules resolve their app URLs."""
+    if not runs_tests(config):
+        return
+    store = artifacts.install(config)
+    run_id = workers.run_id(config)
+    store.start_run(run_id)
+    # Every process logs to its own JSON-lines file; the terminal output comes from pytest's live logging
+    logs.install(os.path.join(store.run_dir(run_id), "logs"), level=config.getoption("log_level") or logging.INFO)
+    if not workers.is_worker(config) and not config.getoption("--no-retention"):
+        store.apply_retention(
+            keep_uncompressed=config.getoption("--keep-uncompressed"),
+            max_age_days=config.getoption("--artifact-max-age-days"),
+            max_bytes=config.getoption("--artifact-budget-mb") * 1024 ** 2,
+            current_run=run_id
+        )
+    screenshots.install(
+        config,
+        root=os.path.join(store.run_dir(run_id), "screenshots"),
+        listeners=[lambda entry: store.add(run_id, entry["kind"], entry["path"], test=entry["test"],
+                                           platform=entry["platform"], digest=entry["hash"])]
+    )
+    # Each test's wall time is split into phases, partly from the timed WebDriver commands
+    clock = phases.install()
+    config.add_cleanup(phases.uninstall)
+    commands.install(config, listeners=[clock.command])
+    if config.getoption("--replay"):
+        server = ReplayServer(
+            archive_dir=config.getoption("--replay-dir"),
+            latency_ms=config.getoption("--replay-latency-ms"),
+            bandwidth_kbps=config.getoption("--replay-bandwidth-kbps")
+        ).start()
+        replay.activate(server)
+        config.add_cleanup(server.stop)
+        config.add_cleanup(lambda: replay.activate(None))
+
 @pytest.fixture(scope="session")
-def create_screenshots_dir():
-    """Create a directory for storing screenshots if it doesn't exist."""
-    screenshots_dir = "screenshots"
-    if not os.path.exists(screenshots_dir):
-        os.makedirs(screenshots_dir)
+def create_screenshots_dir(request):
+    """Create the screenshot directory of this run if it doesn't exist."""
+    store = artifacts.store(request.config)
+    screenshots_dir = os.path.join(store.run_dir(workers.run_id(request.config)), "screenshots")
+    os.makedirs(screenshots_dir, exist_ok=True)
     return screenshots_dir
 
-@pytest.fixture(scope="class")
-def chrome_driver():
-    """Provides a configured Chrome WebDriver instance."""
-    logger.info("Setting up Chrome WebDriver")
-
-    # Configure Chrome options
-    chrome_options = Options()
-    chrome_options.add_argument("--window-size=1920,1080")
-    chrome_options.add_argument("--disable-extensions")
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-
-    # For headless mode, uncomment the line below
-    # chrome_options.add_argument("--headless")
-
-    # Set user agent to simulate Samsung TV browser
-    chrome_options.add_argument("--user-agent=Mozilla/5.0 (SMART-TV; SAMSUNG; SmartTV; en) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/69.0.3497.106 Safari/537.36")
-
-    # Initialize the Chrome driver
-    driver = webdriver.Chrome(
-        service=Service(ChromeDriverManager().install()),
-        options=chrome_options
+@pytest.fixture(scope="session")
+def screenshot_service(request):
+    """Background, deduplicating screenshot writer of this session."""
+    return screenshots.service(request.config)
+
+@pytest.fixture(scope="session")
+def visual_diff(request):
+    """Compares captures with the per-platform, per-resolution baselines."""
+    config = request.config
+    run_id = workers.run_id(config)
+    store = artifacts.store(config)
+    engine = VisualDiff(
+        baselines_dir=config.getoption("--baselines-dir"),
+        diffs_dir=os.path.join(store.run_dir(run_id), "visual_diffs"),
+        update=config.getoption("--update-baselines"),
+        fail_on_mismatch=config.getoption("--visual-gate")
+    )
+
+    yield engine
+
+    for result in engine.results:
+        if result["diff"]:
+            store.add(run_id, "visual_diff", result["diff"], test=result["test"], platform=result["platform"])
+    workers.share(config, "visual_diff", [
+        {key: result[key] for key in ("status", "elapsed")} for result in engine.results
+    ])
+
+@pytest.fixture(scope="session")
+def app_ready(request):
+    """Readiness engine used instead of fixed sleeps after navigation."""
+    config = request.config
+    readiness = AppReadiness(
+        timeout=config.getoption("--ready-timeout"),
+        network_idle_ms=config.getoption("--network-idle-ms"),
+        dom_idle_ms=config.getoption("--dom-idle-ms")
+    )
+
+    yield readiness
+
+    workers.share(config, "app_ready", readiness.stats())
+
+@pytest.fixture(scope="session")
+def perf_store(request):
+    """History of performance samples used by the regression gate, recorded under this session's mode."""
+    config = request.config
+    mode = run_mode(
+        replay=config.getoption("--replay"),
+        latency_ms=config.getoption("--replay-latency-ms"),
+        bandwidth_kbps=config.getoption("--replay-bandwidth-kbps"),
+        headless=config.getoption("--headless")
     )
+    return PerfStore(config.getoption("--perf-history"), mode=mode)
+
+@pytest.fixture(scope="session")
+def perf_collector(request, perf_store):
+    """Collects one Navigation Timing L2/paint/LCP/CLS/long task record per page load."""
+    config = request.config
+    run_id = workers.run_id(config)
+    store = artifacts.store(config)
+    build = config.getoption("--app-build")
+    collector = PerfCollector(os.path.join(store.run_dir(run_id), "perf"),
+                              listeners=[lambda record: perf_store.add_record(run_id, build, record)])
+
+    yield collector
+
+    if os.path.exists(collector.path):
+        store.add(run_id, "perf", collector.path)
+
+@pytest.fixture(scope="session")
+def device_profile(request):
+    """Returns the device profile (or None) a platform's performance tests run under."""
+    choice = request.config.getoption("--device-profile")
+    return lambda platform: device_profiles.select(platform, choice)
+
+@pytest.fixture(scope="session")
+def playback_monitor(request, perf_store):
+    """Records video QoE (first frame, stalls, dropped frames, seeks) through injected media listeners."""
+    config = request.config
+    run_id = workers.run_id(config)
+    build = config.getoption("--app-build")
+    monitor = PlaybackMonitor(listeners=[lambda record: perf_store.add_record(run_id, build, record)])
+
+    yield monitor
 
-    driver.maximize_window()
+    workers.share(config, "playback", [
+        {key: record[key] for key in ("platform", "metrics", "violations")} for record in monitor.records
+    ])
+
+@pytest.fixture(scope="session")
+def stream_server(request, browser_pool):
+    """Serves the local test stream, encoding it in a pooled browser first if it does not exist yet."""
+    path = request.config.getoption("--test-stream")
+    server = StreamServer(path).start()
+    if not os.path.exists(path):
+        try:
+            with browser_pool.lease() as driver:
+                # The player page is on localhost, a secure context where WebCodecs is available
+                driver.get(server.player_url)
+                playback.generate_stream(driver, path)
+        except Exception as e:
+            server.stop()
+            pytest.skip(f"Test stream {path} not found and could not be generated: {e}")
+
+    yield server
+
+    server.stop()
+
+@pytest.fixture(scope="session")
+def network_recorder(request):
+    """Records network waterfalls of app loads and checks them against the platform budgets."""
+    config = request.config
+    run_id = workers.run_id(config)
+    store = artifacts.store(config)
+    recorder = NetworkRecorder(
+        output_dir=os.path.join(store.run_dir(run_id), "network"),
+        listeners=[lambda result: store.add(run_id, "network", result["path"], test=result["test"],
+                                            platform=result["platform"])]
+    )
+
+    yield recorder
+
+    workers.share(config, "network", [
+        {key: result[key] for key in ("platform", "test", "summary", "violations")} for result in recorder.results
+    ])
+
+@pytest.fixture(scope="session")
+def driver_service(request):
+    """This process's chromedriver, resolved offline from the cache, shared by all its browsers."""
+    config = request.config
+    service = DriverService(cache_dir=config.getoption("--driver-cache-dir")).start()
+
+    yield service
+
+    service.stop()
+    workers.share(config, "driver_service", service.stats())
+
+@pytest.fixture(scope="session")
+def browser_pool(request, app_ready, perf_collector, playback_monitor, network_recorder, driver_service):
+    """Session-wide pool of pre-launched Chrome drivers (one pool per xdist worker)."""
+    config = request.config
+    options_hooks = []
+    release_hooks = []
+
+    recorder = None
+    if config.getoption("--record"):
+        # Only recording needs the Network events of every browser; they are drained after every test
+        recorder = HarRecorder(config.getoption("--replay-dir"))
+        network_recorder.event_listeners.append(recorder.capture)
+        options_hooks.append(devtools_log.enable_performance_log)
+        release_hooks.append(network_recorder.drain)
+
+    pool = BrowserPool(
+        size=config.getoption("--pool-size"),
+        headless=config.getoption("--headless"),
+        options_hooks=options_hooks,
+        launch_hooks=instrumentation_hooks(commands.timer(config), app_ready, perf_collector, playback_monitor),
+        release_hooks=release_hooks,
+        driver_service=driver_service
+    ).start()
+
+    yield pool
+
+    pool.close()
+    workers.share(config, "browser_pool", pool.stats())
+    if recorder is not None:
+        recorder.save()
+
+@pytest.fixture
+def network_driver(browser_pool, network_recorder):
+    """A browser of its own that buffers DevTools Network events, for network waterfalls.
+
+    Pooled browsers run without the performance log so that measured loads do
+    not pay for it.
+    """
+    driver = browser_pool.new_driver(options_hooks=[devtools_log.enable_performance_log])
 
     yield driver
 
-    # Clean up after the test
-    logger.info("Tearing down Chrome WebDriver")
+    # In record mode the HAR recorder receives what the waterfall did not read
+    network_recorder.drain(driver)
     driver.quit()
 
+@pytest.fixture(autouse=True)
+def record_drain(request):
+    """In record mode, hand every test's Network events to the HAR recorder when it ends,
+    instead of letting them pile up over a class lease."""
+    yield
+    if not request.config.getoption("--record") or "browser_pool" not in request.fixturenames:
+        return
+    recorder = request.getfixturevalue("network_recorder")
+    for driver in request.getfixturevalue("browser_pool").leased():
+        recorder.drain(driver)
+
+@pytest.fixture(scope="session")
+def responsive_sweep(request, screenshot_service, app_ready, browser_pool):
+    """Captures layout metrics and screenshots at several resolutions via viewport emulation."""
+    sweep = ResponsiveSweep(screenshot_service, app_ready, browser_pool=browser_pool,
+                            parallel=request.config.getoption("--parallel-sweep"))
+
+    yield sweep
+
+    workers.share(request.config, "responsive", sweep.stats())
+
+@pytest.fixture(scope="session")
+def remote_control(request):
+    """Returns a RemoteControl for (driver, platform); all presses feed the latency summary."""
+    presses = []
+
+    yield lambda driver, platform: RemoteControl(driver, platform, listeners=[presses.append])
+
+    workers.share(request.config, "remote_control", presses)
+
+@pytest.fixture(scope="session")
+def focus_crawler(request, app_ready, remote_control):
+    """Returns a FocusCrawler for (driver, platform, url); skips the test unless --crawl is given."""
+    config = request.config
+    run_id = workers.run_id(config)
+    store = artifacts.store(config)
+    summaries = []
+
+    def crawl(driver, platform, url):
+        if not config.getoption("--crawl"):
+            pytest.skip("focus-graph crawl not requested (use --crawl)")
+        crawler = FocusCrawler(driver, platform, url, app_ready, remote_control(driver, platform),
+                               max_states=config.getoption("--crawl-max-states"))
+        summary = crawler.crawl(incremental=not config.getoption("--full-crawl"))
+        # The graph itself is kept for the next incremental crawl; the run keeps a copy of this one
+        store.add(run_id, "focus_graph", crawler.graph_path, platform=platform, copy=True)
+        summaries.append(summary)
+        return summary
+
+    yield crawl
+
+    workers.share(config, "focus_graph", summaries)
+
+@pytest.fixture(scope="session")
+def soak_run(request):
+    """Returns a function soaking (driver, platform, step, test); skips the test unless --soak is given."""
+    config = request.config
+    run_id = workers.run_id(config)
+    store = artifacts.store(config)
+    results = []
+
+    def run(driver, platform, step, test=None):
+        if not config.getoption("--soak"):
+            pytest.skip("soak run not requested (use --soak)")
+        minutes = config.getoption("--soak-minutes")
+        result = SoakRun(
+            driver, platform, step,
+            duration=minutes * 60 if minutes is not None else None,
+            iterations=config.getoption("--soak-iterations"),
+            sample_every=config.getoption("--soak-sample-every"),
+            snapshots_dir=os.path.join(store.run_dir(run_id), "heap_snapshots")
+        ).run(test=test)
+        for path in result["snapshots"]:
+            store.add(run_id, "heap_snapshot", path, test=test, platform=platform)
+        results.append(result)
+        return result
+
+    yield run
+
+    workers.share(config, "soak", [
+        {key: result[key] for key in ("platform", "test", "iterations", "elapsed", "trends", "leaks")}
+        for result in results
+    ])
+
+@pytest.fixture(autouse=True)
+def chrome_trace(request):
+    """Records a Chrome trace of the test's browser with --chrome-trace, from setup to teardown."""
+    config = request.config
+    driver = None
+    if config.getoption("--chrome-trace"):
+        driver = getattr(request.instance, "driver", None)
+        if driver is None and "driver" in request.fixturenames:
+            driver = request.getfixturevalue("driver")
+    if driver is None:
+        yield None
+        return
+
+    run_id = workers.run_id(config)
+    store = artifacts.store(config)
+    name = "".join(char if char.isalnum() or char in "-_." else "_" for char in request.node.nodeid)
+    recorder = TraceRecorder(driver, os.path.join(store.run_dir(run_id), "traces", f"{name}.json"))
+    try:
+        recorder.start()
+    except Exception as e:
+        logger.warning(f"Could not start a Chrome trace for {request.node.nodeid}: {e}")
+        yield None
+        return
+
+    yield recorder
+
+    try:
+        path = recorder.stop()
+        summary = tracing.summarise(path)
+    except Exception as e:
+        logger.warning(f"Could not record the Chrome trace of {request.node.nodeid}: {e}")
+        return
+    store.add(run_id, "trace", path, test=request.node.nodeid)
+    summary.update(test=request.node.nodeid, path=path)
+    request.node.stash[trace_summary_key] = summary
+    trace_summaries.append({key: summary[key] for key in ("test", "main_thread", "main_thread_total", "long_tasks")})
+    logger.info(f"Trace of {request.node.nodeid}: {tracing.format_summary(summary)}")
+
+@pytest.fixture(scope="session")
+def cache_meter(request, browser_pool, app_ready, perf_collector):
+    """Cold/warm cache load measurements, reported side by side per platform."""
+    mode = request.config.getoption("--cache-mode")
+    meter = cache_modes.CacheModeMeter(
+        browser_pool, app_ready, perf_collector,
+        modes=cache_modes.MODES if mode == "both" else (mode,)
+    )
+
+    yield meter
+
+    workers.share(request.config, "cache_modes", meter.results)
+
+@pytest.fixture(scope="class")
+def chrome_driver(browser_pool):
+    """Provides a warm Chrome WebDriver leased from the browser pool."""
+    logger.info("Leasing Chrome WebDriver from the browser pool")
+
+    with browser_pool.lease(user_agent=SAMSUNG_USER_AGENT) as driver:
+        yield driver
+
+    logger.info("Returned Chrome WebDriver to the browser pool")
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_setup(item):
+    """Tag the log records and WebDriver commands of the test's setup with its id, platform and phase,
+    and account the time of every phase."""
+    platform = logs.platform_of(item)
+    logs.set_context(test=item.nodeid, platform=platform, phase="setup")
+    commands.timer(item.config).test = item.nodeid
+    phases.clock().start_test(item.nodeid, platform)
+    phases.clock().push("setup")
+    yield
+    phases.clock().pop()
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    logs.set_context(phase="call")
+    phases.clock().push("call")
+    yield
+    phases.clock().pop()
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_teardown(item, nextitem):
+    logs.set_context(phase="teardown")
+    phases.clock().push("teardown")
+    yield
+    phases.clock().pop()
+    phases.clock().finish_test()
+    logs.set_context(test=None, platform=None, phase="session")
+    commands.timer(item.config).test = None
+
 @pytest.hookimpl(tryfirst=True, hookwrapper=True)
 def pytest_runtest_makereport(item, call):
     """Hook to take screenshots on test failures."""
     outcome = yield
     report = outcome.get_result()
 
+    if report.when == "call":
+        attach_visual_diffs(item, report)
+        attach_network_waterfalls(item, report)
+
+    # The trace is complete once the test's fixtures are torn down
+    if report.when == "teardown":
+        attach_trace_summary(item, report)
+        attach_command_timings(item, report)
+
     if report.when == "call" and report.failed:
         # Get the driver from the test
         try:
             driver = item.instance.driver
             logger.info(f"Taking screenshot for failed test: {item.name}")
-
-            # Create directory if it doesn't exist
-            screenshots_dir = "screenshots"
-            if not os.path.exists(screenshots_dir):
-                os.makedirs(screenshots_dir)
-
-            timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-            screenshot_path = os.path.join(screenshots_dir, f"failure_{item.name}_{timestamp}.png")
-            driver.save_screenshot(screenshot_path)
-            logger.info(f"Screenshot saved to {screenshot_path}")
+            screenshots.service(item.config).capture(driver, f"failure_{item.name}", test=item.nodeid,
+                                                     kind="failure")
         except Exception as e:
             logger.error(f"Failed to capture screenshot on test failure: {e}")
+
+def attach_visual_diffs(item, report):
+    """Add the highlighted diffs of the test's visual checks to the HTML report."""
+    pytest_html = item.config.pluginmanager.getplugin("html")
+    engine = item.funcargs.get("visual_diff") if hasattr(item, "funcargs") else None
+    if pytest_html is None or engine is None:
+        return
+
+    extras = getattr(report, "extras", [])
+    for result in engine.results_for(item.nodeid):
+        extras.append(pytest_html.extras.html(f"<div>{html.escape(format_result(result))}</div>"))
+        if result["diff"]:
+            with open(result["diff"], "rb") as f:
+                extras.append(pytest_html.extras.png(base64.b64encode(f.read()).decode(),
+                                                     name=f"diff {result['name']} {result['resolution']}"))
+    report.extras = extras
+
+def attach_network_waterfalls(item, report):
+    """Add the network waterfalls the test recorded, and their budget violations, to the HTML report."""
+    pytest_html = item.config.pluginmanager.getplugin("html")
+    recorder = item.funcargs.get("network_recorder") if hasattr(item, "funcargs") else None
+    if pytest_html is None or recorder is None:
+        return
+
+    extras = getattr(report, "extras", [])
+    for result in recorder.results_for(item.nodeid):
+        summary = result["summary"]
+        violations = "".join(f"<li class=\"failed\">{html.escape(network.format_violation(violation))}</li>"
+                             for violation in result["violations"])
+        extras.append(pytest_html.extras.html(
+            f"<div><b>Network ({html.escape(str(result['platform']))})</b>: {summary['request_count']} request(s), "
+            f"{summary['transfer_bytes'] / 1024:.0f} KiB transferred, {summary['script_bytes'] / 1024:.0f} KiB "
+            f"of scripts</div>" + (f"<ul>{violations}</ul>" if violations else "")
+            + network.waterfall_html(result["entries"])
+        ))
+        extras.append(pytest_html.extras.json(result["entries"], name=f"waterfall {result['platform']}"))
+    report.extras = extras
+
+def attach_trace_summary(item, report):
+    """Add the main-thread breakdown and the long tasks of the test's Chrome trace to the HTML report."""
+    summary = item.stash.get(trace_summary_key, None)
+    if summary is None:
+        return
+    pytest_html = item.config.pluginmanager.getplugin("html")
+    if pytest_html is None:
+        return
+    rows = "".join(
+        f"<tr><td>{html.escape(task['url'])}</td><td>{task['count']}</td>"
+        f"<td>{task['total']:.0f}</td><td>{task['max']:.0f}</td></tr>" for task in summary["long_tasks"])
+    extras = getattr(report, "extras", [])
+    extras.append(pytest_html.extras.html(
+        f"<div><b>Chrome trace</b> ({html.escape(os.path.basename(summary['path']))}): "
+        f"{html.escape(tracing.format_summary(summary))}</div>"
+        + (f"<table><tr><th>long tasks by script</th><th>count</th><th>total ms</th><th>max ms</th></tr>"
+           f"{rows}</table>" if rows else "<div>No long tasks</div>")
+    ))
+    report.extras = extras
+
+def attach_command_timings(item, report):
+    """Add the time the test spent in each WebDriver command to the HTML report."""
+    pytest_html = item.config.pluginmanager.getplugin("html")
+    histograms = commands.timer(item.config).results_for(item.nodeid)
+    if pytest_html is None or not histograms:
+        return
+    total = sum(histogram.total for histogram in histograms.values())
+    rows = "".join(
+        f"<tr><td>{html.escape(name)}</td><td>{histogram.count}</td><td>{histogram.total:.0f}</td>"
+        f"<td>{histogram.total / histogram.count:.1f}</td><td>{histogram.max:.0f}</td></tr>"
+        for name, histogram in sorted(histograms.items(), key=lambda entry: -entry[1].total))
+    extras = getattr(report, "extras", [])
+    extras.append(pytest_html.extras.html(
+        f"<div><b>WebDriver commands</b>: {sum(histogram.count for histogram in histograms.values())} "
+        f"command(s), {total / 1000:.2f}s in total</div>"
+        f"<table><tr><th>command</th><th>count</th><th>total ms</th><th>mean ms</th><th>max ms</th></tr>"
+        f"{rows}</table>"
+    ))
+    report.extras = extras
+
+def pytest_runtest_logreport(report):
+    """Accumulate setup, call and teardown time of every test."""
+    test_durations[report.nodeid] = test_durations.get(report.nodeid, 0.0) + report.duration
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_sessionfinish(session, exitstatus):
+    """Store durations and judge performance once all workers are done."""
+    config = session.config
+    if not runs_tests(config):
+        return
+    service = screenshots.service(config)
+    service.close()
+    workers.share(config, "screenshots", service.stats())
+    workers.share(config, "chrome_trace", trace_summaries)
+    workers.share(config, "commands", commands.timer(config).stats())
+    workers.share(config, "phases", phases.clock().results)
+    if workers.is_worker(config):
+        # Flush this worker's log before the controller merges the logs
+        logs.shutdown()
+        store = artifacts.store(config)
+        run_id = workers.run_id(config)
+        store.add(run_id, "log", logs.log_path(os.path.join(store.run_dir(run_id), "logs")))
+        return
+
+    # The xdist controller sees every report, so it stores durations for the scheduler
+    if test_durations:
+        scheduler.update_durations(test_durations, config.getoption("--durations-path"))
+
+    if config.getoption("--no-perf-compare"):
+        return
+    store = PerfStore(config.getoption("--perf-history"))
+    verdicts = store.compare(
+        workers.run_id(config),
+        alpha=config.getoption("--perf-alpha"),
+        baseline_runs=config.getoption("--baseline-runs"),
+        min_current=config.getoption("--perf-min-samples")
+    )
+    config.stash[perf_verdicts_key] = verdicts
+    regressions = [verdict for verdict in verdicts if verdict["verdict"] == "regression"]
+    if regressions and config.getoption("--perf-gate"):
+        logger.error(f"{len(regressions)} significant performance regression(s) found")
+        session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+def pytest_unconfigure(config):
+    """Merge the workers' logs into one timeline, write the phase flame graph, and index
+    the HTML report of the run, copying the report into the run directory if it was written elsewhere."""
+    if workers.is_worker(config) or not runs_tests(config):
+        return
+    store = artifacts.store(config)
+    run_id = workers.run_id(config)
+    log_dir = os.path.join(store.run_dir(run_id), "logs")
+    logs.shutdown()
+    store.add(run_id, "log", logs.log_path(log_dir))
+    store.add(run_id, "timeline", logs.merge(log_dir))
+    phase_results = [result for _, results in workers.shared(config, "phases") for result in results]
+    if phase_results:
+        store.add(run_id, "phases", phases.write_folded(
+            phase_results, os.path.join(store.run_dir(run_id), phases.FOLDED_NAME)))
+
+    htmlpath = getattr(config.option, "htmlpath", None)
+    if not htmlpath or not os.path.exists(htmlpath):
+        return
+    run_dir = os.path.abspath(store.run_dir(run_id))
+    inside = os.path.abspath(htmlpath).startswith(run_dir + os.sep)
+    store.add(run_id, "report", htmlpath, copy=not inside)
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    """Give every xdist worker the controller's run id."""
+    node.workerinput["tvqa_run_id"] = workers.run_id(node.config)
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_html_results_summary(prefix, summary, postfix, session):
+    """Show the performance verdicts in the HTML report."""
+    verdicts = session.config.stash.get(perf_verdicts_key, [])
+    flagged = [verdict for verdict in verdicts if verdict["verdict"] in ("regression", "improvement")]
+    if not verdicts:
+        return
+    prefix.append(f"<h2>Performance</h2><p>{len(verdicts)} metric series compared with the baseline, "
+                  f"{len(flagged)} significant change(s).</p>")
+    if flagged:
+        prefix.append("<ul>" + "".join(
+            f"<li class=\"{'failed' if verdict['verdict'] == 'regression' else 'passed'}\">"
+            f"{html.escape(format_verdict(verdict))}</li>" for verdict in flagged) + "</ul>")
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    """Collect the statistics an xdist worker shared before shutting down."""
+    workers.collect_node(node.config, node)
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    """Report how much work each pooled browser did and how long readiness waits took."""
+    services = workers.shared(config, "driver_service")
+    if services:
+        terminalreporter.section("driver startup")
+        for worker, stats in services:
+            terminalreporter.write_line(
+                f"{worker}: chromedriver for Chrome {stats['chrome_build']} from {stats['source']} resolved in "
+                f"{stats['resolve_time']:.2f}s, service started in {stats['service_start_time']:.2f}s, "
+                f"{stats['launches']} browser launch(es) in {stats['launch_total']:.2f}s "
+                f"(mean {stats['launch_mean']:.2f}s, max {stats['launch_max']:.2f}s)"
+            )
+
+    pools = workers.shared(config, "browser_pool")
+    if pools:
+        terminalreporter.section("browser pool")
+        for worker, stats in pools:
+            for entry in stats:
+                terminalreporter.write_line(
+                    f"{worker} browser #{entry['browser']}: {entry['leases']} lease(s), "
+                    f"{entry['resets']} reset(s), {entry['reset_total']:.2f}s total reset time "
+                    f"(mean {entry['reset_mean']:.3f}s, max {entry['reset_max']:.3f}s)"
+                )
+
+    timings = commands.merge_stats(stats for _, stats in workers.shared(config, "commands"))
+    if timings:
+        terminalreporter.section("webdriver commands (top by total time)")
+        for line in commands.top_table(timings):
+            terminalreporter.write_line(line)
+
+    phase_results = [result for _, results in workers.shared(config, "phases") for result in results]
+    if phase_results:
+        terminalreporter.section("phase budget (share of test wall time)")
+        for line in phases.budget_table(phase_results):
+            terminalreporter.write_line(line)
+
+    cache_results = [result for _, results in workers.shared(config, "cache_modes") for result in results]
+    if cache_results:
+        terminalreporter.section("cache modes (ms / bytes)")
+        for line in cache_modes.summary_table(cache_results):
+            terminalreporter.write_line(line)
+
+    verdicts = config.stash.get(perf_verdicts_key, [])
+    if verdicts:
+        terminalreporter.section("performance vs baseline")
+        counts = {}
+        for verdict in verdicts:
+            counts[verdict["verdict"]] = counts.get(verdict["verdict"], 0) + 1
+            if verdict["verdict"] in ("regression", "improvement"):
+                terminalreporter.write_line(format_verdict(verdict), red=verdict["verdict"] == "regression")
+        terminalreporter.write_line(", ".join(f"{count} {name}" for name, count in sorted(counts.items())))
+
+    shots = [stats for _, stats in workers.shared(config, "screenshots") if stats["captures"]]
+    if shots:
+        terminalreporter.section("screenshots")
+        captures = sum(stats["captures"] for stats in shots)
+        terminalreporter.write_line(
+            f"{captures} capture(s), {sum(stats['duplicates'] for stats in shots)} duplicate(s); "
+            f"{sum(stats['bytes_written'] for stats in shots) / 1e6:.1f} MB written, "
+            f"{sum(stats['bytes_saved'] for stats in shots) / 1e6:.1f} MB saved by deduplication"
+        )
+        terminalreporter.write_line(
+            f"{sum(stats['capture_time'] for stats in shots):.2f}s capturing on the test thread, "
+            f"{sum(stats['background_time'] for stats in shots):.2f}s decoding and writing in the background"
+        )
+
+    presses = [press for _, results in workers.shared(config, "remote_control") for press in results]
+    if presses:
+        terminalreporter.section("remote control latency (ms)")
+        for line in latency_table(presses):
+            terminalreporter.write_line(line)
+
+    playbacks = [record for _, records in workers.shared(config, "playback") for record in records]
+    if playbacks:
+        terminalreporter.section("playback QoE (median, ms)")
+        for line in playback.summary_table(playbacks):
+            terminalreporter.write_line(line)
+
+    loads = [result for _, results in workers.shared(config, "network") for result in results]
+    if loads:
+        terminalreporter.section("network budgets")
+        for line in network.summary_table(loads):
+            terminalreporter.write_line(line, red=line.startswith("  over budget"))
+
+    traces = [summary for _, summaries in workers.shared(config, "chrome_trace") for summary in summaries]
+    if traces:
+        terminalreporter.section("chrome traces (main thread, ms)")
+        for summary in traces:
+            terminalreporter.write_line(f"{summary['test']}: {tracing.format_summary(summary)}")
+            for task in summary["long_tasks"][:3]:
+                terminalreporter.write_line(f"  long tasks in {task['url']}: {task['count']}, "
+                                            f"{task['total']:.0f} ms total, {task['max']:.0f} ms max")
+
+    soaks = [result for _, results in workers.shared(config, "soak") for result in results]
+    if soaks:
+        terminalreporter.section("soak memory")
+        for line in soak.summary_table(soaks):
+            terminalreporter.write_line(line, red=line.lstrip().startswith("LEAK"))
+
+    crawls = [summary for _, summaries in workers.shared(config, "focus_graph") for summary in summaries]
+    if crawls:
+        terminalreporter.section("focus graph")
+        for summary in crawls:
+            terminalreporter.write_line(
+                f"{summary['platform']}: {summary['states']} state(s), {summary['edges']} edge(s); "
+                f"{summary['new']} new, {summary['changed']} changed, {summary['unchanged']} unchanged, "
+                f"{summary['carried']} carried over, {summary['unreachable']} unreachable "
+                f"({summary['elapsed']:.1f}s)"
+            )
+
+    sweeps = [sweep for _, stats in workers.shared(config, "responsive") for sweep in stats]
+    if sweeps:
+        terminalreporter.section("responsive sweeps")
+        for sweep in sweeps:
+            terminalreporter.write_line(
+                f"{sweep['platform']}: {sweep['resolutions']} resolution(s) in {sweep['elapsed']:.2f}s, "
+                f"{sweep['reloads']} reload(s), {sweep['parallel']} browser(s)"
+            )
+        terminalreporter.write_line(f"Total sweep time: {sum(sweep['elapsed'] for sweep in sweeps):.2f}s")
+
+    checks = [result for _, results in workers.shared(config, "visual_diff") for result in results]
+    if checks:
+        terminalreporter.section("visual regression")
+        counts = {}
+        for result in checks:
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+        terminalreporter.write_line(
+            f"{len(checks)} check(s) in {sum(result['elapsed'] for result in checks):.2f}s: "
+            + ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+        )
+
+    readiness = workers.shared(config, "app_ready")
+    if readiness:
+        terminalreporter.section("app readiness")
+        for worker, stats in readiness:
+            terminalreporter.write_line(
+                f"{worker}: {stats['waits']} wait(s), {stats['timeouts']} timeout(s), "
+                f"{stats['total']:.2f}s total (mean {stats['mean']:.2f}s, max {stats['max']:.2f}s)"
+            )
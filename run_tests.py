@@ -8,69 +8,216 @@ Test runner script for TV 2 Play Smart TV app testing.
 import os
 import sys
 import glob
+import time
 import argparse
 import subprocess
 from datetime import datetime
 
-def create_directories():
-    """Create necessary directories if they don't exist."""
-    os.makedirs("artifacts/screenshots", exist_ok=True)
-    os.makedirs("artifacts/reports", exist_ok=True)
+from tvqa import scheduler, workers, benchmark, device_profiles, overhead
+from tvqa.artifacts import ArtifactStore
+from tvqa.platforms import PLATFORMS
+from tvqa.perf_store import HISTORY_PATH as PERF_HISTORY_PATH, PerfStore, format_verdict
 
-def run_tests(platforms, parallel=False, html_report=True, verbose=True):
+def test_paths(platforms):
+    """Return the pytest paths covering the requested platforms."""
+    if "all" in platforms:
+        return ["tests/"]
+    paths = []
+    for platform in platforms:
+        # Include all test files that contain the platform name
+        paths.extend(glob.glob(f"tests/test_*{platform}*.py"))
+    return paths
+
+def report_path(platforms, run_id, suffix=""):
+    """Timestamped HTML report path inside the run's artifact directory."""
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return os.path.join(ArtifactStore().run_dir(run_id), "reports",
+                        f"report_{'-'.join(platforms)}_{timestamp}{suffix}.html")
+
+def run_tests(platforms, parallel=False, worker_count=None, html_report=True, verbose=True, perf_gate=False):
     """Run tests for specified platforms."""
-    create_directories()
+    if parallel:
+        return run_scheduled(platforms, worker_count or os.cpu_count() or 1, html_report, verbose, perf_gate)
     
     # Build command
     cmd = ["python", "-m", "pytest"]
-    
-    # Add test files based on platforms
-    if "all" in platforms:
-        cmd.append("tests/")
-    else:
-        for platform in platforms:
-            # Include all test files that contain the platform name
-            platform_files = glob.glob(f"tests/test_*{platform}*.py")
-            cmd.extend(platform_files)
+    cmd.extend(test_paths(platforms))
     
     # Add options
     if verbose:
         cmd.append("-v")
+    if perf_gate:
+        cmd.append("--perf-gate")
     
-    if parallel:
-        cmd.append(f"-n {2 if len(platforms) > 1 else 1}")
-    
+    run_id = os.environ.get("TVQA_RUN_ID") or workers.new_run_id()
     if html_report:
-        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-        report_path = f"artifacts/reports/report_{'-'.join(platforms)}_{timestamp}.html"
-        cmd.append(f"--html={report_path}")
+        cmd.extend([f"--html={report_path(platforms, run_id)}", "--self-contained-html"])
     
     # Run the command
     print(f"Running command: {' '.join(cmd)}")
-    result = subprocess.run(cmd)
+    result = subprocess.run(cmd, env=dict(os.environ, TVQA_RUN_ID=run_id))
     
     return result.returncode
 
+def run_scheduled(platforms, worker_count, html_report=True, verbose=True, perf_gate=False):
+    """Run tests on several pytest processes, balanced by stored durations.
+
+    The run is compared with the performance baseline once, after every
+    process has stored its samples.
+    """
+    # All workers store their performance samples and artifacts under the same run
+    run_id = os.environ.get("TVQA_RUN_ID") or workers.new_run_id()
+    test_ids = scheduler.collect_test_ids(test_paths(platforms), run_id=run_id)
+    if not test_ids:
+        print("No tests collected")
+        return 5
+    
+    durations = scheduler.load_durations()
+    bins = scheduler.plan(test_ids, durations, worker_count)
+    print(f"Scheduling {len(test_ids)} tests on {len(bins)} worker(s), "
+          f"expected makespan {scheduler.makespan(bins):.1f}s")
+    
+    store = ArtifactStore()
+    # Old artifacts are cleaned up once here rather than by every worker process
+    store.apply_retention(current_run=run_id)
+    # Every worker stores the durations it measured in the run directory; they are merged below
+    durations_dir = os.path.join(store.run_dir(run_id), "durations")
+    os.makedirs(durations_dir, exist_ok=True)
+    processes = []
+    start_time = time.time()
+    for index, entry in enumerate(bins):
+        worker = f"w{index}"
+        durations_path = os.path.join(durations_dir, f"{worker}.json")
+        if os.path.exists(durations_path):
+            os.remove(durations_path)
+        
+        cmd = ["python", "-m", "pytest", "-p", "no:cacheprovider", f"--durations-path={durations_path}",
+               "--no-retention", "--no-perf-compare"]
+        cmd.append("-v" if verbose else "-q")
+        if html_report:
+            cmd.extend([f"--html={report_path(platforms, run_id, f'_{worker}')}", "--self-contained-html"])
+        cmd.extend(entry["tests"])
+        
+        print(f"[{worker}] {len(entry['tests'])} tests, expected {entry['expected']:.1f}s")
+        env = dict(os.environ, TVQA_WORKER=worker, TVQA_RUN_ID=run_id)
+        processes.append((worker, entry, durations_path, subprocess.Popen(cmd, env=env)))
+    
+    returncode = 0
+    actual = {}
+    pending = list(processes)
+    while pending:
+        for process_entry in list(pending):
+            worker, entry, durations_path, process = process_entry
+            if process.poll() is not None:
+                actual[worker] = time.time() - start_time
+                returncode = returncode or process.returncode
+                pending.remove(process_entry)
+        time.sleep(0.2)
+    makespan = time.time() - start_time
+    
+    for worker, entry, durations_path, process in processes:
+        scheduler.update_durations(scheduler.load_durations(durations_path))
+    
+    print("-" * 50)
+    for worker, entry, durations_path, process in processes:
+        print(f"[{worker}] expected {entry['expected']:.1f}s, actual {actual[worker]:.1f}s, "
+              f"exit code {process.returncode}")
+    print(f"Makespan: expected {scheduler.makespan(bins):.1f}s, actual {makespan:.1f}s")
+    
+    verdicts = PerfStore(PERF_HISTORY_PATH).compare(run_id)
+    regressions = [verdict for verdict in verdicts if verdict["verdict"] == "regression"]
+    for verdict in verdicts:
+        if verdict["verdict"] in ("regression", "improvement"):
+            print(format_verdict(verdict))
+    if regressions and perf_gate:
+        print(f"{len(regressions)} significant performance regression(s) found")
+        returncode = returncode or 1
+    
+    return returncode
+
+def run_benchmark(platforms, iterations, warmup, headless=False, device_profile="auto"):
+    """Benchmark repeated app loads and print latency percentiles per platform."""
+    if "all" in platforms:
+        platforms = list(PLATFORMS)
+    
+    print(f"Benchmarking {', '.join(platforms)}: {warmup} warm-up and {iterations} measured loads each")
+    store = ArtifactStore()
+    results = benchmark.run_benchmark(
+        platforms, iterations=iterations, warmup=warmup, headless=headless,
+        history_path=PERF_HISTORY_PATH, build=os.environ.get("APP_BUILD", "unknown"),
+        device_profile=device_profile, artifact_store=store
+    )
+    
+    print("-" * 50)
+    for line in benchmark.format_results(results):
+        print(line)
+    print(f"Results saved to {benchmark.save_results(results, store)}")
+    
+    verdicts = PerfStore(PERF_HISTORY_PATH).compare(results["run_id"])
+    for verdict in verdicts:
+        if verdict["verdict"] in ("regression", "improvement"):
+            print(format_verdict(verdict))
+    return 0
+
+def run_overhead(iterations, headless=False):
+    """Benchmark the harness against the local fixture app and compare with the previous run."""
+    print(f"Benchmarking harness overhead: {iterations} samples per operation")
+    store = ArtifactStore()
+    results = overhead.run_overhead(iterations=iterations, headless=headless, artifact_store=store)
+    path = overhead.save_results(results, store)
+    
+    print("-" * 50)
+    previous = overhead.previous_results(store, exclude_run=results["run_id"])
+    for line in overhead.format_results(results, previous):
+        print(line)
+    print(f"Results saved to {path}")
+    return 0
+
 def main():
     parser = argparse.ArgumentParser(description="Run TV 2 Play Smart TV app tests")
     parser.add_argument("--platforms", "-p", nargs="+", default=["all"],
                         choices=["all", "samsung", "lg", "philips"],
                         help="Platforms to test (default: all)")
     parser.add_argument("--parallel", action="store_true",
-                        help="Run tests in parallel")
+                        help="Run tests in parallel, balanced by previous durations")
+    parser.add_argument("--workers", "-w", type=int, default=None,
+                        help="Number of parallel workers (default: CPU count)")
+    parser.add_argument("--benchmark", type=int, metavar="N", default=None,
+                        help="Instead of the tests, load each platform app N times and report percentiles")
+    parser.add_argument("--overhead", type=int, metavar="N", default=None,
+                        help="Instead of the tests, time N samples of every harness operation "
+                             "against a local fixture app")
+    parser.add_argument("--warmup", type=int, default=2,
+                        help="Discarded warm-up loads per platform in benchmark mode (default: 2)")
+    parser.add_argument("--headless", action="store_true",
+                        help="Run browsers in headless mode")
+    parser.add_argument("--device-profile", default="auto",
+                        choices=["auto", "none", *device_profiles.PROFILES],
+                        help="Device profile benchmark loads run under (default: each platform's own)")
     parser.add_argument("--no-html", action="store_true",
                         help="Disable HTML report generation")
     parser.add_argument("--quiet", "-q", action="store_true",
                         help="Run tests without verbose output")
+    parser.add_argument("--perf-gate", action="store_true",
+                        help="Fail when the run shows a significant performance regression")
     
     args = parser.parse_args()
     
+    if args.overhead:
+        return run_overhead(args.overhead, headless=args.headless)
+    
+    if args.benchmark:
+        return run_benchmark(args.platforms, args.benchmark, args.warmup, headless=args.headless,
+                             device_profile=args.device_profile)
+    
     print(f"Running tests for platforms: {', '.join(args.platforms)}")
     return run_tests(
         platforms=args.platforms,
         parallel=args.parallel,
+        worker_count=args.workers,
         html_report=not args.no_html,
-        verbose=not args.quiet
+        verbose=not args.quiet,
+        perf_gate=args.perf_gate
     )
 
 if __name__ == "__main__":
@@ -1,15 +1,19 @@
 import pytest
 import os
 import json
+import logging
 from datetime import datetime
 from pathlib import Path
+from tvqa import screenshots, artifacts, workers
+
+log = logging.getLogger(__name__)
 
 # Create directories for test artifacts
 @pytest.fixture(scope="session", autouse=True)
-def setup_test_environment():
+def setup_test_environment(request):
     """Set up the test environment before any tests run."""
-    # Create directories for artifacts
-    artifacts_dir = Path("artifacts")
+    # Artifacts of the run live in its directory of the artifact store
+    artifacts_dir = Path(artifacts.store(request.config).run_dir(workers.run_id(request.config)))
     screenshots_dir = artifacts_dir / "screenshots"
     reports_dir = artifacts_dir / "reports"
     
@@ -36,41 +40,16 @@ def pytest_runtest_makereport(item, call):
             # Take a screenshot on test failure
             if call.excinfo is not None:
                 try:
-                    # Create a sanitized test name for the filename
+                    # Create a sanitized test name for the screenshot
                     test_name = nodeid.replace("::", "_").replace("/", "_").replace(".", "_")
-                    screenshot_path = f"artifacts/screenshots/fail_{test_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-                    
-                    driver.save_screenshot(screenshot_path)
-                    print(f"Screenshot saved to {screenshot_path}")
+                    screenshots.service(item.config).capture(driver, f"fail_{test_name}", test=nodeid,
+                                                             kind="failure")
+                    log.info(f"Screenshot of {test_name} queued for writing")
                 except Exception as e:
-                    print(f"Failed to take screenshot: {e}")
+                    log.error(f"Failed to take screenshot: {e}")
 
-# Custom logger fixture
+# Logger fixture; records are tagged with the test id, platform and phase by tvqa.logs
 @pytest.fixture
 def logger(request):
     """Fixture for test logging."""
-    test_name = request.node.name
-    
-    def _log_info(message):
-        """Log an info message with the test name."""
-        print(f"[INFO] [{test_name}] {message}")
-    
-    def _log_error(message):
-        """Log an error message with the test name."""
-        print(f"[ERROR] [{test_name}] {message}")
-    
-    def _log_warning(message):
-        """Log a warning message with the test name."""
-        print(f"[WARNING] [{test_name}] {message}")
-    
-    class Logger:
-        def info(self, message):
-            _log_info(message)
-        
-        def error(self, message):
-            _log_error(message)
-        
-        def warning(self, message):
-            _log_warning(message)
-    
-    return Logger() 
\ No newline at end of file
+    return logging.getLogger(request.node.module.__name__)
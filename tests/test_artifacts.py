@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests of the artifact index: lookups, reads from zipped runs and retention.
+"""
+
+import os
+import time
+import sqlite3
+import pytest
+from tvqa.artifacts import ArtifactStore
+
+
+def add_run(store, run_id, age_days, contents=b"{}"):
+    store.start_run(run_id)
+    path = os.path.join(store.run_dir(run_id), "perf", "gw0.jsonl")
+    os.makedirs(os.path.dirname(path))
+    with open(path, "wb") as f:
+        f.write(contents)
+    store.add(run_id, "perf", path, test="tests/test_lg.py::test_load", platform="lg")
+    with sqlite3.connect(store.index_path) as connection:
+        connection.execute("UPDATE runs SET created_at = ? WHERE run_id = ?",
+                           (time.time() - age_days * 86400, run_id))
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ArtifactStore(str(tmp_path / "artifacts"))
+    for run, age_days in (("run1", 3), ("run2", 2), ("run3", 1)):
+        add_run(store, run, age_days, contents=f"{run}\n".encode() * 100)
+    return store
+
+
+def test_find_filters_and_orders_newest_first(store):
+    assert [artifact["run_id"] for artifact in store.find(kind="perf")] == ["run3", "run2", "run1"]
+    assert [artifact["run_id"] for artifact in store.find(platform="lg", last_runs=2)] == ["run3", "run2"]
+    assert store.find(kind="screenshot") == []
+    assert store.find(test="tests/test_lg.py::test_load")[0]["path"] == os.path.join("perf", "gw0.jsonl")
+
+
+def test_retention_compresses_all_but_the_newest_runs(store):
+    result = store.apply_retention(keep_uncompressed=1, max_age_days=None, max_bytes=None)
+    assert result == {"compressed": 2, "evicted": [], "bytes": result["bytes"]}
+    assert os.path.isdir(store.run_dir("run3"))
+    for run in ("run1", "run2"):
+        assert not os.path.exists(store.run_dir(run))
+        assert os.path.exists(store.run_dir(run) + ".zip")
+
+
+def test_read_from_a_zipped_run(store):
+    store.apply_retention(keep_uncompressed=0, max_age_days=None, max_bytes=None, current_run="run3")
+    artifacts = {artifact["run_id"]: artifact for artifact in store.find(kind="perf")}
+    assert artifacts["run1"]["compressed"] == 1
+    assert artifacts["run3"]["compressed"] == 0
+    assert store.read(artifacts["run1"]) == b"run1\n" * 100
+    assert store.read(artifacts["run3"]) == b"run3\n" * 100
+
+
+def test_retention_evicts_old_runs(store):
+    result = store.apply_retention(max_age_days=2.5, max_bytes=None)
+    assert result["evicted"] == ["run1"]
+    assert not os.path.exists(store.run_dir("run1"))
+    assert [artifact["run_id"] for artifact in store.find()] == ["run3", "run2"]
+
+
+def test_retention_evicts_oldest_runs_over_budget_but_never_the_current_one(store):
+    size = store.run_size("run1")
+    result = store.apply_retention(max_age_days=None, max_bytes=size, current_run="run1")
+    assert result["evicted"] == ["run2", "run3"]
+    assert result["bytes"] == size
+    assert [artifact["run_id"] for artifact in store.find()] == ["run1"]
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests of the log-scale latency histogram.
+"""
+
+import pytest
+from tvqa.commands import BUCKETS_PER_DOUBLING, MIN_MS, Histogram
+from tvqa.stats import percentile
+
+LATENCIES = [0.001, 0.05, 0.3, 1.2, 1.25, 4.0, 9.5, 10.0, 33.3, 120.0, 121.0, 480.0, 2500.0]
+
+
+def histogram_of(values):
+    histogram = Histogram()
+    for value in values:
+        histogram.add(value)
+    return histogram
+
+
+def test_buckets():
+    histogram = histogram_of([0.001, MIN_MS, MIN_MS * 2, MIN_MS * 2.1])
+    # Below MIN_MS, then one bucket per quarter doubling
+    assert histogram.buckets == {0: 1, 1: 1, BUCKETS_PER_DOUBLING + 1: 2}
+    assert histogram.count == 4
+    assert histogram.max == MIN_MS * 2.1
+    assert histogram.total == pytest.approx(0.001 + MIN_MS * 5.1)
+
+
+@pytest.mark.parametrize("pct", [1, 25, 50, 75, 90, 95, 99, 100])
+def test_percentile_is_within_one_bucket(pct):
+    histogram = histogram_of(LATENCIES)
+    exact = sorted(LATENCIES)[max(1, -(-len(LATENCIES) * pct // 100)) - 1]
+    estimate = histogram.percentile(pct)
+    assert exact <= estimate <= max(exact * 2 ** (1 / BUCKETS_PER_DOUBLING), MIN_MS)
+
+
+def test_percentile_is_capped_at_the_maximum():
+    histogram = histogram_of([100.0, 100.0])
+    assert histogram.percentile(50) == 100.0
+    assert histogram.percentile(100) == 100.0
+    assert Histogram().percentile(50) == 0.0
+
+
+def test_merge_equals_adding_everything():
+    merged = histogram_of(LATENCIES[:5]).merge(histogram_of(LATENCIES[5:]))
+    assert merged.to_dict() == histogram_of(LATENCIES).to_dict()
+
+
+def test_round_trip_through_dict():
+    histogram = histogram_of(LATENCIES)
+    restored = Histogram.from_dict(histogram.to_dict())
+    assert restored.to_dict() == histogram.to_dict()
+    assert restored.percentile(90) == histogram.percentile(90)
+    # Close to the exact (interpolated) percentile of the raw samples
+    assert restored.percentile(50) == pytest.approx(percentile(LATENCIES, 50), rel=0.2)
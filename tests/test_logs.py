@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests of merging the per-worker JSON-lines logs into one timeline.
+"""
+
+import os
+import json
+from tvqa.logs import TIMELINE_NAME, merge
+
+
+def write_log(log_dir, name, entries, tail=""):
+    with open(os.path.join(log_dir, name), "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+        f.write(tail)
+
+
+def read_timeline(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_merge_interleaves_workers_by_timestamp(tmp_path):
+    write_log(tmp_path, "gw0.jsonl", [{"ts": 1.0, "worker": "gw0"}, {"ts": 3.0, "worker": "gw0"}])
+    write_log(tmp_path, "gw1.jsonl", [{"ts": 2.0, "worker": "gw1"}, {"ts": 4.0, "worker": "gw1", "message": "é"}])
+    path = merge(str(tmp_path))
+    assert path == os.path.join(str(tmp_path), TIMELINE_NAME)
+    assert [(entry["ts"], entry["worker"]) for entry in read_timeline(path)] == [
+        (1.0, "gw0"), (2.0, "gw1"), (3.0, "gw0"), (4.0, "gw1")]
+    assert read_timeline(path)[-1]["message"] == "é"
+
+
+def test_merge_skips_partial_lines_and_other_files(tmp_path):
+    # A killed worker's last line is cut off
+    write_log(tmp_path, "gw0.jsonl", [{"ts": 1.0}], tail='{"ts": 2.0, "mess')
+    write_log(tmp_path, "notes.txt", [{"ts": 0.5}])
+    path = merge(str(tmp_path))
+    assert read_timeline(path) == [{"ts": 1.0}]
+
+
+def test_merging_again_does_not_read_the_timeline(tmp_path):
+    write_log(tmp_path, "gw0.jsonl", [{"ts": 1.0}, {"ts": 2.0}])
+    merge(str(tmp_path))
+    path = merge(str(tmp_path))
+    assert len(read_timeline(path)) == 2
+    assert sorted(os.listdir(tmp_path)) == ["gw0.jsonl", TIMELINE_NAME]
+
+
+def test_merge_to_another_output(tmp_path):
+    write_log(tmp_path, "gw0.jsonl", [{"ts": 1.0}])
+    output = str(tmp_path / "run.jsonl")
+    assert merge(str(tmp_path), output=output) == output
+    # The output itself is skipped when merging into it again
+    merge(str(tmp_path), output=output)
+    assert read_timeline(output) == [{"ts": 1.0}]
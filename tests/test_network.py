@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests of the request waterfall and the network budgets.
+"""
+
+import pytest
+from tvqa.network import build_waterfall, check_budgets, summarise
+
+APP = "https://app.example.com/"
+SCRIPT = "https://app.example.com/main.js"
+
+
+def request(request_id, url, timestamp, resource_type="Document", **params):
+    return ("Network.requestWillBeSent", dict(
+        requestId=request_id, request={"url": url, "method": "GET"}, timestamp=timestamp,
+        type=resource_type, initiator={"type": "parser", "url": APP}, **params))
+
+
+def response(request_id, mime_type, headers=None, timing=None, status=200):
+    return ("Network.responseReceived", {"requestId": request_id, "response": {
+        "status": status, "mimeType": mime_type, "headers": headers or {}, "timing": timing}})
+
+
+def finished(request_id, timestamp, encoded_bytes):
+    return ("Network.loadingFinished", {"requestId": request_id, "timestamp": timestamp,
+                                        "encodedDataLength": encoded_bytes})
+
+
+EVENTS = [
+    request("1", APP, 1.0),
+    response("1", "text/html", headers={"Content-Encoding": "gzip"}, timing={
+        "requestTime": 1.05, "dnsStart": -1, "dnsEnd": -1, "connectStart": -1, "connectEnd": -1,
+        "sslStart": -1, "sslEnd": -1, "sendStart": 10.0, "sendEnd": 12.0, "receiveHeadersEnd": 50.0}),
+    ("Network.dataReceived", {"requestId": "1", "dataLength": 3000}),
+    finished("1", 1.2, 800),
+    request("2", SCRIPT, 1.1, resource_type="Script"),
+    response("2", "application/javascript"),
+    ("Network.dataReceived", {"requestId": "2", "dataLength": 2000}),
+    finished("2", 1.3, 2100),
+    # A second fetch of the same script
+    request("3", SCRIPT, 1.25, resource_type="Script"),
+    response("3", "application/javascript"),
+    ("Network.dataReceived", {"requestId": "3", "dataLength": 2000}),
+    finished("3", 1.4, 2100),
+    request("4", "https://app.example.com/missing.png", 1.3, resource_type="Image"),
+    ("Network.loadingFailed", {"requestId": "4", "timestamp": 1.35, "errorText": "net::ERR_FAILED"}),
+    # Not a network request
+    request("5", "data:image/png;base64,AAAA", 1.05, resource_type="Image"),
+    # Events of requests that started before recording
+    finished("0", 1.0, 100),
+]
+
+
+def test_waterfall_entries():
+    entries = build_waterfall(EVENTS)
+    assert [entry["url"] for entry in entries] == [APP, SCRIPT, SCRIPT, "https://app.example.com/missing.png"]
+    document, script = entries[0], entries[1]
+    assert document["start"] == 0.0
+    assert document["duration"] == pytest.approx(200.0)
+    assert document["encoding"] == "gzip"
+    assert document["cache"] == "network"
+    assert (document["transfer_bytes"], document["resource_bytes"]) == (800, 3000)
+    assert document["phases"] == pytest.approx(
+        {"queued": 50.0, "dns": 0.0, "connect": 0.0, "ssl": 0.0, "send": 2.0, "wait": 38.0, "receive": 100.0})
+    assert script["start"] == pytest.approx(100.0)
+    assert script["initiator"] == APP
+    assert script["encoding"] is None
+    assert entries[3]["failed"] == "net::ERR_FAILED"
+
+
+def test_redirect_hops_get_their_own_entries():
+    events = [
+        request("1", "http://app.example.com/", 1.0),
+        request("1", APP, 1.1, redirectResponse={"status": 301, "mimeType": "", "encodedDataLength": 200}),
+        response("1", "text/html"),
+        finished("1", 1.3, 900),
+    ]
+    entries = build_waterfall(events)
+    assert [(entry["url"], entry["status"], entry["transfer_bytes"]) for entry in entries] == [
+        ("http://app.example.com/", 301, 200), (APP, 200, 900)]
+    assert entries[0]["duration"] == pytest.approx(100.0)
+
+
+def test_summary_and_budgets():
+    summary = summarise(build_waterfall(EVENTS))
+    assert summary["request_count"] == 4
+    assert summary["failed"] == 1
+    assert summary["script_bytes"] == 4200
+    assert summary["largest_asset"] == {"url": SCRIPT, "bytes": 2100}
+    assert summary["uncompressed_text"] == [SCRIPT, SCRIPT]
+    assert summary["duplicates"] == [{"url": SCRIPT, "method": "GET", "count": 2}]
+
+    budgets = {"script_bytes": 4200, "request_count": 3, "largest_asset": 4096,
+               "uncompressed_text": 0, "duplicate_fetches": 0}
+    violations = {violation["budget"]: violation for violation in check_budgets(summary, budgets)}
+    assert sorted(violations) == ["duplicate_fetches", "request_count", "uncompressed_text"]
+    assert violations["request_count"]["value"] == 4
+    assert violations["duplicate_fetches"] == {"budget": "duplicate_fetches", "limit": 0, "value": 1,
+                                               "detail": SCRIPT}
+
+
+def test_empty_waterfall_is_within_budget():
+    summary = summarise(build_waterfall([]))
+    assert summary["largest_asset"] is None
+    assert check_budgets(summary, {"largest_asset": 0, "request_count": 0}) == []
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests of the perf history: the Mann-Whitney U test and the regression gate.
+"""
+
+import math
+import pytest
+from tvqa.perf_store import PerfStore, mann_whitney_u, run_mode
+
+
+def add_run(store, run_id, values, metric="load_time", platform="lg", test="test_load"):
+    for index, value in enumerate(values):
+        store.add_record(run_id, "build", {"platform": platform, "test": test, "profile": None,
+                                           "metrics": {metric: value}, "timestamp": index})
+
+
+@pytest.fixture
+def history(tmp_path):
+    return str(tmp_path / "perf_history.sqlite")
+
+
+def test_exact_tail_of_separated_samples():
+    # Only one of the C(6, 3) = 20 rank arrangements puts all current values on top
+    u, p = mann_whitney_u([1, 2, 3], [4, 5, 6])
+    assert u == 9
+    assert p == pytest.approx(1 / 20)
+
+
+def test_exact_tail_counts_every_arrangement_at_least_as_extreme():
+    # U = 8 and U = 9 are the two arrangements with U >= 8
+    u, p = mann_whitney_u([1, 2, 4], [3, 5, 6])
+    assert u == 8
+    assert p == pytest.approx(2 / 20)
+
+
+def test_exact_tail_of_reversed_samples_is_one():
+    u, p = mann_whitney_u([4, 5, 6], [1, 2, 3])
+    assert u == 0
+    assert p == pytest.approx(1.0)
+
+
+def test_normal_tail_with_ties():
+    baseline, current = [1, 1, 2, 2], [3, 3, 4, 4]
+    u, p = mann_whitney_u(baseline, current)
+    assert u == 16
+    # Tie-corrected variance: n1 * n2 / 12 * ((n + 1) - sum(t^3 - t) / (n * (n - 1)))
+    variance = 16 / 12 * (9 - 24 / 56)
+    assert p == pytest.approx(0.5 * math.erfc((16 - 8 - 0.5) / math.sqrt(variance) / math.sqrt(2)))
+
+
+def test_normal_tail_of_large_samples():
+    u, p = mann_whitney_u(list(range(15)), list(range(100, 115)))
+    assert u == 225
+    assert p < 1e-5
+    _, p_reversed = mann_whitney_u(list(range(100, 115)), list(range(15)))
+    assert p_reversed > 0.99
+
+
+def test_identical_samples_never_differ():
+    assert mann_whitney_u([5] * 4, [5] * 4) == (8, 1.0)
+
+
+def test_compare_flags_a_slower_run(history):
+    store = PerfStore(history)
+    for run in range(1, 5):
+        add_run(store, f"run{run}", [100, 101, 99, 100])
+    add_run(store, "run5", [150, 151, 149, 150])
+    [verdict] = store.compare("run5")
+    assert verdict["verdict"] == "regression"
+    assert verdict["change"] == pytest.approx(0.5)
+    assert verdict["baseline_samples"] == 16
+
+
+def test_compare_flags_a_faster_run_as_improvement(history):
+    store = PerfStore(history)
+    for run in range(1, 5):
+        add_run(store, f"run{run}", [100, 101, 99, 100])
+    add_run(store, "run5", [50, 51, 49, 50])
+    assert store.compare("run5")[0]["verdict"] == "improvement"
+
+
+def test_compare_knows_higher_is_better_metrics(history):
+    store = PerfStore(history)
+    for run in range(1, 5):
+        add_run(store, f"run{run}", [800, 810, 790, 800], metric="bitrate_kbps")
+    add_run(store, "run5", [400, 410, 390, 400], metric="bitrate_kbps")
+    assert store.compare("run5")[0]["verdict"] == "regression"
+
+
+def test_compare_ignores_small_effects(history):
+    store = PerfStore(history)
+    for run in range(1, 5):
+        add_run(store, f"run{run}", [100, 101, 99, 100])
+    add_run(store, "run5", [102, 103, 102, 103])
+    assert store.compare("run5")[0]["verdict"] == "no change"
+
+
+def test_compare_needs_enough_current_and_baseline_samples(history):
+    store = PerfStore(history)
+    add_run(store, "run1", [100, 101])
+    add_run(store, "run2", [150, 151, 149, 150])
+    add_run(store, "run3", [300])
+    assert store.compare("run2")[0]["verdict"] == "insufficient data"
+    assert store.compare("run3")[0]["verdict"] == "insufficient data"
+    # A single sample is tested once the limits allow it, but cannot reach significance on its own
+    verdict = store.compare("run3", min_current=1, min_baseline=1)[0]
+    assert verdict["verdict"] == "no change"
+    assert verdict["p_value"] > 0.05
+
+
+def test_modes_have_their_own_baselines(history):
+    live = PerfStore(history)
+    replay = PerfStore(history, mode=run_mode(replay=True, latency_ms=50))
+    for run in range(1, 5):
+        add_run(live, f"run{run}", [100, 101, 99, 100])
+    add_run(replay, "run5", [150, 151, 149, 150])
+    [verdict] = replay.compare("run5")
+    assert verdict["mode"] == "replay 50ms"
+    assert verdict["verdict"] == "insufficient data"
+    assert verdict["baseline_samples"] == 0
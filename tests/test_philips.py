@@ -1,13 +1,15 @@
 import pytest
-import time
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from tvqa.replay import app_url
 
 # Philips TV app URL
-PHILIPS_APP_URL = "https://ctv.play.tv2.no/production/play/philips/"
+PHILIPS_APP_URL = app_url("https://ctv.play.tv2.no/production/play/philips/")
+
+# Philips TV browser user agent
+USER_AGENT = "Mozilla/5.0 (SMART-TV; PHILIPS-OS) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 
 # Different screen resolutions to test
 RESOLUTIONS = [
@@ -17,20 +19,10 @@ RESOLUTIONS = [
 ]
 
 @pytest.fixture
-def driver():
-    """Set up WebDriver for Philips TV tests."""
-    options = webdriver.ChromeOptions()
-    options.add_argument("--headless")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--user-agent=Mozilla/5.0 (SMART-TV; PHILIPS-OS) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
-    
-    driver = webdriver.Chrome(options=options)
-    driver.set_page_load_timeout(30)
-    
-    yield driver
-    
-    driver.quit()
+def driver(browser_pool):
+    """Lease a warm WebDriver for Philips TV tests."""
+    with browser_pool.lease(user_agent=USER_AGENT) as driver:
+        yield driver
 
 def test_philips_app_loads(driver):
     """Test that the Philips TV app loads successfully."""
@@ -46,38 +38,37 @@ def test_philips_app_loads(driver):
     except TimeoutException:
         pytest.fail("Philips TV app failed to load within the timeout period")
 
-def test_responsive_design(driver):
+def test_responsive_design(request, driver, app_ready, responsive_sweep, visual_diff):
     """Test the app's responsive design across different screen resolutions."""
-    for width, height in RESOLUTIONS:
-        driver.set_window_size(width, height)
-        driver.get(PHILIPS_APP_URL)
-        
+    driver.get(PHILIPS_APP_URL)
+    app_ready.wait(driver, raise_on_timeout=False)
+    
+    # Viewports are emulated in place; the app is only reloaded if it ignores the resize
+    sweep = responsive_sweep.sweep(driver, "philips", RESOLUTIONS, url=PHILIPS_APP_URL, user_agent=USER_AGENT,
+                                   name="resolution", test=request.node.nodeid)
+    print(f"Responsive sweep of {len(RESOLUTIONS)} resolutions took {sweep['elapsed']:.2f} seconds")
+    
+    for result in sweep["resolutions"]:
+        width, height = result["width"], result["height"]
         try:
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, ".app-container, #app, .tv-app"))
-            )
-            # Take screenshot for visual verification
-            driver.save_screenshot(f"philips_resolution_{width}x{height}.png")
+            # Compare the screenshot with the baseline of this resolution
+            visual_diff.verify(result["screenshot"]["path"], "philips", "resolution", width, height,
+                               test=request.node.nodeid)
             
             # Check if the layout adjusts properly
-            viewport_width = driver.execute_script("return window.innerWidth")
-            viewport_height = driver.execute_script("return window.innerHeight")
-            
-            assert abs(viewport_width - width) <= 10
-            assert abs(viewport_height - height) <= 10
+            assert abs(result["layout"]["inner_width"] - width) <= 10
+            assert abs(result["layout"]["inner_height"] - height) <= 10
             
             print(f"Responsive design works for resolution {width}x{height}")
-        except (TimeoutException, AssertionError) as e:
+        except AssertionError as e:
             pytest.fail(f"Responsive design test failed for resolution {width}x{height}: {str(e)}")
 
-def test_navigation(driver):
+def test_navigation(driver, app_ready):
     """Test navigation through the Philips TV app."""
     driver.get(PHILIPS_APP_URL)
     
     # Wait for the app to load
-    WebDriverWait(driver, 20).until(
-        EC.presence_of_element_located((By.CSS_SELECTOR, ".app-container, #app, .tv-app"))
-    )
+    app_ready.wait(driver)
     
     # Navigation elements can vary, so we'll check for common navigation elements
     try:
@@ -98,7 +89,7 @@ def test_navigation(driver):
             first_item.click()
             
             # Wait for page to update after navigation
-            time.sleep(2)
+            app_ready.wait(driver, raise_on_timeout=False)
             
             # Verify navigation happened (URL changed or new elements appeared)
             current_url = driver.current_url
@@ -109,56 +100,40 @@ def test_navigation(driver):
     except (TimeoutException, NoSuchElementException, AssertionError) as e:
         pytest.fail(f"Navigation test failed: {str(e)}")
 
-def test_performance_metrics(driver):
+def test_performance_metrics(request, driver, app_ready, perf_collector, device_profile):
     """Test performance metrics of the Philips TV app."""
-    driver.get(PHILIPS_APP_URL)
-    
-    # Measure load time
-    start_time = time.time()
-    
     try:
-        WebDriverWait(driver, 30).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, ".app-container, #app, .tv-app"))
-        )
-        load_time = time.time() - start_time
+        # Observers are injected before navigation; timings are relative to navigation start.
+        # The load runs throttled like a Philips TV unless --device-profile says otherwise.
+        record = perf_collector.measure(driver, PHILIPS_APP_URL, app_ready, platform="philips",
+                                        test=request.node.nodeid, profile=device_profile("philips"))
+        metrics = record["metrics"]
+        
+        assert record["ready"], "Philips TV app failed to load within the timeout period"
+        assert record["navigation"], "No Navigation Timing entry available"
         
         # Log performance data
-        print(f"Page load time: {load_time:.2f} seconds")
+        print(f"App ready after: {metrics['app_ready'] / 1000:.2f} seconds")
+        print(f"Time to First Byte: {metrics['ttfb'] / 1000:.2f} seconds")
+        print(f"DOM Content Loaded: {metrics['dom_content_loaded'] / 1000:.2f} seconds")
+        print(f"First Contentful Paint: {metrics.get('first_contentful_paint', 0) / 1000:.2f} seconds")
+        print(f"Largest Contentful Paint: {metrics.get('largest_contentful_paint', 0) / 1000:.2f} seconds")
+        print(f"Cumulative Layout Shift: {metrics.get('cumulative_layout_shift', 0):.3f}")
+        print(f"Long Tasks: {metrics['long_task_count']} ({metrics['long_task_total']:.0f} ms)")
         
-        # Execute JavaScript to get performance metrics
-        navigation_timing = driver.execute_script("""
-            var performance = window.performance || {};
-            var timings = performance.timing || {};
-            return {
-                navigationStart: timings.navigationStart,
-                responseEnd: timings.responseEnd,
-                domComplete: timings.domComplete,
-                loadEventEnd: timings.loadEventEnd
-            };
-        """)
+        print(f"Total Page Load Time: {metrics['load'] / 1000:.2f} seconds")
         
-        if navigation_timing['navigationStart']:
-            dns_time = (navigation_timing['responseEnd'] - navigation_timing['navigationStart']) / 1000
-            dom_load_time = (navigation_timing['domComplete'] - navigation_timing['navigationStart']) / 1000
-            page_load_time = (navigation_timing['loadEventEnd'] - navigation_timing['navigationStart']) / 1000
-            
-            print(f"DNS Time: {dns_time:.2f} seconds")
-            print(f"DOM Load Time: {dom_load_time:.2f} seconds")
-            print(f"Total Page Load Time: {page_load_time:.2f} seconds")
-            
-            # Assert reasonable performance
-            assert page_load_time < 10, f"Page load time ({page_load_time:.2f}s) exceeds threshold of 10s"
+        # Regressions are judged against the stored history at the end of the
+        # session (see --perf-gate) instead of a fixed threshold on one sample
     except (TimeoutException, AssertionError) as e:
         pytest.fail(f"Performance test failed: {str(e)}")
 
-def test_philips_specific_features(driver):
+def test_philips_specific_features(request, driver, app_ready, playback_monitor):
     """Test Philips TV specific features and optimizations."""
     driver.get(PHILIPS_APP_URL)
     
     # Wait for the app to load
-    WebDriverWait(driver, 20).until(
-        EC.presence_of_element_located((By.CSS_SELECTOR, ".app-container, #app, .tv-app"))
-    )
+    app_ready.wait(driver)
     
     try:
         # Check for Philips-specific UI elements or attributes
@@ -182,11 +157,11 @@ def test_philips_specific_features(driver):
         if len(video_elements) > 0:
             # If video element exists, check if it can be interacted with
             video = video_elements[0]
-            driver.execute_script("arguments[0].play()", video)
-            time.sleep(2)
-            is_playing = driver.execute_script("return !arguments[0].paused", video)
+            # Wait for a second of actual playback instead of a fixed sleep
+            is_playing = playback_monitor.play(driver, video, seconds=1, timeout=10)
             assert is_playing, "Video failed to play"
-            print("Video playback is functional")
+            record = playback_monitor.collect(driver, platform="philips", test=request.node.nodeid)
+            print(f"Video playback is functional: {record['metrics'] if record else {}}")
             
     except (NoSuchElementException, AssertionError) as e:
         pytest.fail(f"Philips-specific features test failed: {str(e)}") 
\ No newline at end of file
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Video playback QoE tests.
+Plays the local test stream in each platform's browser configuration, under
+the platform's device profile, and records time to first frame, stalls,
+dropped frames, seek latency and bitrate.
+"""
+
+import pytest
+import logging
+from selenium.webdriver.common.by import By
+from tvqa import device_profiles
+from tvqa.platforms import PLATFORMS
+
+logger = logging.getLogger(__name__)
+
+# Seconds of playback before and after the seek
+PLAY_SECONDS = 5
+SEEK_POSITION = 2
+
+
+@pytest.mark.parametrize("platform", sorted(PLATFORMS))
+def test_playback_qoe(request, platform, browser_pool, stream_server, playback_monitor, device_profile):
+    """Play, seek and keep playing the test stream, then check the QoE record."""
+    with browser_pool.lease(user_agent=PLATFORMS[platform]["user_agent"]) as driver:
+        with device_profiles.applied(driver, device_profile(platform)):
+            driver.get(stream_server.player_url)
+            video = driver.find_element(By.ID, "player")
+
+            assert playback_monitor.play(driver, video, seconds=PLAY_SECONDS), "Test stream did not play"
+            assert playback_monitor.seek(driver, video, SEEK_POSITION), "Seek did not complete"
+            assert playback_monitor.play(driver, video, seconds=SEEK_POSITION + PLAY_SECONDS), \
+                "Playback did not resume after the seek"
+
+            record = playback_monitor.collect(driver, platform=platform, test=request.node.nodeid)
+
+    assert record, "No video element was instrumented"
+    metrics = record["metrics"]
+    assert "time_to_first_frame" in metrics, "No first frame was presented"
+    logger.info(f"{platform}: first frame after {metrics['time_to_first_frame']:.0f} ms, "
+                f"{metrics['stall_count']} stall(s) ({metrics['stall_total']:.0f} ms), "
+                f"{metrics.get('dropped_frames', 0)}/{metrics.get('decoded_frames', 0)} frames dropped, "
+                f"seek {metrics.get('seek_latency_max', 0):.0f} ms, {metrics.get('bitrate_kbps', 0):.0f} kbps")
+
+    if request.config.getoption("--qoe-gate"):
+        assert not record["violations"], f"QoE budget exceeded: {record['violations']}"
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests of the replay server's URL mapping, body rewriting and archive lookup.
+"""
+
+import json
+import base64
+import pytest
+from tvqa import replay
+from tvqa.replay import ReplayServer
+
+PAGE = '<script src="https://app.example.com/main.js?v=1"></script><img src="//cdn.example.com/logo.png">'
+
+
+def entry(url, mime_type, text, method="GET", encoding=None):
+    content = {"mimeType": mime_type, "text": text}
+    if encoding:
+        content["encoding"] = encoding
+    return {"request": {"method": method, "url": url},
+            "response": {"status": 200, "headers": [], "content": content}}
+
+
+@pytest.fixture
+def server(tmp_path):
+    archive = {"log": {"entries": [
+        entry("https://app.example.com/", "text/html", PAGE),
+        entry("https://app.example.com/main.js?v=1", "application/javascript", 'fetch("/api/items")'),
+        entry("https://app.example.com/api/items", "application/json", '{"next": "https://app.example.com/api/2"}'),
+        entry("https://app.example.com/api/items", "application/json", '{"created": true}', method="POST"),
+        entry("https://cdn.example.com/logo.png", "image/png", base64.b64encode(b"\x89PNG").decode(),
+              encoding="base64"),
+        entry("https://cdn.example.com/fonts/tv.woff", "font/woff", ""),
+    ]}}
+    (tmp_path / "gw0.har").write_text(json.dumps(archive))
+    server = ReplayServer(archive_dir=str(tmp_path)).start()
+    yield server
+    server.stop()
+
+
+def test_replay_url(server):
+    assert server.replay_url("https://app.example.com/main.js?v=1") == f"{server.origin}/app.example.com/main.js?v=1"
+    assert server.replay_url("https://app.example.com") == f"{server.origin}/app.example.com/"
+
+
+def test_app_url_follows_the_active_server(server):
+    assert replay.app_url("https://app.example.com/") == "https://app.example.com/"
+    replay.activate(server)
+    try:
+        assert replay.app_url("https://app.example.com/") == f"{server.origin}/app.example.com/"
+    finally:
+        replay.activate(None)
+
+
+def test_rewrite_points_archived_hosts_at_the_server(server):
+    assert server.rewrite(PAGE) == (f'<script src="{server.origin}/app.example.com/main.js?v=1"></script>'
+                                    f'<img src="{server.origin}/cdn.example.com/logo.png">')
+    # Other hosts and look-alike host names are left alone
+    assert server.rewrite("https://other.example.com/x https://app.example.community/") == \
+        "https://other.example.com/x https://app.example.community/"
+
+
+def test_bodies_are_decoded_and_text_is_rewritten(server):
+    assert server.body(server.lookup("GET", "/cdn.example.com/logo.png")) == b"\x89PNG"
+    assert server.body(server.lookup("GET", "/app.example.com/api/items")) == \
+        f'{{"next": "{server.origin}/app.example.com/api/2"}}'.encode()
+
+
+def test_lookup_by_method_and_path(server):
+    assert server.lookup("GET", "/app.example.com/")["content"]["mimeType"] == "text/html"
+    assert server.lookup("POST", "/app.example.com/api/items")["content"]["text"] == '{"created": true}'
+    assert server.lookup("GET", "/app.example.com/missing") is None
+
+
+def test_lookup_ignores_changed_query_strings(server):
+    assert server.lookup("GET", "/app.example.com/main.js?v=2") is server.lookup("GET", "/app.example.com/main.js?v=1")
+
+
+def test_root_relative_requests_resolve_against_the_referer(server):
+    referer = f"{server.origin}/cdn.example.com/styles.css"
+    assert server.lookup("GET", "/fonts/tv.woff", referer=referer)["content"]["mimeType"] == "font/woff"
+    # An unrewritten page of an archived host
+    assert server.lookup("GET", "/fonts/tv.woff", referer="https://cdn.example.com/") is not None
+
+
+def test_root_relative_requests_fall_back_to_the_primary_host(server):
+    assert server.primary_host == "app.example.com"
+    assert server.lookup("GET", "/api/items")["content"]["mimeType"] == "application/json"
+    assert server.lookup("GET", "/api/items", referer="https://elsewhere.example.com/") is not None
+    assert server.lookup("GET", "/fonts/tv.woff") is None
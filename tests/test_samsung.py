@@ -1,13 +1,15 @@
 import pytest
-import time
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from tvqa.replay import app_url
 
 # Use a reliable public website for testing
-TEST_URL = "https://www.google.com"
+TEST_URL = app_url("https://www.google.com")
+
+# Samsung TV browser user agent
+USER_AGENT = "Mozilla/5.0 (SMART-TV; SAMSUNG; Tizen) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 
 # Different screen resolutions to test
 RESOLUTIONS = [
@@ -16,22 +18,12 @@ RESOLUTIONS = [
 ]
 
 @pytest.fixture
-def driver():
-    """Set up WebDriver for Samsung TV tests."""
-    options = webdriver.ChromeOptions()
-    # options.add_argument("--headless")  # Uncomment for headless mode
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--user-agent=Mozilla/5.0 (SMART-TV; SAMSUNG; Tizen) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
-    
-    driver = webdriver.Chrome(options=options)
-    driver.set_page_load_timeout(30)
-    
-    yield driver
-    
-    driver.quit()
+def driver(browser_pool):
+    """Lease a warm WebDriver for Samsung TV tests."""
+    with browser_pool.lease(user_agent=USER_AGENT) as driver:
+        yield driver
 
-def test_website_loads(driver):
+def test_website_loads(request, driver, screenshot_service):
     """Test that we can load a website successfully."""
     driver.get(TEST_URL)
     
@@ -43,17 +35,13 @@ def test_website_loads(driver):
         print("Website loaded successfully")
         
         # Take a screenshot to verify
-        screenshot_dir = "artifacts/screenshots"
-        import os
-        if not os.path.exists(screenshot_dir):
-            os.makedirs(screenshot_dir)
-        driver.save_screenshot(f"{screenshot_dir}/samsung_test_success.png")
+        screenshot_service.capture(driver, "samsung_test_success", test=request.node.nodeid, platform="samsung")
         
         assert True  # Test passes if we get to this point
     except TimeoutException:
         pytest.fail("Website failed to load within the timeout period")
 
-def test_responsive_design(driver):
+def test_responsive_design(request, driver, responsive_sweep):
     """Test website at different resolutions."""
     driver.get(TEST_URL)
     
@@ -62,18 +50,13 @@ def test_responsive_design(driver):
         EC.presence_of_element_located((By.CSS_SELECTOR, "body"))
     )
     
-    # Test different resolutions
-    for width, height in RESOLUTIONS:
-        print(f"Testing resolution: {width}x{height}")
-        driver.set_window_size(width, height)
-        time.sleep(1)  # Short delay to allow UI to adjust
-        
-        # Take a screenshot at this resolution
-        screenshot_dir = "artifacts/screenshots"
-        import os
-        if not os.path.exists(screenshot_dir):
-            os.makedirs(screenshot_dir)
-        driver.save_screenshot(f"{screenshot_dir}/samsung_resolution_{width}x{height}.png")
+    # Test different resolutions by emulating each viewport in place and
+    # taking a screenshot at this resolution
+    sweep = responsive_sweep.sweep(driver, "samsung", RESOLUTIONS, url=TEST_URL, user_agent=USER_AGENT,
+                                   name="resolution", test=request.node.nodeid)
+    for result in sweep["resolutions"]:
+        print(f"Tested resolution: {result['width']}x{result['height']} in {result['elapsed']:.2f} seconds")
+    print(f"Responsive sweep took {sweep['elapsed']:.2f} seconds")
 
 # NOTE: This file has been modified to use a public website as a test target
 # instead of the actual TV 2 Play Samsung app to verify that the test infrastructure
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests of the duration-aware test scheduler.
+"""
+
+from tvqa.scheduler import DEFAULT_DURATION, expected_duration, group_key, makespan, plan
+
+DURATIONS = {
+    "tests/test_a.py::TestA::test_one": 5.0,
+    "tests/test_a.py::TestA::test_two": 5.0,
+    "tests/test_b.py::test_one": 8.0,
+    "tests/test_c.py::test_one": 3.0,
+    "tests/test_c.py::test_two": 4.0,
+}
+
+
+def test_tests_of_a_class_or_module_share_a_group():
+    assert group_key("tests/test_a.py::TestA::test_one") == "tests/test_a.py::TestA"
+    assert group_key("tests/test_c.py::test_two") == "tests/test_c.py"
+
+
+def test_unknown_tests_get_the_median_duration():
+    assert expected_duration("tests/test_b.py::test_one", DURATIONS) == 8.0
+    assert expected_duration("tests/test_new.py::test_one", DURATIONS) == 5.0
+    assert expected_duration("tests/test_new.py::test_one", {}) == DEFAULT_DURATION
+
+
+def test_longest_groups_go_first_onto_the_least_loaded_worker():
+    bins = plan(list(DURATIONS), DURATIONS, workers=2)
+    assert [entry["tests"] for entry in bins] == [
+        ["tests/test_a.py::TestA::test_one", "tests/test_a.py::TestA::test_two"],
+        ["tests/test_b.py::test_one", "tests/test_c.py::test_one", "tests/test_c.py::test_two"],
+    ]
+    assert [entry["expected"] for entry in bins] == [10.0, 15.0]
+    assert makespan(bins) == 15.0
+
+
+def test_groups_are_never_split():
+    for workers in range(1, 6):
+        bins = plan(list(DURATIONS), DURATIONS, workers=workers)
+        assert sorted(test for entry in bins for test in entry["tests"]) == sorted(DURATIONS)
+        # Every group lands in exactly one bin
+        groups = [group for entry in bins for group in {group_key(test) for test in entry["tests"]}]
+        assert sorted(groups) == sorted({group_key(test) for test in DURATIONS})
+
+
+def test_no_more_workers_than_groups():
+    bins = plan(list(DURATIONS), DURATIONS, workers=8)
+    assert len(bins) == 3
+    assert makespan(bins) == 10.0
+
+
+def test_empty_plan():
+    bins = plan([], DURATIONS, workers=4)
+    assert bins == [{"tests": [], "expected": 0.0}]
+    assert makespan(bins) == 0.0
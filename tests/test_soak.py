@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests of the soak trend fit.
+"""
+
+import pytest
+from tvqa.soak import fit_trend
+
+
+def test_steady_growth():
+    xs = list(range(10))
+    trend = fit_trend(xs, [2 * x + 1 for x in xs])
+    assert trend == pytest.approx({"slope": 2.0, "growth": 18.0, "r2": 1.0, "monotonic": 1.0})
+
+
+def test_flat_series():
+    trend = fit_trend(list(range(5)), [7.0] * 5)
+    assert trend == {"slope": 0.0, "growth": 0.0, "r2": 0.0, "monotonic": 1.0}
+
+
+def test_sawtooth_without_growth():
+    # Memory freed by GC every other iteration
+    xs = list(range(8))
+    trend = fit_trend(xs, [10, 12] * 4)
+    assert trend["slope"] == pytest.approx(0.0952, abs=1e-4)
+    assert trend["r2"] < 0.1
+    assert trend["monotonic"] == pytest.approx(4 / 7)
+
+
+def test_noisy_growth_over_sampled_iterations():
+    xs = [0, 5, 10, 15, 20]
+    trend = fit_trend(xs, [100, 112, 118, 133, 139])
+    assert trend["slope"] == pytest.approx(1.98)
+    assert trend["growth"] == pytest.approx(39.6)
+    assert trend["r2"] > 0.98
+    assert trend["monotonic"] == 1.0
+
+
+def test_single_sample():
+    assert fit_trend([0], [5]) == {"slope": 0.0, "growth": 0.0, "r2": 0.0, "monotonic": 0.0}
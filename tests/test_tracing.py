@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests of the streaming trace parser and the main-thread summary.
+"""
+
+import json
+import pytest
+from tvqa.tracing import TraceEventParser, read_trace, summarise
+
+MAIN = {"pid": 1, "tid": 10}
+WORKER = {"pid": 1, "tid": 11}
+APP_SCRIPT = "https://app.example.com/main.js"
+
+EVENTS = [
+    dict(MAIN, ph="M", name="thread_name", args={"name": "CrRendererMain"}),
+    dict(WORKER, ph="M", name="thread_name", args={"name": "DedicatedWorker thread"}),
+    # A 60 ms task: script with a nested 10 ms layout
+    dict(MAIN, ph="X", name="FunctionCall", ts=1000, dur=60000, args={"data": {"url": APP_SCRIPT}}),
+    dict(MAIN, ph="X", name="Layout", ts=20000, dur=10000),
+    # A short paint after it
+    dict(MAIN, ph="X", name="Paint", ts=70000, dur=5000),
+    # Another thread's work does not count
+    dict(WORKER, ph="X", name="FunctionCall", ts=0, dur=90000, args={"data": {"url": "https://w.example.com/w.js"}}),
+    dict(MAIN, ph="X", name="Ünïcode ✓", ts=80000, dur=1000),
+]
+
+
+def trace_text(events=EVENTS):
+    return json.dumps({"traceEvents": events, "metadata": {"source": "test"}}, ensure_ascii=False)
+
+
+def test_events_split_at_every_position():
+    text = trace_text()
+    for split in range(len(text) + 1):
+        parser = TraceEventParser()
+        events = parser.feed(text[:split]) + parser.feed(text[split:])
+        assert events == EVENTS, f"split at {split}"
+
+
+def test_events_fed_one_character_at_a_time():
+    parser = TraceEventParser()
+    events = []
+    for character in trace_text():
+        events.extend(parser.feed(character))
+    assert events == EVENTS
+    # Whatever follows the array is ignored
+    assert parser.feed('{"name": "late"}') == []
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1024])
+def test_read_trace_in_chunks(tmp_path, chunk_size):
+    path = tmp_path / "trace.json"
+    path.write_bytes(trace_text().encode("utf-8"))
+    assert list(read_trace(str(path), chunk_size=chunk_size)) == EVENTS
+
+
+def test_summarise_main_thread(tmp_path):
+    path = tmp_path / "trace.json"
+    path.write_bytes(trace_text().encode("utf-8"))
+    summary = summarise(str(path))
+    assert summary["events"] == len(EVENTS)
+    assert summary["main_thread"]["scripting"] == pytest.approx(50.0)
+    assert summary["main_thread"]["style_layout"] == pytest.approx(10.0)
+    assert summary["main_thread"]["paint"] == pytest.approx(5.0)
+    assert summary["main_thread"]["other"] == pytest.approx(1.0)
+    assert summary["main_thread_total"] == pytest.approx(66.0)
+    assert summary["long_tasks"] == [{"url": APP_SCRIPT, "count": 1, "total": 60.0, "max": 60.0}]
@@ -6,71 +6,51 @@ Regression test for TV 2 Play LG application.
 This script performs automated testing on the LG TV app to ensure its functionality.
 """
 
-import os
-import time
 import pytest
 import logging
-from datetime import datetime
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from webdriver_manager.chrome import ChromeDriverManager
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("tv2play_lg_test.log"),
-        logging.StreamHandler()
-    ]
-)
+from tvqa import cdp, dom, soak, network
+from tvqa.replay import app_url
+from tvqa.platforms import PLATFORMS
 
 logger = logging.getLogger(__name__)
 
 # Constants
 # Using the actual TV 2 Play LG URL
-BASE_URL = "https://ctv.play.tv2.no/production/play/lg/index.html"
+BASE_URL = app_url(PLATFORMS["lg"]["url"])
 TIMEOUT = 10  # seconds
 
+# Set user agent to simulate LG TV browser
+USER_AGENT = PLATFORMS["lg"]["user_agent"]
+
 class TestTV2PlayLG:
     """Test suite for TV 2 Play LG app."""
 
-    @classmethod
-    def setup_class(cls):
-        """Set up the test environment."""
+    @pytest.fixture(scope="class", autouse=True)
+    def class_driver(self, request, browser_pool, app_ready, device_profile, screenshot_service, visual_diff):
+        """Lease a warm browser from the session pool for this test class."""
         logger.info("Setting up test environment")
 
-        # Configure Chrome options
-        chrome_options = Options()
-        chrome_options.add_argument("--window-size=1920,1080")
-        chrome_options.add_argument("--disable-extensions")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-
-        # For headless mode, uncomment the line below
-        # chrome_options.add_argument("--headless")
-
-        # Set user agent to simulate LG TV browser
-        chrome_options.add_argument("--user-agent=Mozilla/5.0 (Web0S; Linux/SmartTV) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/79.0.3945.79 Safari/537.36")
-
-        # Initialize the Chrome driver
-        cls.driver = webdriver.Chrome(options=chrome_options)
+        with browser_pool.lease(user_agent=USER_AGENT) as driver:
+            request.cls.driver = driver
+            request.cls.wait = WebDriverWait(driver, TIMEOUT)
+            request.cls.app_ready = app_ready
+            request.cls.device_profile = device_profile("lg")
+            request.cls.screenshots = screenshot_service
+            request.cls.visual_diff = visual_diff
+            yield driver
 
-        cls.driver.maximize_window()
-        cls.wait = WebDriverWait(cls.driver, TIMEOUT)
+        logger.info("Tearing down test environment")
 
     def setup_method(self):
         """Set up method to run before each test."""
         logger.info("Navigating to TV 2 Play LG app")
         self.driver.get(BASE_URL)
-        # Allow page to load completely
-        time.sleep(5)  # Increase wait time to 5 seconds
+        # Wait until the app is idle instead of sleeping a fixed amount of time
+        self.app_ready.wait(self.driver, raise_on_timeout=False)
 
     def test_page_loads(self):
         """Test if the TV 2 Play page loads properly."""
@@ -91,22 +71,11 @@ class TestTV2PlayLG:
         # Take a screenshot first for reference
         self.take_screenshot("ui_elements")
         
-        # Check if there are any elements in the DOM
-        body = self.driver.find_element(By.TAG_NAME, "body")
-        
-        # Get all elements inside body
-        all_elements = body.find_elements(By.XPATH, "//*")
-        visible_elements = []
-        
-        # Count visible elements
-        for element in all_elements[:20]:  # Limit to first 20 elements for performance
-            try:
-                if element.is_displayed():
-                    tag_name = element.tag_name
-                    visible_elements.append(tag_name)
-                    logger.info(f"Found visible element: {tag_name}")
-            except:
-                pass
+        # Inspect the whole DOM with a single WebDriver round-trip
+        all_elements = dom.inspect_dom(self.driver)
+        visible_elements = dom.visible_elements(all_elements)
+        logger.info(f"Inspected {len(all_elements)} elements, visible by tag: "
+                    f"{dom.count_by_tag(visible_elements)}")
         
         # If we found at least some elements, the test passes
         num_elements = len(visible_elements)
@@ -119,53 +88,132 @@ class TestTV2PlayLG:
             logger.error("Could not find any visible elements in the page")
             pytest.fail("No visible UI elements found in the app")
 
-    def test_responsive_design(self):
-        """Test responsive design of the application."""
+    def test_responsive_design(self, request, responsive_sweep):
+        """Test responsive design of the application against the visual baselines."""
         logger.info("Testing responsive design")
 
-        # Get initial window size
-        initial_size = self.driver.get_window_size()
-
         # Test different resolutions
         resolutions = [
-            {"width": 1280, "height": 720},   # 720p
-            {"width": 1920, "height": 1080},  # 1080p
+            (1280, 720),   # 720p
+            (1920, 1080),  # 1080p
         ]
 
-        for resolution in resolutions:
-            width = resolution["width"]
-            height = resolution["height"]
-            logger.info(f"Testing resolution: {width}x{height}")
-
-            # Set window size
-            self.driver.set_window_size(width, height)
-            time.sleep(1)
-
-            # Take a screenshot
-            self.take_screenshot(f"responsive_{width}x{height}")
-
-            # Verify the page still loads properly at this resolution
-            assert "TV 2 Play" in self.driver.title, f"Page title is incorrect at resolution {width}x{height}"
-
-        # Reset to initial size
-        self.driver.set_window_size(initial_size["width"], initial_size["height"])
+        # Viewports are emulated in place; the app is only reloaded if it ignores the resize
+        sweep = responsive_sweep.sweep(self.driver, "lg", resolutions, url=BASE_URL, user_agent=USER_AGENT,
+                                       test=request.node.nodeid)
+        logger.info(f"Responsive sweep took {sweep['elapsed']:.2f}s")
+
+        for result in sweep["resolutions"]:
+            width, height = result["width"], result["height"]
+            logger.info(f"Testing resolution: {width}x{height}, layout: {result['layout']}")
+
+            # Compare the screenshot with the baseline of this resolution
+            self.visual_diff.verify(result["screenshot"]["path"], "lg", "responsive", width, height,
+                                    test=request.node.nodeid)
+
+            assert abs(result["layout"]["inner_width"] - width) <= 10, f"Viewport is not {width} wide"
+
+        # Verify the page still loads properly after the sweep
+        assert "TV 2 Play" in self.driver.title, "Page title is incorrect after the responsive sweep"
+
+    def test_remote_navigation(self, remote_control):
+        """Navigate with the remote's D-pad and measure how fast focus follows each key."""
+        logger.info("Testing remote control navigation")
+
+        remote = remote_control(self.driver, "lg")
+        presses = remote.sequence(["right", "right", "down", "left", "up", "down", "right", "left"])
+
+        moved = [press for press in presses if press["focus_changed"]]
+        for press in moved:
+            logger.info(f"{press['key']}: focus after {press['focus_latency']:.1f} ms, "
+                        f"next frame after {press['frame_latency'] or 0:.1f} ms")
+        assert moved, "Focus never moved in response to the remote's arrow keys"
+
+    def test_focus_graph(self, focus_crawler):
+        """Crawl the app with the remote's keys and store its focus graph (needs --crawl)."""
+        logger.info("Crawling the focus graph")
+
+        summary = focus_crawler(self.driver, "lg", BASE_URL)
+
+        logger.info(f"Reached {summary['states']} states over {summary['edges']} edges")
+        assert summary["edges"] > 0, "The crawler could not follow any key press"
+
+    def test_soak_navigation(self, request, remote_control, soak_run):
+        """Browse in a loop for a long time and check that memory does not keep growing (needs --soak)."""
+        logger.info("Soaking the app with repeated navigation")
+
+        remote = remote_control(self.driver, "lg")
+
+        def browse(iteration):
+            # Walk along a row, open the focused item, go back and return to the start
+            for key in ["right", "right", "down", "ok"]:
+                remote.press(key, record=False)
+            self.app_ready.wait(self.driver, raise_on_timeout=False)
+            remote.press("back", record=False)
+            self.app_ready.wait(self.driver, raise_on_timeout=False)
+            for key in ["up", "left", "left"]:
+                remote.press(key, record=False)
+
+        result = soak_run(self.driver, "lg", browse, test=request.node.nodeid)
+
+        logger.info(f"Soaked {result['iterations']} iterations in {result['elapsed']:.0f}s, "
+                    f"heap snapshots: {result['snapshots']}")
+        assert not result["leaks"], "Memory grows steadily while browsing: " + "; ".join(
+            soak.format_leak(result, metric) for metric in result["leaks"])
+
+    def test_performance_metrics(self, request, perf_collector):
+        """Collect page load, paint and responsiveness metrics of the app."""
+        logger.info("Testing performance metrics")
+
+        record = perf_collector.measure(self.driver, BASE_URL, self.app_ready, platform="lg",
+                                        test=request.node.nodeid, profile=self.device_profile)
+        metrics = record["metrics"]
+
+        assert record["navigation"], "No Navigation Timing entry available"
+        logger.info(f"Time to first byte: {metrics['ttfb']:.0f} ms")
+        logger.info(f"First contentful paint: {metrics.get('first_contentful_paint', 0):.0f} ms")
+        logger.info(f"Largest contentful paint: {metrics.get('largest_contentful_paint', 0):.0f} ms")
+        logger.info(f"Load event end: {metrics['load']:.0f} ms")
+        logger.info(f"Long tasks: {metrics['long_task_count']} ({metrics['long_task_total']:.0f} ms)")
+
+    def test_network_budget(self, request, network_recorder, network_driver):
+        """Record the network waterfall of a cold app load and check it against the lg budget."""
+        logger.info("Testing network resource budget")
+
+        # A browser of its own with the Network events buffered
+        cdp.set_user_agent(network_driver, USER_AGENT)
+        result = network_recorder.record(network_driver, BASE_URL, self.app_ready, platform="lg",
+                                         test=request.node.nodeid)
+        summary = result["summary"]
+
+        assert summary["request_count"], "No requests were recorded during the app load"
+        logger.info(f"{summary['request_count']} requests, {summary['transfer_bytes'] / 1024:.0f} KiB transferred, "
+                    f"{summary['script_bytes'] / 1024:.0f} KiB of scripts, cache: {summary['cache']}")
+        assert not result["violations"], "Network budget exceeded: " + "; ".join(
+            network.format_violation(violation) for violation in result["violations"])
+
+    def test_cache_modes(self, cache_meter):
+        """Measure the app load with a cold cache and with a warm, persistent profile."""
+        logger.info("Testing cold and warm cache loads")
+
+        results = cache_meter.measure("lg", BASE_URL, self.driver, user_agent=USER_AGENT,
+                                      profile=self.device_profile)
+
+        for mode, metrics in results.items():
+            assert metrics, f"No navigation timing available for the {mode} load"
+            logger.info(f"{mode} load: {metrics['load']:.0f} ms, "
+                        f"{metrics['transfer_bytes']} bytes transferred, "
+                        f"{metrics['cached_resources']}/{metrics['resource_count']} resources from cache")
 
     def take_screenshot(self, name):
-        """Take a screenshot for documentation and debugging."""
-        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-        screenshot_dir = "artifacts/screenshots"
-        if not os.path.exists(screenshot_dir):
-            os.makedirs(screenshot_dir)
-
-        screenshot_path = os.path.join(screenshot_dir, f"tv2play_lg_{name}_{timestamp}.png")
-        self.driver.save_screenshot(screenshot_path)
-        logger.info(f"Screenshot saved to {screenshot_path}")
-
-    @classmethod
-    def teardown_class(cls):
-        """Clean up after all tests are run."""
-        logger.info("Tearing down test environment")
-        cls.driver.quit()
+        """Take a screenshot for documentation and debugging.
+
+        The frame is written in the background; identical frames are stored once.
+        Returns a future of the stored screenshot's manifest entry.
+        """
+        capture = self.screenshots.capture(self.driver, f"tv2play_lg_{name}", platform="lg")
+        logger.info(f"Screenshot tv2play_lg_{name} queued for writing")
+        return capture
 
 
 if __name__ == "__main__":
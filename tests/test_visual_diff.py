@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests of the tile-hash and SSIM visual comparison.
+"""
+
+import os
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from tvqa.visual_diff import PIXEL_THRESHOLD, VisualDiff
+
+WIDTH, HEIGHT = 256, 192
+
+
+def save(pixels, path):
+    Image.fromarray(pixels).save(path)
+    return str(path)
+
+
+@pytest.fixture
+def screen():
+    # A noisy but smooth-ish image, so SSIM has structure to compare
+    random = np.random.default_rng(7)
+    return (random.integers(0, 64, (HEIGHT, WIDTH, 3)) + 96).astype(np.uint8)
+
+
+@pytest.fixture
+def visual_diff(tmp_path, screen):
+    diff = VisualDiff(baselines_dir=str(tmp_path / "baselines"), diffs_dir=str(tmp_path / "diffs"))
+    result = diff.check(save(screen, tmp_path / "baseline.png"), "lg", "home", WIDTH, HEIGHT)
+    assert result["status"] == "new baseline"
+    assert os.path.exists(diff.baseline_path("lg", "home", WIDTH, HEIGHT))
+    return diff
+
+
+def test_identical_capture_matches_without_pixel_work(tmp_path, screen, visual_diff):
+    result = visual_diff.check(save(screen, tmp_path / "capture.png"), "lg", "home", WIDTH, HEIGHT)
+    assert result["status"] == "match"
+    # 256x192 in 64 pixel tiles
+    assert result["total_tiles"] == 12
+    assert result["changed_tiles"] == 0
+    assert result["ssim"] == 1.0
+
+
+def test_change_below_the_pixel_threshold_is_not_counted(tmp_path, screen, visual_diff):
+    capture = screen.copy()
+    capture[10:20, 10:20] += PIXEL_THRESHOLD
+    result = visual_diff.check(save(capture, tmp_path / "capture.png"), "lg", "home", WIDTH, HEIGHT)
+    assert result["changed_tiles"] == 1
+    assert result["changed_pixels"] == 0
+    assert result["status"] == "match"
+
+
+def test_few_changed_pixels_match(tmp_path, screen, visual_diff):
+    capture = screen.copy()
+    capture[100, 200] = (255, 0, 0)
+    result = visual_diff.check(save(capture, tmp_path / "capture.png"), "lg", "home", WIDTH, HEIGHT)
+    assert result["changed_tiles"] == 1
+    assert result["changed_pixels"] == 1
+    assert result["changed_ratio"] == pytest.approx(1 / (WIDTH * HEIGHT))
+    assert result["status"] == "match"
+    assert result["diff"] is None
+
+
+def test_changed_region_is_a_mismatch_with_a_diff_image(tmp_path, screen, visual_diff):
+    capture = screen.copy()
+    # Straddles the corner of four tiles
+    capture[48:80, 48:80] = 255
+    result = visual_diff.check(save(capture, tmp_path / "capture.png"), "lg", "home", WIDTH, HEIGHT)
+    assert result["status"] == "mismatch"
+    assert result["changed_tiles"] == 4
+    assert result["changed_pixels"] == 32 * 32
+    assert result["ssim"] < visual_diff.min_ssim
+    assert os.path.exists(result["diff"])
+
+
+def test_ssim_threshold_alone_can_fail_a_capture(tmp_path, screen, visual_diff):
+    # Shuffle one tile: pixel values keep their distribution but lose their structure
+    capture = screen.copy()
+    tile = capture[:64, :64].reshape(-1, 3)
+    capture[:64, :64] = np.random.default_rng(1).permutation(tile).reshape(64, 64, 3)
+    lenient = VisualDiff(baselines_dir=visual_diff.baselines_dir, diffs_dir=visual_diff.diffs_dir,
+                         max_changed_ratio=1.0)
+    result = lenient.check(save(capture, tmp_path / "capture.png"), "lg", "home", WIDTH, HEIGHT)
+    assert result["changed_ratio"] <= lenient.max_changed_ratio
+    assert result["ssim"] < lenient.min_ssim
+    assert result["status"] == "mismatch"
+
+
+def test_size_mismatch(tmp_path, screen, visual_diff):
+    result = visual_diff.check(save(screen[:, :128], tmp_path / "capture.png"), "lg", "home", WIDTH, HEIGHT)
+    assert result["status"] == "size mismatch"
+
+
+def test_verify_fails_on_mismatch_when_asked(tmp_path, screen, visual_diff):
+    visual_diff.fail_on_mismatch = True
+    capture = screen.copy()
+    capture[:64, :64] = 0
+    with pytest.raises(AssertionError, match="Visual regression"):
+        visual_diff.verify(save(capture, tmp_path / "capture.png"), "lg", "home", WIDTH, HEIGHT)
@@ -0,0 +1,8 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Shared helpers for the TV 2 Play Smart TV test suite.
+Fixtures in conftest.py build on these modules; tests should not need to import
+Selenium plumbing directly.
+"""
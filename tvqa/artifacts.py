@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Per-run artifact directories with an SQLite index and a retention policy.
+Screenshots, diffs, logs and reports of a run live under
+``artifacts/runs/<run_id>/`` and every file is indexed by run, test,
+platform, kind and content hash, so questions like "failure screenshots of
+test X in the last 5 runs" are one query. Older runs are zipped, and runs are
+evicted once they are too old or the total size exceeds the budget.
+"""
+
+import os
+import time
+import shutil
+import sqlite3
+import logging
+import zipfile
+
+import pytest
+
+logger = logging.getLogger(__name__)
+
+ARTIFACTS_DIR = "artifacts"
+INDEX_NAME = "index.sqlite"
+
+# Default retention policy
+KEEP_UNCOMPRESSED = 5
+MAX_AGE_DAYS = 30
+MAX_BYTES = 2 * 1024 ** 3
+
+_STORE_KEY = pytest.StashKey()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    compressed INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    test TEXT,
+    platform TEXT,
+    kind TEXT NOT NULL,
+    hash TEXT,
+    path TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifacts_lookup ON artifacts (test, kind, run_id);
+CREATE INDEX IF NOT EXISTS artifacts_run ON artifacts (run_id);
+"""
+
+
+class ArtifactStore:
+    """Index and retention of the per-run artifact directories."""
+
+    def __init__(self, root=ARTIFACTS_DIR):
+        self.root = root
+        self.runs_dir = os.path.join(root, "runs")
+        self.index_path = os.path.join(root, INDEX_NAME)
+        os.makedirs(self.runs_dir, exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    def _connect(self):
+        # Workers and the screenshot thread write concurrently; wait for the lock
+        return sqlite3.connect(self.index_path, timeout=30)
+
+    def run_dir(self, run_id):
+        """Directory holding the artifacts of ``run_id``."""
+        return os.path.join(self.runs_dir, run_id)
+
+    def start_run(self, run_id):
+        os.makedirs(self.run_dir(run_id), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("INSERT OR IGNORE INTO runs (run_id, created_at) VALUES (?, ?)",
+                               (run_id, time.time()))
+
+    def add(self, run_id, kind, path, test=None, platform=None, digest=None, copy=False):
+        """Index the file at ``path`` as an artifact of ``run_id``.
+
+        Files outside the run directory are copied into ``<run>/<kind>/`` when
+        ``copy`` is set, otherwise they are indexed where they are.
+        """
+        if copy:
+            target_dir = os.path.join(self.run_dir(run_id), kind)
+            os.makedirs(target_dir, exist_ok=True)
+            target = os.path.join(target_dir, os.path.basename(path))
+            shutil.copyfile(path, target)
+            path = target
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO artifacts (run_id, test, platform, kind, hash, path, bytes, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, test, platform, kind, digest, os.path.relpath(path, self.run_dir(run_id)),
+                 os.path.getsize(path), time.time())
+            )
+        return path
+
+    def find(self, test=None, kind=None, platform=None, last_runs=None):
+        """Artifacts matching the filters, newest run first, limited to the ``last_runs`` most recent runs."""
+        conditions, parameters = [], []
+        for column, value in (("test", test), ("kind", kind), ("platform", platform)):
+            if value is not None:
+                conditions.append(f"a.{column} = ?")
+                parameters.append(value)
+        if last_runs is not None:
+            conditions.append("a.run_id IN (SELECT run_id FROM runs ORDER BY created_at DESC LIMIT ?)")
+            parameters.append(last_runs)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._connect() as connection:
+            connection.row_factory = sqlite3.Row
+            rows = connection.execute(
+                "SELECT a.*, r.compressed FROM artifacts a JOIN runs r ON r.run_id = a.run_id "
+                f"{where} ORDER BY r.created_at DESC, a.created_at", parameters
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def read(self, artifact):
+        """Contents of an artifact returned by find(), from its directory or its run's archive."""
+        if artifact["compressed"]:
+            with zipfile.ZipFile(self.run_dir(artifact["run_id"]) + ".zip") as archive:
+                return archive.read(artifact["path"].replace(os.sep, "/"))
+        with open(os.path.join(self.run_dir(artifact["run_id"]), artifact["path"]), "rb") as f:
+            return f.read()
+
+    def compress(self, run_id):
+        """Replace the directory of ``run_id`` with a zip archive."""
+        directory = self.run_dir(run_id)
+        if os.path.isdir(directory):
+            shutil.make_archive(directory, "zip", directory)
+            shutil.rmtree(directory)
+        with self._connect() as connection:
+            connection.execute("UPDATE runs SET compressed = 1 WHERE run_id = ?", (run_id,))
+
+    def evict(self, run_id):
+        """Delete every artifact of ``run_id`` and its index entries."""
+        shutil.rmtree(self.run_dir(run_id), ignore_errors=True)
+        if os.path.exists(self.run_dir(run_id) + ".zip"):
+            os.remove(self.run_dir(run_id) + ".zip")
+        with self._connect() as connection:
+            connection.execute("DELETE FROM artifacts WHERE run_id = ?", (run_id,))
+            connection.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+
+    def run_size(self, run_id):
+        """Bytes ``run_id`` takes on disk."""
+        archive = self.run_dir(run_id) + ".zip"
+        if os.path.exists(archive):
+            return os.path.getsize(archive)
+        total = 0
+        for directory, _, filenames in os.walk(self.run_dir(run_id)):
+            total += sum(os.path.getsize(os.path.join(directory, filename)) for filename in filenames)
+        return total
+
+    def apply_retention(self, keep_uncompressed=KEEP_UNCOMPRESSED, max_age_days=MAX_AGE_DAYS, max_bytes=MAX_BYTES,
+                        current_run=None):
+        """Compress all but the newest runs, then evict runs by age and total size.
+
+        The oldest runs go first when the total exceeds ``max_bytes``;
+        ``current_run`` is never touched.
+        """
+        start_time = time.time()
+        with self._connect() as connection:
+            runs = connection.execute(
+                "SELECT run_id, created_at, compressed FROM runs ORDER BY created_at DESC"
+            ).fetchall()
+        runs = [run for run in runs if run[0] != current_run]
+
+        compressed, evicted = 0, []
+        for position, (run_id, created_at, is_compressed) in enumerate(runs):
+            if position >= keep_uncompressed and not is_compressed:
+                self.compress(run_id)
+                compressed += 1
+
+        sizes = [(run_id, created_at, self.run_size(run_id)) for run_id, created_at, _ in runs]
+        total = sum(size for _, _, size in sizes)
+        if current_run is not None:
+            total += self.run_size(current_run)
+        for run_id, created_at, size in reversed(sizes):
+            too_old = max_age_days is not None and start_time - created_at > max_age_days * 86400
+            over_budget = max_bytes is not None and total > max_bytes
+            if too_old or over_budget:
+                self.evict(run_id)
+                evicted.append(run_id)
+                total -= size
+            else:
+                # Runs are visited oldest first; once one is kept, newer ones are within both limits
+                break
+
+        with self._connect() as connection:
+            for run_id, _, size in sizes:
+                if run_id not in evicted:
+                    connection.execute("UPDATE runs SET bytes = ? WHERE run_id = ?", (size, run_id))
+
+        logger.info(f"Artifact retention: {compressed} run(s) compressed, {len(evicted)} evicted, "
+                    f"{total / 1e6:.1f} MB kept in {time.time() - start_time:.2f} seconds")
+        return {"compressed": compressed, "evicted": evicted, "bytes": total}
+
+
+def install(config, root=ARTIFACTS_DIR):
+    """Open the artifact store of the session (call from pytest_configure)."""
+    config.stash[_STORE_KEY] = ArtifactStore(root)
+    return config.stash[_STORE_KEY]
+
+
+def store(config):
+    """The artifact store opened by :func:`install`."""
+    return config.stash[_STORE_KEY]
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Repeated-sampling load benchmark of the TV apps.
+Each platform app is loaded N times after a number of discarded warm-up loads.
+Loads are interleaved across platforms (with the platform order rotated every
+round) so that drift over time - network conditions, thermal throttling -
+does not bias any single platform. Every measured load starts from a cleared
+HTTP cache. Records and results are stored with the run's artifacts.
+"""
+
+import os
+import json
+import time
+import logging
+
+from tvqa import workers, device_profiles
+from tvqa.artifacts import ArtifactStore
+from tvqa.browser_pool import BrowserPool
+from tvqa.cache_modes import clear_browser_state
+from tvqa.drivers import DriverService
+from tvqa.perf_collector import PerfCollector
+from tvqa.perf_store import PerfStore, run_mode
+from tvqa.platforms import PLATFORMS
+from tvqa.readiness import AppReadiness
+from tvqa.replay import app_url
+from tvqa.stats import describe
+
+logger = logging.getLogger(__name__)
+
+
+def schedule(platforms, iterations, warmup):
+    """Interleaved load order: ``[(round, platform, is_warmup), ...]``."""
+    order = []
+    for round_index in range(warmup + iterations):
+        shift = round_index % len(platforms)
+        for platform in platforms[shift:] + platforms[:shift]:
+            order.append((round_index, platform, round_index < warmup))
+    return order
+
+
+def run_benchmark(platforms, iterations=10, warmup=2, headless=False, history_path=None, build="unknown",
+                  device_profile="auto", artifact_store=None):
+    """Load every platform app repeatedly and return per-platform, per-metric statistics.
+
+    Loads run under each platform's device profile unless ``device_profile``
+    names another one or is "none".
+    """
+    app_ready = AppReadiness()
+    store = PerfStore(history_path, mode=run_mode(headless=headless)) if history_path else None
+    artifact_store = artifact_store or ArtifactStore()
+    run_id = os.environ.get("TVQA_RUN_ID") or workers.new_run_id()
+    artifact_store.start_run(run_id)
+    collector = PerfCollector(os.path.join(artifact_store.run_dir(run_id), "perf"), listeners=[
+        lambda record: store.add_record(run_id, build, record)
+    ] if store else [])
+    service = DriverService().start()
+    pool = BrowserPool(size=1, headless=headless, launch_hooks=[app_ready.install, collector.install],
+                       driver_service=service).start()
+
+    samples = {platform: {} for platform in platforms}
+    start_time = time.time()
+    try:
+        for round_index, platform, is_warmup in schedule(platforms, iterations, warmup):
+            url = app_url(PLATFORMS[platform]["url"])
+            profile = device_profiles.select(platform, device_profile)
+            with pool.lease(user_agent=PLATFORMS[platform]["user_agent"]) as driver:
+                if is_warmup:
+                    clear_browser_state(driver, url)
+                    with device_profiles.applied(driver, profile):
+                        driver.get(url)
+                        app_ready.wait(driver, raise_on_timeout=False)
+                    logger.info(f"Warm-up load {round_index + 1}/{warmup} of {platform}")
+                    continue
+                # Measured loads start from a cleared cache as well
+                record = collector.measure(driver, url, app_ready, platform=platform, test="benchmark",
+                                           profile=profile)
+            for metric, value in record["metrics"].items():
+                samples[platform].setdefault(metric, []).append(value)
+            logger.info(f"Load {round_index - warmup + 1}/{iterations} of {platform}: "
+                        f"{record['metrics'].get('load', 0):.0f} ms")
+    finally:
+        pool.close()
+        service.stop()
+        if os.path.exists(collector.path):
+            artifact_store.add(run_id, "perf", collector.path)
+
+    results = {
+        "run_id": run_id,
+        "build": build,
+        "iterations": iterations,
+        "warmup": warmup,
+        "device_profile": device_profile,
+        "duration": time.time() - start_time,
+        "platforms": {
+            platform: {metric: describe(values) for metric, values in metrics.items()}
+            for platform, metrics in samples.items()
+        },
+    }
+    return results
+
+
+def save_results(results, artifact_store):
+    """Write benchmark results as JSON into the run's artifacts and return the path."""
+    path = os.path.join(artifact_store.run_dir(results["run_id"]), "benchmark.json")
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    return artifact_store.add(results["run_id"], "benchmark", path)
+
+
+def format_results(results):
+    """Table of min/p50/p90/p99/CV per platform and metric."""
+    lines = [f"{'platform':<10} {'metric':<26} {'n':>4} {'min':>10} {'p50':>10} {'p90':>10} {'p99':>10} {'cv':>7}"]
+    for platform, metrics in results["platforms"].items():
+        for metric, stats in sorted(metrics.items()):
+            lines.append(
+                f"{platform:<10} {metric:<26} {stats['n']:>4} {stats['min']:>10.1f} {stats['p50']:>10.1f} "
+                f"{stats['p90']:>10.1f} {stats['p99']:>10.1f} {stats['cv']:>7.1%}"
+            )
+    return lines
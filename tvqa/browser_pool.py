@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Session-wide pool of warm Chrome drivers.
+Starting Chrome dominates the suite's wall-clock time, so every pytest process
+(one per xdist worker) launches a few browsers up front and leases them to
+tests, resetting cookies, storage and the current page between leases.
+"""
+
+import time
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+from selenium import webdriver
+
+from tvqa import cdp, devtools_log, phases
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW_SIZE = (1920, 1080)
+PAGE_LOAD_TIMEOUT = 30  # seconds
+
+CHROME_ARGUMENTS = [
+    f"--window-size={DEFAULT_WINDOW_SIZE[0]},{DEFAULT_WINDOW_SIZE[1]}",
+    "--disable-extensions",
+    "--disable-gpu",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+]
+
+
+def default_chrome_options(headless=False):
+    """Chrome options shared by every pooled browser."""
+    options = webdriver.ChromeOptions()
+    for argument in CHROME_ARGUMENTS:
+        options.add_argument(argument)
+    if headless:
+        options.add_argument("--headless=new")
+    return options
+
+
+def instrumentation_hooks(command_timer, app_ready, perf_collector, playback_monitor):
+    """Launch hooks instrumenting every session browser: WebDriver command timing and the readiness,
+    performance and playback init scripts (which run on every navigation).
+
+    The harness benchmark launches its browsers with the same hooks, so that
+    it measures what the tests pay for.
+    """
+    return [command_timer.install, app_ready.install, perf_collector.install, playback_monitor.install]
+
+
+class PooledBrowser:
+    """A launched driver plus the statistics of the leases it served."""
+
+    def __init__(self, index, driver):
+        self.index = index
+        self.driver = driver
+        self.default_user_agent = driver.execute_script("return navigator.userAgent")
+        self.leases = 0
+        self.reset_times = []
+
+    def stats(self):
+        """Return lease and reset statistics as a plain dict."""
+        resets = self.reset_times
+        return {
+            "browser": self.index,
+            "leases": self.leases,
+            "resets": len(resets),
+            "reset_total": sum(resets),
+            "reset_mean": sum(resets) / len(resets) if resets else 0.0,
+            "reset_max": max(resets) if resets else 0.0,
+        }
+
+
+class BrowserPool:
+    """Hands out pre-launched drivers one test at a time."""
+
+    def __init__(self, size=1, options_factory=default_chrome_options, headless=False,
+                 options_hooks=(), launch_hooks=(), release_hooks=(), driver_service=None):
+        self.size = size
+        self.options_factory = options_factory
+        self.headless = headless
+        # Callables adjusting the ChromeOptions of every new browser
+        self.options_hooks = list(options_hooks)
+        # Callables run once on every new driver, e.g. to register init scripts
+        self.launch_hooks = list(launch_hooks)
+        # Callables run on a driver when its lease ends, before it is reset
+        self.release_hooks = list(release_hooks)
+        # Shared chromedriver (tvqa.drivers.DriverService); without one every driver starts its own
+        self.driver_service = driver_service
+        self._idle = queue.LifoQueue()  # reuse the most recently used (warmest) browser first
+        self._browsers = []
+        # Browsers handed out and not yet released
+        self._leased = set()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Launch ``size`` browsers before the first test needs one."""
+        start_time = time.time()
+        for _ in range(self.size):
+            self._idle.put(self._launch())
+        logger.info(f"Browser pool started {self.size} browser(s) in {time.time() - start_time:.2f} seconds")
+        return self
+
+    def new_driver(self, arguments=(), options_hooks=()):
+        """Launch a driver configured like the pooled ones, but owned by the caller.
+
+        Used where a test needs a browser the pool cannot provide, e.g. one with
+        a persistent profile directory passed in ``arguments`` or extra
+        ``options_hooks`` such as the performance log.
+        """
+        options = self.options_factory(headless=self.headless)
+        for argument in arguments:
+            options.add_argument(argument)
+        for hook in [*self.options_hooks, *options_hooks]:
+            hook(options)
+        if self.driver_service is not None:
+            driver = self.driver_service.new_driver(options)
+        else:
+            driver = webdriver.Chrome(options=options)
+        driver.__dict__["_tvqa_performance_log"] = devtools_log.is_enabled(options)
+        driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+        for hook in self.launch_hooks:
+            hook(driver)
+        return driver
+
+    def _launch(self):
+        driver = self.new_driver()
+        with self._lock:
+            browser = PooledBrowser(len(self._browsers), driver)
+            self._browsers.append(browser)
+        logger.info(f"Launched pooled browser #{browser.index}")
+        return browser
+
+    @phases.span("acquisition")
+    def acquire(self, user_agent=None):
+        """Take an idle browser (launching one if the pool is exhausted)."""
+        try:
+            browser = self._idle.get_nowait()
+        except queue.Empty:
+            logger.warning("Browser pool exhausted, launching an extra browser")
+            browser = self._launch()
+        try:
+            cdp.set_user_agent(browser.driver, user_agent or browser.default_user_agent)
+        except Exception as e:
+            # The browser is off the idle queue; replace it rather than losing a pool slot
+            logger.error(f"Pooled browser #{browser.index} failed to take its lease, replacing it: {e}")
+            self._discard(browser)
+            self._idle.put(self._launch())
+            raise
+        browser.leases += 1
+        with self._lock:
+            self._leased.add(browser)
+        return browser
+
+    @phases.span("acquisition")
+    def release(self, browser):
+        """Reset a leased browser and return it to the pool."""
+        with self._lock:
+            self._leased.discard(browser)
+        for hook in self.release_hooks:
+            try:
+                hook(browser.driver)
+            except Exception as e:
+                logger.error(f"Release hook {getattr(hook, '__qualname__', hook)} failed: {e}")
+        try:
+            self.reset(browser)
+        except Exception as e:
+            logger.error(f"Failed to reset pooled browser #{browser.index}, replacing it: {e}")
+            self._discard(browser)
+            browser = self._launch()
+        self._idle.put(browser)
+
+    @contextmanager
+    def lease(self, user_agent=None):
+        """Context manager yielding a driver that goes back to the pool afterwards."""
+        browser = self.acquire(user_agent=user_agent)
+        try:
+            yield browser.driver
+        finally:
+            self.release(browser)
+
+    def leased(self):
+        """Drivers currently handed out."""
+        with self._lock:
+            return [browser.driver for browser in self._leased]
+
+    def reset(self, browser):
+        """Clear cookies and storage and park the browser on about:blank."""
+        start_time = time.time()
+        driver = browser.driver
+        driver.execute_script(
+            "try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}"
+        )
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        driver.get("about:blank")
+        driver.set_window_size(*DEFAULT_WINDOW_SIZE)
+        browser.reset_times.append(time.time() - start_time)
+
+    def _discard(self, browser):
+        try:
+            browser.driver.quit()
+        except Exception as e:
+            logger.error(f"Failed to quit pooled browser #{browser.index}: {e}")
+
+    def stats(self):
+        """Return per-browser lease/reset statistics."""
+        return [browser.stats() for browser in self._browsers]
+
+    def close(self):
+        """Quit every browser, including those still leased after an abnormal teardown."""
+        while True:
+            try:
+                browser = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(browser)
+        with self._lock:
+            leased, self._leased = list(self._leased), set()
+        for browser in leased:
+            logger.warning(f"Pooled browser #{browser.index} was never returned, quitting it")
+            self._discard(browser)
+        for entry in self.stats():
+            logger.info(
+                f"Pooled browser #{entry['browser']} served {entry['leases']} lease(s), "
+                f"resets took {entry['reset_total']:.2f}s total ({entry['reset_mean']:.3f}s mean)"
+            )
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Cold-cache and warm-cache page load measurements.
+Cold clears the HTTP cache, service workers and storage through the DevTools
+protocol before loading. Warm primes a temporary profile directory, restarts
+the browser on it (like a TV relaunching the app) and then measures, so the
+effect of caching headers and the service worker becomes visible.
+"""
+
+import logging
+import tempfile
+from urllib.parse import urlsplit
+
+from tvqa import cdp, device_profiles
+
+logger = logging.getLogger(__name__)
+
+MODES = ("cold", "warm")
+
+
+def clear_browser_state(driver, url):
+    """Drop the HTTP cache, cookies, service workers and storage for ``url``'s origin."""
+    parts = urlsplit(url)
+    driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+    driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    driver.execute_cdp_cmd("Storage.clearDataForOrigin", {
+        "origin": f"{parts.scheme}://{parts.netloc}",
+        "storageTypes": "all",
+    })
+
+
+class CacheModeMeter:
+    """Runs cold and warm measurements and keeps the results for the summary."""
+
+    def __init__(self, browser_pool, app_ready, perf_collector, modes=MODES):
+        self.browser_pool = browser_pool
+        self.app_ready = app_ready
+        self.perf_collector = perf_collector
+        self.modes = modes
+        self.results = []
+
+    def measure_load(self, driver, url, mode, platform=None, profile=None):
+        """Load ``url`` in the cache state prepared for ``mode`` and return the collected metrics
+        (None without navigation timing)."""
+        record = self.perf_collector.measure(driver, url, self.app_ready, platform=platform,
+                                             test=f"cache_modes[{mode}]", profile=profile, cold=False)
+        if record["navigation"] is None:
+            return None
+        metrics = dict(record["metrics"])
+        metrics["service_worker"] = int(record["service_worker"])
+        return metrics
+
+    def measure_cold(self, driver, url, platform=None, profile=None):
+        """Measure a load on ``driver`` after wiping every cache it has."""
+        clear_browser_state(driver, url)
+        return self.measure_load(driver, url, "cold", platform, profile)
+
+    def measure_warm(self, platform, url, user_agent=None, profile=None):
+        """Prime a fresh profile, relaunch the browser on it and measure.
+
+        The profile is a browser's cache, not an artifact of the run, and is
+        deleted afterwards.
+        """
+        metrics = None
+        with tempfile.TemporaryDirectory(prefix=f"tvqa-profile-{platform}-") as profile_dir:
+            for phase in ("prime", "measure"):
+                driver = self.browser_pool.new_driver([f"--user-data-dir={profile_dir}"])
+                try:
+                    if user_agent:
+                        cdp.set_user_agent(driver, user_agent)
+                    if phase == "prime":
+                        with device_profiles.applied(driver, profile):
+                            driver.get(url)
+                            self.app_ready.wait(driver, raise_on_timeout=False)
+                    else:
+                        metrics = self.measure_load(driver, url, "warm", platform, profile)
+                finally:
+                    driver.quit()
+        return metrics
+
+    def measure(self, platform, url, driver, user_agent=None, profile=None):
+        """Measure every configured mode (under ``profile`` if given) and return ``{mode: metrics}``."""
+        results = {}
+        for mode in self.modes:
+            if mode == "cold":
+                results[mode] = self.measure_cold(driver, url, platform, profile)
+            else:
+                results[mode] = self.measure_warm(platform, url, user_agent=user_agent, profile=profile)
+            logger.info(f"{platform} {mode} load: {results[mode]}")
+            self.results.append({"platform": platform, "mode": mode, "metrics": results[mode]})
+        return results
+
+
+def summary_table(results):
+    """Format cold/warm results side by side per platform (mean of all samples)."""
+    grouped = {}
+    for result in results:
+        per_metric = grouped.setdefault(result["platform"], {})
+        for metric, value in (result["metrics"] or {}).items():
+            if isinstance(value, bool):
+                value = int(value)
+            per_metric.setdefault(metric, {}).setdefault(result["mode"], []).append(value)
+
+    lines = [f"{'platform':<10} {'metric':<20} {'cold':>14} {'warm':>14}"]
+    for platform in sorted(grouped):
+        for metric, modes in sorted(grouped[platform].items()):
+            cells = []
+            for mode in MODES:
+                values = modes.get(mode)
+                cells.append(f"{sum(values) / len(values):>14.1f}" if values else f"{'-':>14}")
+            lines.append(f"{platform:<10} {metric:<20} {cells[0]} {cells[1]}")
+    return lines
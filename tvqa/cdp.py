@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Small helpers around the Chrome DevTools Protocol commands exposed by
+ChromeDriver through ``execute_cdp_cmd``, and a websocket session for the
+commands whose results arrive as events.
+"""
+
+import logging
+
+import trio
+
+logger = logging.getLogger(__name__)
+
+
+def add_init_script(driver, key, source):
+    """Evaluate ``source`` in every new document of ``driver``.
+
+    Scripts are registered once per key and driver, so pooled browsers that
+    are leased many times do not accumulate duplicate instrumentation.
+    """
+    scripts = driver.__dict__.setdefault("_tvqa_init_scripts", {})
+    if key not in scripts:
+        result = driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": source})
+        scripts[key] = result["identifier"]
+        logger.debug(f"Registered init script '{key}' ({scripts[key]})")
+    return scripts[key]
+
+
+def remove_init_script(driver, key):
+    """Stop evaluating a script previously added with add_init_script."""
+    scripts = driver.__dict__.get("_tvqa_init_scripts", {})
+    identifier = scripts.pop(key, None)
+    if identifier is not None:
+        driver.execute_cdp_cmd("Page.removeScriptToEvaluateOnNewDocument", {"identifier": identifier})
+
+
+def set_user_agent(driver, user_agent):
+    """Override the user agent of ``driver`` and remember it as the one to return to."""
+    driver.execute_cdp_cmd("Network.setUserAgentOverride", {"userAgent": user_agent})
+    driver.__dict__["_tvqa_user_agent"] = user_agent
+
+
+def user_agent(driver):
+    """The user agent last set with set_user_agent, or None."""
+    return driver.__dict__.get("_tvqa_user_agent")
+
+
+def run_session(driver, function, *args):
+    """Return ``await function(session, devtools, *args)`` run on a DevTools connection to ``driver``.
+
+    ``execute_cdp_cmd`` cannot receive events, so commands that deliver their
+    data as events (heap snapshot chunks, trace streams) go through
+    Selenium's trio-based CDP connection instead.
+    """
+    async def main():
+        async with driver.bidi_connection() as connection:
+            return await function(connection.session, connection.devtools, *args)
+
+    return trio.run(main)
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Latency of every WebDriver command, by command and by test.
+Pooled drivers get their ``execute`` wrapped, which every Selenium call
+(navigation, scripts, element lookups, screenshots, DevTools commands) goes
+through. Latencies land in log-scale histograms - a counter increment per
+command - so timing everything costs next to nothing and the histograms of
+all workers can simply be added up.
+"""
+
+import math
+import time
+import logging
+import threading
+
+import pytest
+
+logger = logging.getLogger(__name__)
+
+# Histogram buckets grow by 2^(1/4) (~19%); bucket 0 holds everything below MIN_MS
+BUCKETS_PER_DOUBLING = 4
+MIN_MS = 0.01
+
+TOP_COMMANDS = 15
+
+_TIMER_KEY = pytest.StashKey()
+
+
+def command_name(driver_command, params):
+    """Selenium command name; DevTools commands are named after their method."""
+    if driver_command == "executeCdpCommand" and params:
+        return f"cdp:{params.get('cmd')}"
+    return driver_command
+
+
+class Histogram:
+    """Count, total, max and log-scale buckets of latencies in milliseconds."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = {}
+
+    def add(self, ms):
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+        index = 0 if ms < MIN_MS else int(math.log2(ms / MIN_MS) * BUCKETS_PER_DOUBLING) + 1
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        return self
+
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the ``pct`` percentile (capped at the maximum)."""
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * pct / 100)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                upper = MIN_MS * 2 ** (index / BUCKETS_PER_DOUBLING)
+                return min(upper, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {"count": self.count, "total": self.total, "max": self.max,
+                "buckets": sorted(self.buckets.items())}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.count, histogram.total, histogram.max = data["count"], data["total"], data["max"]
+        histogram.buckets = {index: count for index, count in data["buckets"]}
+        return histogram
+
+
+class CommandTimer:
+    """Times the commands of instrumented drivers and attributes them to the running test."""
+
+    def __init__(self, listeners=()):
+        # Node id of the running test (set by the runtest hooks); None between tests
+        self.test = None
+        # Callables receiving (command, milliseconds) of every command, on the thread that ran it
+        self.listeners = list(listeners)
+        self.commands = {}
+        self.by_test = {}
+        self._lock = threading.Lock()
+
+    def install(self, driver):
+        """Time every command ``driver`` executes (a pool launch hook)."""
+        if getattr(driver, "_tvqa_timed", False):
+            return
+        execute = driver.execute
+
+        def timed_execute(driver_command, params=None):
+            start_time = time.perf_counter()
+            try:
+                return execute(driver_command, params)
+            finally:
+                self.record(command_name(driver_command, params), (time.perf_counter() - start_time) * 1000)
+
+        driver.execute = timed_execute
+        driver._tvqa_timed = True
+
+    def record(self, name, ms):
+        test = self.test
+        with self._lock:
+            self.commands.setdefault(name, Histogram()).add(ms)
+            if test is not None:
+                self.by_test.setdefault(test, {}).setdefault(name, Histogram()).add(ms)
+        for listener in self.listeners:
+            listener(name, ms)
+
+    def results_for(self, test):
+        """``{command: Histogram}`` of one test."""
+        return self.by_test.get(test, {})
+
+    def stats(self):
+        return {name: histogram.to_dict() for name, histogram in self.commands.items()}
+
+
+def merge_stats(shared):
+    """Add up the ``stats()`` of several processes into ``{command: Histogram}``."""
+    merged = {}
+    for stats in shared:
+        for name, data in stats.items():
+            merged.setdefault(name, Histogram()).merge(Histogram.from_dict(data))
+    return merged
+
+
+def top_table(histograms, limit=TOP_COMMANDS):
+    """The commands that took the most time in total, with their latency distribution."""
+    total = sum(histogram.total for histogram in histograms.values()) or 1.0
+    lines = [f"{'command':<40} {'count':>7} {'total s':>9} {'share':>6} {'mean ms':>9} "
+             f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}"]
+    ranked = sorted(histograms.items(), key=lambda item: -item[1].total)
+    for name, histogram in ranked[:limit]:
+        lines.append(
+            f"{name[:40]:<40} {histogram.count:>7} {histogram.total / 1000:>9.2f} {histogram.total / total:>6.1%} "
+            f"{histogram.total / histogram.count:>9.1f} {histogram.percentile(50):>8.1f} "
+            f"{histogram.percentile(90):>8.1f} {histogram.percentile(99):>8.1f} {histogram.max:>8.1f}"
+        )
+    return lines
+
+
+def install(config, listeners=()):
+    """Create the session's command timer (call from pytest_configure)."""
+    config.stash[_TIMER_KEY] = CommandTimer(listeners)
+    return config.stash[_TIMER_KEY]
+
+
+def timer(config):
+    """The command timer created by :func:`install`."""
+    return config.stash[_TIMER_KEY]
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Breadth-first focus-graph crawler.
+Starting from the loaded app, the crawler presses remote-control keys and
+records which UI state each key leads to. A state is identified by its route
+and the path of the focused element, and carries a hash of the visible DOM;
+known states are never expanded twice. The graph is stored per platform, and
+a rerun only expands states that are new or whose DOM hash changed since the
+last crawl - the rest of the previous graph is carried over, after every
+carried state has been visited and fingerprinted again.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+from collections import deque
+
+from tvqa.remote import FOCUS_HELPERS
+
+logger = logging.getLogger(__name__)
+
+GRAPH_DIR = "artifacts/focus_graph"
+KEYS = ("right", "down", "left", "up", "ok")
+MAX_STATES = 50
+MAX_DEPTH = 8
+
+STATE_SCRIPT = FOCUS_HELPERS + """
+// FNV-1a over tag, classes and own text of every visible element
+var hash = 0x811c9dc5, count = 0;
+function feed(text) {
+    for (var i = 0; i < text.length; i++) {
+        hash ^= text.charCodeAt(i);
+        hash = Math.imul(hash, 0x01000193) >>> 0;
+    }
+}
+var elements = document.body ? document.body.getElementsByTagName('*') : [];
+for (var i = 0; i < elements.length; i++) {
+    var element = elements[i];
+    if (!element.getClientRects().length) { continue; }
+    var text = '';
+    for (var node = element.firstChild; node; node = node.nextSibling) {
+        if (node.nodeType === 3) { text += node.nodeValue.trim(); }
+    }
+    feed(element.tagName + '|' + (typeof element.className === 'string' ? element.className : '') + '|' +
+         text.slice(0, 40) + ';');
+    count++;
+}
+return {
+    route: location.pathname + location.hash,
+    focus: describe(focusedElement()),
+    dom_hash: hash.toString(16) + ':' + count
+};
+"""
+
+
+def state_id(route, focus):
+    """Stable identifier of a UI state: where we are and what has focus."""
+    return hashlib.sha1(f"{route}|{focus}".encode()).hexdigest()[:12]
+
+
+class FocusCrawler:
+    """Explores an app with the remote's keys and maintains its focus graph."""
+
+    def __init__(self, driver, platform, url, app_ready, remote, graph_dir=GRAPH_DIR,
+                 keys=KEYS, max_states=MAX_STATES, max_depth=MAX_DEPTH):
+        self.driver = driver
+        self.platform = platform
+        self.url = url
+        self.app_ready = app_ready
+        # RemoteControl for ``driver``
+        self.remote = remote
+        self.graph_path = os.path.join(graph_dir, f"{platform}.json")
+        self.keys = keys
+        self.max_states = max_states
+        self.max_depth = max_depth
+
+    def fingerprint(self):
+        """The current UI state: ``{id, route, focus, dom_hash}``."""
+        state = self.driver.execute_script(STATE_SCRIPT)
+        state["id"] = state_id(state["route"], state["focus"])
+        return state
+
+    def load_graph(self):
+        if not os.path.exists(self.graph_path):
+            return None
+        with open(self.graph_path) as f:
+            return json.load(f)
+
+    def save_graph(self, graph):
+        os.makedirs(os.path.dirname(self.graph_path), exist_ok=True)
+        with open(self.graph_path, "w") as f:
+            json.dump(graph, f, indent=2)
+
+    def _restart(self):
+        self.driver.get(self.url)
+        self.app_ready.wait(self.driver, raise_on_timeout=False)
+
+    def _go_to(self, state):
+        """Bring the app into ``state``, replaying its key path from a fresh load if needed."""
+        if self.fingerprint()["id"] == state["id"]:
+            return True
+        self._restart()
+        for key in state["path"]:
+            self.remote.press(key, record=False)
+            if key in ("ok", "back"):
+                self.app_ready.wait(self.driver, raise_on_timeout=False)
+        reached = self.fingerprint()["id"] == state["id"]
+        if not reached:
+            logger.warning(f"Could not reach state {state['id']} ({state['focus']}) again via {state['path']}")
+        return reached
+
+    def _expand(self, queue, nodes, edges, counts, classify):
+        """Press every key in the queued states, breadth-first; new and changed targets are queued too."""
+        while queue and len(nodes) < self.max_states:
+            state = nodes[queue.popleft()]
+            if state["depth"] >= self.max_depth:
+                continue
+            for key in self.keys:
+                if not self._go_to(state):
+                    counts["unreachable"] += 1
+                    break
+                press = self.remote.press(key)
+                if key in ("ok", "back"):
+                    self.app_ready.wait(self.driver, raise_on_timeout=False)
+                target = self.fingerprint()
+                edges.append({
+                    "source": state["id"], "key": key, "target": target["id"],
+                    "focus_latency": press["focus_latency"], "frame_latency": press["frame_latency"],
+                })
+                if target["id"] in nodes or len(nodes) >= self.max_states:
+                    continue
+                target.update(path=state["path"] + [key], depth=state["depth"] + 1)
+                nodes[target["id"]] = target
+                if classify(target) != "unchanged":
+                    queue.append(target["id"])
+
+    def _carry_over(self, previous, nodes, edges, explored, queue, counts):
+        """Copy the previous graph behind unchanged states, re-fingerprinting every carried state.
+
+        A carried state is visited again along its stored key path: when its
+        DOM hash changed it is queued for expansion, and when it cannot be
+        reached any more, or the graph is full, the edge to it is dropped.
+        """
+        previous_nodes = previous["nodes"]
+        carry = deque(node_id for node_id, node in nodes.items()
+                      if node.get("status") in ("unchanged", "carried") and node_id not in explored)
+        while carry:
+            node_id = carry.popleft()
+            if node_id in explored:
+                continue
+            explored.add(node_id)
+            for edge in previous["edges"]:
+                if edge["source"] != node_id:
+                    continue
+                target_id = edge["target"]
+                if target_id not in nodes and target_id in previous_nodes and len(nodes) < self.max_states:
+                    known = previous_nodes[target_id]
+                    if not self._go_to(known):
+                        counts["unreachable"] += 1
+                        continue
+                    current = self.fingerprint()
+                    node = dict(current, path=known["path"], depth=known["depth"])
+                    nodes[target_id] = node
+                    if current["dom_hash"] != known["dom_hash"]:
+                        node["status"] = "changed"
+                        counts["changed"] += 1
+                        queue.append(target_id)
+                    else:
+                        node["status"] = "carried"
+                        counts["carried"] += 1
+                        carry.append(target_id)
+                # Only edges between states of the new graph are kept
+                if target_id in nodes:
+                    edges.append(edge)
+
+    def crawl(self, incremental=True):
+        """Explore the app breadth-first, store the graph and return a summary of the crawl."""
+        start_time = time.time()
+        previous = self.load_graph() if incremental else None
+        previous_nodes = previous["nodes"] if previous else {}
+        counts = {"new": 0, "changed": 0, "unchanged": 0, "carried": 0, "unreachable": 0}
+
+        def classify(state):
+            known = previous_nodes.get(state["id"])
+            status = "new" if known is None else "changed" if known["dom_hash"] != state["dom_hash"] else "unchanged"
+            counts[status] += 1
+            state["status"] = status
+            return status
+
+        self._restart()
+        root = dict(self.fingerprint(), path=[], depth=0)
+        nodes = {root["id"]: root}
+        edges = []
+        # The root is always expanded: it is where every changed state is reached from
+        classify(root)
+        queue = deque([root["id"]])
+
+        explored = set()
+        while True:
+            self._expand(queue, nodes, edges, counts, classify)
+            if not previous:
+                break
+            # States that did not change keep the part of the previous graph behind them;
+            # changed states found there are expanded in the next round
+            explored.update(edge["source"] for edge in edges)
+            self._carry_over(previous, nodes, edges, explored, queue, counts)
+            if not queue or len(nodes) >= self.max_states:
+                break
+
+        graph = {
+            "platform": self.platform,
+            "url": self.url,
+            "crawled_at": time.time(),
+            "nodes": nodes,
+            "edges": edges,
+        }
+        self.save_graph(graph)
+        summary = dict(counts, platform=self.platform, states=len(nodes), edges=len(edges),
+                       elapsed=time.time() - start_time)
+        logger.info(f"Focus graph of {self.platform}: {summary['states']} state(s), {summary['edges']} edge(s), "
+                    f"{counts['new']} new, {counts['changed']} changed, {counts['unchanged']} unchanged, "
+                    f"{counts['carried']} carried over in {summary['elapsed']:.1f}s")
+        return summary
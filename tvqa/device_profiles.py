@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Named TV device profiles.
+A profile combines the platform's user agent with DevTools CPU throttling,
+network emulation and a fixed viewport, so a workstation renders the apps
+roughly as slowly as the 2017-era TVs our viewers use.
+"""
+
+import logging
+from contextlib import contextmanager
+
+from tvqa import cdp, devtools_log
+from tvqa.platforms import PLATFORMS
+
+logger = logging.getLogger(__name__)
+
+PROFILES = {
+    "samsung-2017": {
+        "platform": "samsung",
+        "cpu_throttling_rate": 6,
+        "latency_ms": 40,
+        "download_kbps": 12000,
+        "upload_kbps": 3000,
+        "viewport": (1920, 1080),
+    },
+    "lg-2017": {
+        "platform": "lg",
+        "cpu_throttling_rate": 5,
+        "latency_ms": 40,
+        "download_kbps": 12000,
+        "upload_kbps": 3000,
+        "viewport": (1920, 1080),
+    },
+    "philips-2018": {
+        "platform": "philips",
+        "cpu_throttling_rate": 6,
+        "latency_ms": 50,
+        "download_kbps": 8000,
+        "upload_kbps": 2000,
+        "viewport": (1920, 1080),
+    },
+}
+
+# Profile each platform's tests use unless overridden with --device-profile
+PLATFORM_PROFILES = {
+    "samsung": "samsung-2017",
+    "lg": "lg-2017",
+    "philips": "philips-2018",
+}
+
+
+def select(platform, choice="auto"):
+    """Return the profile for ``platform``: its default ("auto"), a named one, or None ("none")."""
+    if choice == "none":
+        return None
+    name = PLATFORM_PROFILES[platform] if choice == "auto" else choice
+    return dict(PROFILES[name], name=name)
+
+
+def apply_profile(driver, profile):
+    """Throttle CPU and network, fix the viewport and set the platform user agent."""
+    width, height = profile["viewport"]
+    driver.execute_cdp_cmd("Emulation.setCPUThrottlingRate", {"rate": profile["cpu_throttling_rate"]})
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.emulateNetworkConditions", {
+        "offline": False,
+        "latency": profile["latency_ms"],
+        "downloadThroughput": profile["download_kbps"] * 1000 / 8,
+        "uploadThroughput": profile["upload_kbps"] * 1000 / 8,
+    })
+    driver.execute_cdp_cmd("Emulation.setDeviceMetricsOverride", {
+        "width": width, "height": height, "deviceScaleFactor": 1, "mobile": False,
+    })
+    driver.execute_cdp_cmd("Network.setUserAgentOverride", {
+        "userAgent": PLATFORMS[profile["platform"]]["user_agent"],
+    })
+    logger.info(f"Applied device profile {profile.get('name', profile['platform'])}")
+
+
+def clear_profile(driver):
+    """Remove CPU/network throttling and the viewport override, and restore the lease's user agent."""
+    driver.execute_cdp_cmd("Emulation.setCPUThrottlingRate", {"rate": 1})
+    driver.execute_cdp_cmd("Network.emulateNetworkConditions", {
+        "offline": False, "latency": 0, "downloadThroughput": -1, "uploadThroughput": -1,
+    })
+    driver.execute_cdp_cmd("Emulation.clearDeviceMetricsOverride", {})
+    # The profile may belong to another platform than the user agent the browser was leased with
+    lease_user_agent = cdp.user_agent(driver)
+    if lease_user_agent is not None:
+        cdp.set_user_agent(driver, lease_user_agent)
+    else:
+        # An empty override returns to the browser's own user agent
+        driver.execute_cdp_cmd("Network.setUserAgentOverride", {"userAgent": ""})
+    if not devtools_log.logs_events(driver):
+        driver.execute_cdp_cmd("Network.disable", {})
+
+
+@contextmanager
+def applied(driver, profile):
+    """Run a block under ``profile`` (a no-op when ``profile`` is None)."""
+    if profile is None:
+        yield driver
+        return
+    apply_profile(driver, profile)
+    try:
+        yield driver
+    finally:
+        clear_profile(driver)
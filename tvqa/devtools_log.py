@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Access to DevTools events through ChromeDriver's performance log.
+``execute_cdp_cmd`` can only send commands; events such as
+``Network.responseReceived`` are delivered by ChromeDriver in the
+"performance" log once it is enabled in the browser capabilities.
+"""
+
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def enable_performance_log(options, network=True, page=False, trace_categories=None):
+    """Ask ChromeDriver to buffer DevTools events for ``read_events``."""
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    prefs = {"enableNetwork": network, "enablePage": page}
+    if trace_categories:
+        prefs["traceCategories"] = trace_categories
+    options.add_experimental_option("perfLoggingPrefs", prefs)
+    return options
+
+
+def is_enabled(options):
+    """True when ``options`` ask ChromeDriver for the performance log."""
+    return "performance" in options.to_capabilities().get("goog:loggingPrefs", {})
+
+
+def logs_events(driver):
+    """True when ``driver`` was launched with the performance log (see BrowserPool.new_driver).
+
+    ChromeDriver enables the Network domain for it, so it must stay enabled.
+    """
+    return driver.__dict__.get("_tvqa_performance_log", False)
+
+
+def read_events(driver, prefix=None):
+    """Drain the buffered DevTools events of ``driver``.
+
+    Yields ``(method, params)`` tuples in the order they were emitted,
+    optionally only those whose method starts with ``prefix``. Events are
+    removed from ChromeDriver's buffer as they are read.
+    """
+    for entry in driver.get_log("performance"):
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, ValueError) as e:
+            logger.debug(f"Skipping unreadable performance log entry: {e}")
+            continue
+        method = message.get("method", "")
+        if prefix is None or method.startswith(prefix):
+            yield method, message.get("params", {})
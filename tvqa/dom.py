@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Batched DOM inspection.
+Every ``find_elements``/``is_displayed``/``tag_name`` call is a separate
+WebDriver HTTP round-trip; these helpers summarise the whole page with a
+single ``execute_script`` instead.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Returns one compact row per element: [tag, visible, x, y, width, height, focusable, id, class]
+INSPECT_SCRIPT = """
+var selector = arguments[0];
+var root = arguments[1] || document;
+var nodes = root.querySelectorAll(selector);
+var rows = new Array(nodes.length);
+for (var i = 0; i < nodes.length; i++) {
+    var el = nodes[i];
+    var rect = el.getBoundingClientRect();
+    var style = window.getComputedStyle(el);
+    var visible = rect.width > 0 && rect.height > 0 &&
+        style.display !== 'none' && style.visibility !== 'hidden' &&
+        parseFloat(style.opacity) !== 0;
+    var focusable = !el.disabled && (el.tabIndex >= 0 || el.hasAttribute('tabindex'));
+    rows[i] = [
+        el.tagName.toLowerCase(), visible,
+        Math.round(rect.left), Math.round(rect.top), Math.round(rect.width), Math.round(rect.height),
+        focusable, el.id || '', typeof el.className === 'string' ? el.className : ''
+    ];
+}
+return rows;
+"""
+
+FIELDS = ("tag", "visible", "x", "y", "width", "height", "focusable", "id", "class")
+
+
+def inspect_dom(driver, selector="*", root=None):
+    """Summarise every element matching ``selector`` with one WebDriver call.
+
+    Returns a list of dicts with tag, visibility, bounding box and
+    focusability. ``root`` may be a WebElement to limit the query to a subtree.
+    """
+    rows = driver.execute_script(INSPECT_SCRIPT, selector, root)
+    elements = [dict(zip(FIELDS, row)) for row in rows]
+    logger.debug(f"Inspected {len(elements)} elements matching '{selector}'")
+    return elements
+
+
+def visible_elements(elements):
+    """Filter an inspect_dom() result down to the visible elements."""
+    return [element for element in elements if element["visible"]]
+
+
+def focusable_elements(elements):
+    """Filter an inspect_dom() result down to visible, focusable elements."""
+    return [element for element in elements if element["visible"] and element["focusable"]]
+
+
+def count_by_tag(elements):
+    """Count elements per tag name, most common first."""
+    counts = {}
+    for element in elements:
+        counts[element["tag"]] = counts.get(element["tag"], 0) + 1
+    return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
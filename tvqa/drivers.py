@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Offline chromedriver provisioning and a shared chromedriver service.
+The chromedriver binary is resolved once per installed Chrome build and
+kept in a local cache, so later runs never touch the network. Each pytest
+process starts a single chromedriver and every browser session of the
+process connects to it, instead of every ``webdriver.Chrome`` starting its
+own. Resolution, service start and browser launches are timed separately.
+"""
+
+import os
+import re
+import sys
+import time
+import shutil
+import logging
+import subprocess
+
+from selenium.webdriver import Chrome
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnection
+from selenium.webdriver.remote.webdriver import WebDriver as RemoteWebDriver
+
+from tvqa.workers import worker_id
+
+logger = logging.getLogger(__name__)
+
+DRIVER_CACHE_DIR = os.environ.get(
+    "TVQA_DRIVER_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "tvqa", "chromedriver"))
+
+CHROME_BINARIES = ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome")
+MAC_CHROME = "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"
+DRIVER_NAME = "chromedriver.exe" if sys.platform == "win32" else "chromedriver"
+
+_VERSION = re.compile(r"\b(\d+\.\d+\.\d+)\.\d+\b")
+
+
+def find_chrome():
+    """Path of the installed Chrome ($CHROME_BINARY first), or None."""
+    if os.environ.get("CHROME_BINARY"):
+        return os.environ["CHROME_BINARY"]
+    for name in CHROME_BINARIES:
+        path = shutil.which(name)
+        if path:
+            return path
+    return MAC_CHROME if os.path.exists(MAC_CHROME) else None
+
+
+def _version(command):
+    """The major.minor.build part of the version a binary prints, or None."""
+    try:
+        output = subprocess.run(command, capture_output=True, text=True, timeout=30).stdout
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.debug(f"Could not run {command}: {e}")
+        return None
+    match = _VERSION.search(output)
+    return match.group(1) if match else None
+
+
+def chrome_build(binary=None):
+    """Build (major.minor.build) of the installed Chrome; chromedriver must match it."""
+    binary = binary or find_chrome()
+    return _version([binary, "--version"]) if binary else None
+
+
+def _locate(build):
+    """Find a chromedriver for ``build`` on the PATH, or download it; returns ``(source, path)``."""
+    on_path = shutil.which(DRIVER_NAME)
+    if on_path and _version([on_path, "--version"]) == build:
+        return "path", on_path
+    try:
+        from webdriver_manager.chrome import ChromeDriverManager
+        return "download", ChromeDriverManager().install()
+    except Exception as e:
+        raise RuntimeError(f"No chromedriver for Chrome {build} in the cache and it could not be "
+                           f"downloaded (offline?): {e}") from e
+
+
+def resolve_chromedriver(cache_dir=DRIVER_CACHE_DIR):
+    """Return ``{path, chrome_build, source, elapsed}`` of the chromedriver to use.
+
+    $CHROMEDRIVER wins. Otherwise the binary cached for the installed Chrome
+    build is used; on a miss it is taken from the PATH or downloaded once and
+    copied into the cache.
+    """
+    start_time = time.time()
+    if os.environ.get("CHROMEDRIVER"):
+        return {"path": os.environ["CHROMEDRIVER"], "chrome_build": None, "source": "env",
+                "elapsed": time.time() - start_time}
+
+    build = chrome_build()
+    if build is None:
+        raise RuntimeError("Chrome was not found; set CHROME_BINARY, or CHROMEDRIVER to skip resolution")
+    cached = os.path.join(cache_dir, build, DRIVER_NAME)
+    source = "cache"
+    if not os.path.exists(cached):
+        source, found = _locate(build)
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        # Copy under a temporary name so parallel workers never run a partial binary
+        temporary = f"{cached}.{worker_id()}.tmp"
+        shutil.copy2(found, temporary)
+        os.replace(temporary, cached)
+        logger.info(f"Cached chromedriver for Chrome {build} from {found}")
+    return {"path": cached, "chrome_build": build, "source": source, "elapsed": time.time() - start_time}
+
+
+class SharedServiceChrome(Chrome):
+    """Chrome session on an already running chromedriver service.
+
+    Mirrors ``ChromiumDriver.__init__`` (Selenium 4.15) without starting a
+    service, and leaves the service running when the session quits.
+    """
+
+    def __init__(self, service, options, keep_alive=True):
+        self.vendor_prefix = "goog"
+        self.service = service
+        RemoteWebDriver.__init__(
+            self,
+            command_executor=ChromiumRemoteConnection(
+                remote_server_addr=service.service_url,
+                browser_name="chrome",
+                vendor_prefix="goog",
+                keep_alive=keep_alive,
+                ignore_proxy=options._ignore_local_proxy,
+            ),
+            options=options,
+        )
+        self._is_remote = False
+
+    def quit(self):
+        RemoteWebDriver.quit(self)
+
+
+class DriverService:
+    """The chromedriver process every browser of this pytest process connects to."""
+
+    def __init__(self, cache_dir=DRIVER_CACHE_DIR, log_path=None):
+        self.cache_dir = cache_dir
+        self.log_path = log_path
+        self.driver = None
+        self.service = None
+        self.resolve_time = 0.0
+        self.service_start_time = 0.0
+        self.launch_times = []
+
+    def start(self):
+        self.driver = resolve_chromedriver(self.cache_dir)
+        self.resolve_time = self.driver["elapsed"]
+
+        start_time = time.time()
+        self.service = Service(executable_path=self.driver["path"], log_output=self.log_path)
+        self.service.start()
+        self.service_start_time = time.time() - start_time
+        logger.info(f"chromedriver {self.driver['path']} ({self.driver['source']}) resolved in "
+                    f"{self.resolve_time:.2f}s, service started in {self.service_start_time:.2f}s "
+                    f"on {self.service.service_url}")
+        return self
+
+    def new_driver(self, options):
+        """Launch a browser session with ``options`` on the shared service."""
+        start_time = time.time()
+        driver = SharedServiceChrome(self.service, options)
+        self.launch_times.append(time.time() - start_time)
+        return driver
+
+    def stop(self):
+        if self.service is not None:
+            self.service.stop()
+            self.service = None
+
+    def stats(self):
+        launches = self.launch_times
+        return {
+            "chromedriver": self.driver["path"] if self.driver else None,
+            "chrome_build": self.driver["chrome_build"] if self.driver else None,
+            "source": self.driver["source"] if self.driver else None,
+            "resolve_time": self.resolve_time,
+            "service_start_time": self.service_start_time,
+            "launches": len(launches),
+            "launch_total": sum(launches),
+            "launch_mean": sum(launches) / len(launches) if launches else 0.0,
+            "launch_max": max(launches) if launches else 0.0,
+        }
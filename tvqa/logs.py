@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Structured logging for parallel workers.
+Log calls only put the record on a queue; a background listener writes it
+as one JSON line to this process's own file, so xdist workers never block on
+or interleave in a shared file. Every line is tagged with the worker and
+the current test, platform and phase. At the end of the session the
+per-worker files are merged into a single timeline sorted by timestamp.
+"""
+
+import os
+import copy
+import json
+import queue
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+
+from tvqa.platforms import PLATFORMS
+from tvqa.workers import worker_id
+
+TIMELINE_NAME = "timeline.jsonl"
+
+# What this process is running right now; read by every log record's filter
+_context = {"test": None, "platform": None, "phase": "session"}
+_listener = None
+_handler = None
+
+
+def set_context(**values):
+    """Update the test, platform and phase the following log records are tagged with."""
+    _context.update(values)
+
+
+def platform_of(item):
+    """The platform a test item runs against, from its parameters or its node id."""
+    callspec = getattr(item, "callspec", None)
+    if callspec is not None and callspec.params.get("platform") in PLATFORMS:
+        return callspec.params["platform"]
+    return next((platform for platform in PLATFORMS if platform in item.nodeid.lower()), None)
+
+
+class ContextFilter(logging.Filter):
+    """Tags records with the worker and the current test context when they are created."""
+
+    def filter(self, record):
+        record.worker = worker_id()
+        record.test = _context["test"]
+        record.platform = _context["platform"]
+        record.phase = _context["phase"]
+        return True
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "ts": record.created,
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "worker": getattr(record, "worker", None),
+            "test": getattr(record, "test", None),
+            "platform": getattr(record, "platform", None),
+            "phase": getattr(record, "phase", None),
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry)
+
+
+class RecordQueueHandler(logging.handlers.QueueHandler):
+    """Queues records with their message resolved but the traceback kept apart from it."""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def log_path(log_dir):
+    """This process's JSON-lines log in ``log_dir``."""
+    return os.path.join(log_dir, f"{worker_id()}.jsonl")
+
+
+def install(log_dir, level=logging.INFO):
+    """Route all logging of this process through a queue to ``<log_dir>/<worker>.jsonl``."""
+    global _listener, _handler
+    shutdown()
+    os.makedirs(log_dir, exist_ok=True)
+    file_handler = logging.FileHandler(log_path(log_dir), encoding="utf-8")
+    file_handler.setFormatter(JsonLinesFormatter())
+    records = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(records, file_handler, respect_handler_level=True)
+    _listener.start()
+
+    _handler = RecordQueueHandler(records)
+    # The context is read on the logging thread, before the record crosses the queue
+    _handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(level)
+    return log_path(log_dir)
+
+
+def shutdown():
+    """Write out the queued records and detach the handler."""
+    global _listener, _handler
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def merge(log_dir, output=None):
+    """Merge every worker's log in ``log_dir`` into one timeline sorted by timestamp; returns its path."""
+    output = output or os.path.join(log_dir, TIMELINE_NAME)
+    entries = []
+    for filename in sorted(os.listdir(log_dir)):
+        if not filename.endswith(".jsonl") or filename == os.path.basename(output):
+            continue
+        with open(os.path.join(log_dir, filename), encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # A worker that was killed may leave a partial last line
+                    continue
+    entries.sort(key=lambda entry: entry["ts"])
+    # Parallel pytest processes of one run may merge at the same time
+    temporary = f"{output}.{worker_id()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+    os.replace(temporary, output)
+    return output
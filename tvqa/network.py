@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Network waterfalls of the app load and per-platform resource budgets.
+The DevTools Network events ChromeDriver buffers in its performance log are
+turned into one entry per request: timing phases, transfer and decoded
+size, compression, cache status and initiator. Every platform ships its own
+bundle, so every platform has its own budget for script bytes, request
+count, the largest asset, uncompressed text assets and duplicate fetches.
+"""
+
+import os
+import json
+import html
+import logging
+from urllib.parse import urlsplit
+
+from tvqa import devtools_log
+from tvqa.cache_modes import clear_browser_state
+
+logger = logging.getLogger(__name__)
+
+# Upper limits of a cold app load per platform (bytes are transferred bytes)
+NETWORK_BUDGETS = {
+    "samsung": {"script_bytes": 1500 * 1024, "request_count": 120, "largest_asset": 1024 * 1024,
+                "uncompressed_text": 0, "duplicate_fetches": 0},
+    "lg": {"script_bytes": 1500 * 1024, "request_count": 120, "largest_asset": 1024 * 1024,
+           "uncompressed_text": 0, "duplicate_fetches": 0},
+    "philips": {"script_bytes": 1200 * 1024, "request_count": 100, "largest_asset": 768 * 1024,
+                "uncompressed_text": 0, "duplicate_fetches": 0},
+}
+
+TEXT_TYPES = ("text/", "javascript", "json", "xml", "css", "svg")
+# Text assets smaller than this are not worth compressing
+COMPRESSION_MIN_BYTES = 1024
+
+PHASES = ("queued", "dns", "connect", "ssl", "send", "wait", "receive")
+
+
+def _initiator(initiator):
+    """URL (or type) of what started a request."""
+    if initiator.get("url"):
+        return initiator["url"]
+    stack = initiator.get("stack")
+    while stack:
+        for frame in stack.get("callFrames", []):
+            if frame.get("url"):
+                return frame["url"]
+        stack = stack.get("parent")
+    return initiator.get("type", "other")
+
+
+def _cache_status(entry, response):
+    if entry.get("memory_cache"):
+        return "memory"
+    if response.get("fromServiceWorker"):
+        return "service-worker"
+    if response.get("fromPrefetchCache"):
+        return "prefetch"
+    if response.get("fromDiskCache"):
+        return "disk"
+    if response.get("status") == 304:
+        return "revalidated"
+    return "network"
+
+
+def _phases(entry, response):
+    """Milliseconds spent in every phase of a request, from the response's timing."""
+    timing = response.get("timing")
+    if not timing:
+        return {}
+
+    def span(start, end):
+        return max(timing[end] - timing[start], 0.0) if timing.get(start, -1) >= 0 else 0.0
+
+    phases = {
+        "queued": max((timing["requestTime"] - entry["timestamp"]) * 1000, 0.0),
+        "dns": span("dnsStart", "dnsEnd"),
+        "connect": span("connectStart", "connectEnd"),
+        "ssl": span("sslStart", "sslEnd"),
+        "send": span("sendStart", "sendEnd"),
+        "wait": max(timing["receiveHeadersEnd"] - timing["sendEnd"], 0.0),
+    }
+    if entry.get("finished") is not None:
+        headers_at = timing["requestTime"] + timing["receiveHeadersEnd"] / 1000
+        phases["receive"] = max((entry["finished"] - headers_at) * 1000, 0.0)
+    return phases
+
+
+def build_waterfall(events):
+    """One entry per request of ``(method, params)`` Network events, in start order.
+
+    Entries carry ``url, method, type, status, mime_type, initiator, start,
+    duration, phases, transfer_bytes, resource_bytes, encoding, cache`` and
+    ``failed``; times are milliseconds from the first request.
+    """
+    requests, order = {}, []
+
+    def finish(entry, response):
+        headers = {name.lower(): value for name, value in (response.get("headers") or {}).items()}
+        entry.update(
+            status=response.get("status"),
+            mime_type=response.get("mimeType", ""),
+            protocol=response.get("protocol"),
+            encoding=headers.get("content-encoding"),
+            cache=_cache_status(entry, response),
+            phases=_phases(entry, response),
+        )
+
+    for method, params in events:
+        request_id = params.get("requestId")
+        if method == "Network.requestWillBeSent":
+            previous = requests.get(request_id)
+            if previous is not None and "redirectResponse" in params:
+                # A redirect reuses the request id; the finished hop gets its own entry
+                previous["finished"] = params.get("timestamp")
+                finish(previous, params["redirectResponse"])
+                previous["transfer_bytes"] = params["redirectResponse"].get("encodedDataLength", 0)
+            entry = {
+                "url": params["request"]["url"],
+                "method": params["request"].get("method", "GET"),
+                "type": params.get("type", "Other"),
+                "initiator": _initiator(params.get("initiator") or {}),
+                "timestamp": params.get("timestamp"),
+                "finished": None,
+                "transfer_bytes": 0,
+                "resource_bytes": 0,
+                "failed": None,
+            }
+            requests[request_id] = entry
+            order.append(entry)
+        elif request_id not in requests:
+            continue
+        elif method == "Network.requestServedFromCache":
+            requests[request_id]["memory_cache"] = True
+        elif method == "Network.responseReceived":
+            requests[request_id]["response"] = params["response"]
+            requests[request_id]["type"] = params.get("type", requests[request_id]["type"])
+        elif method == "Network.dataReceived":
+            requests[request_id]["resource_bytes"] += params.get("dataLength", 0)
+        elif method == "Network.loadingFinished":
+            requests[request_id]["finished"] = params.get("timestamp")
+            requests[request_id]["transfer_bytes"] = params.get("encodedDataLength", 0)
+        elif method == "Network.loadingFailed":
+            requests[request_id]["finished"] = params.get("timestamp")
+            requests[request_id]["failed"] = params.get("errorText", "failed")
+
+    entries = [entry for entry in order if entry["url"].startswith(("http://", "https://"))]
+    if not entries:
+        return []
+    origin = min(entry["timestamp"] for entry in entries if entry["timestamp"] is not None)
+    for entry in entries:
+        if "status" not in entry:
+            finish(entry, entry.pop("response", {}))
+        entry.pop("response", None)
+        entry.pop("memory_cache", None)
+        entry["start"] = (entry["timestamp"] - origin) * 1000
+        entry["duration"] = (entry["finished"] - entry["timestamp"]) * 1000 if entry["finished"] else None
+        del entry["timestamp"], entry["finished"]
+    return sorted(entries, key=lambda entry: entry["start"])
+
+
+def is_text(entry):
+    return any(kind in (entry["mime_type"] or "") for kind in TEXT_TYPES)
+
+
+def summarise(entries):
+    """Totals of a waterfall and the findings the budgets are checked against."""
+    fetched = [entry for entry in entries if entry["cache"] == "network" and not entry["failed"]]
+    scripts = [entry for entry in entries if entry["type"] == "Script" or "javascript" in (entry["mime_type"] or "")]
+    largest = max(entries, key=lambda entry: entry["transfer_bytes"], default=None)
+    uncompressed = [entry["url"] for entry in fetched if is_text(entry) and not entry["encoding"]
+                    and entry["resource_bytes"] >= COMPRESSION_MIN_BYTES]
+    fetch_counts = {}
+    for entry in fetched:
+        fetch_counts[(entry["method"], entry["url"])] = fetch_counts.get((entry["method"], entry["url"]), 0) + 1
+
+    bytes_by_type = {}
+    for entry in entries:
+        bytes_by_type[entry["type"]] = bytes_by_type.get(entry["type"], 0) + entry["transfer_bytes"]
+    cache = {}
+    for entry in entries:
+        cache[entry["cache"]] = cache.get(entry["cache"], 0) + 1
+    return {
+        "request_count": len(entries),
+        "failed": sum(1 for entry in entries if entry["failed"]),
+        "transfer_bytes": sum(entry["transfer_bytes"] for entry in entries),
+        "resource_bytes": sum(entry["resource_bytes"] for entry in entries),
+        "script_bytes": sum(entry["transfer_bytes"] for entry in scripts),
+        "script_resource_bytes": sum(entry["resource_bytes"] for entry in scripts),
+        "largest_asset": {"url": largest["url"], "bytes": largest["transfer_bytes"]} if largest else None,
+        "uncompressed_text": uncompressed,
+        "duplicates": [{"url": url, "method": method, "count": count}
+                       for (method, url), count in sorted(fetch_counts.items()) if count > 1],
+        "bytes_by_type": bytes_by_type,
+        "cache": cache,
+        "load_span": max((entry["start"] + (entry["duration"] or 0) for entry in entries), default=0.0),
+    }
+
+
+def check_budgets(summary, budgets):
+    """Return ``[{budget, limit, value, detail}]`` for every budget ``summary`` exceeds."""
+    values = {
+        "script_bytes": (summary["script_bytes"], None),
+        "request_count": (summary["request_count"], None),
+        "largest_asset": (summary["largest_asset"]["bytes"] if summary["largest_asset"] else 0,
+                          summary["largest_asset"]["url"] if summary["largest_asset"] else None),
+        "uncompressed_text": (len(summary["uncompressed_text"]), ", ".join(summary["uncompressed_text"][:5])),
+        "duplicate_fetches": (sum(duplicate["count"] - 1 for duplicate in summary["duplicates"]),
+                              ", ".join(duplicate["url"] for duplicate in summary["duplicates"][:5])),
+    }
+    violations = []
+    for budget, limit in budgets.items():
+        value, detail = values[budget]
+        if value > limit:
+            violations.append({"budget": budget, "limit": limit, "value": value, "detail": detail})
+    return violations
+
+
+def format_violation(violation):
+    detail = f" ({violation['detail']})" if violation["detail"] else ""
+    return f"{violation['budget']}: {violation['value']} > {violation['limit']}{detail}"
+
+
+def waterfall_html(entries, width=400):
+    """The waterfall as an HTML table with one timing bar per request, for the HTML report."""
+    span = max((entry["start"] + (entry["duration"] or 0) for entry in entries), default=0.0) or 1.0
+    colours = {"queued": "#ccc", "dns": "#1a9e77", "connect": "#d95f02", "ssl": "#7570b3",
+               "send": "#e7298a", "wait": "#66a61e", "receive": "#1f78b4"}
+    rows = []
+    for entry in entries:
+        offset = entry["start"] / span * width
+        bars = "".join(
+            f"<span title=\"{phase} {entry['phases'][phase]:.1f} ms\" style=\"display:inline-block;height:8px;"
+            f"width:{entry['phases'][phase] / span * width:.1f}px;background:{colours[phase]}\"></span>"
+            for phase in PHASES if entry["phases"].get(phase)
+        ) or (f"<span style=\"display:inline-block;height:8px;width:{max((entry['duration'] or 0) / span * width, 1):.1f}px;"
+              f"background:#999\"></span>")
+        path = urlsplit(entry["url"]).path or entry["url"]
+        rows.append(
+            f"<tr><td title=\"{html.escape(entry['url'])}\">{html.escape(path[-60:])}</td>"
+            f"<td>{entry['status'] or html.escape(entry['failed'] or '')}</td><td>{html.escape(entry['type'])}</td>"
+            f"<td>{entry['transfer_bytes']}</td><td>{html.escape(entry['encoding'] or '-')}</td>"
+            f"<td>{entry['cache']}</td><td title=\"{html.escape(entry['initiator'])}\">"
+            f"{html.escape(os.path.basename(urlsplit(entry['initiator']).path) or entry['initiator'])}</td>"
+            f"<td style=\"white-space:nowrap\"><span style=\"display:inline-block;width:{offset:.1f}px\"></span>"
+            f"{bars}</td></tr>"
+        )
+    return ("<table><tr><th>request</th><th>status</th><th>type</th><th>bytes</th><th>encoding</th>"
+            f"<th>cache</th><th>initiator</th><th>0 - {span:.0f} ms</th></tr>" + "".join(rows) + "</table>")
+
+
+class NetworkRecorder:
+    """Records the network waterfall of app loads into ``output_dir`` and checks it against the platform budgets."""
+
+    def __init__(self, output_dir, budgets=NETWORK_BUDGETS, listeners=(), event_listeners=()):
+        self.output_dir = output_dir
+        self.budgets = budgets
+        # Callables receiving every result, e.g. the artifact index
+        self.listeners = list(listeners)
+        # Callables receiving (driver, events) for every batch of Network events read, e.g. the HAR recorder
+        self.event_listeners = list(event_listeners)
+        self.results = []
+
+    def drain(self, driver):
+        """Read the buffered Network events of ``driver`` and hand them to the event listeners."""
+        events = list(devtools_log.read_events(driver, "Network."))
+        for listener in self.event_listeners:
+            listener(driver, events)
+        return events
+
+    def record(self, driver, url, app_ready, platform=None, test=None, cold=True):
+        """Load ``url`` (after clearing the cache unless ``cold`` is unset) and return the waterfall result.
+
+        The result is ``{platform, test, url, entries, summary, violations, path}``.
+        """
+        self.drain(driver)
+        if cold:
+            clear_browser_state(driver, url)
+        driver.get(url)
+        app_ready.wait(driver, raise_on_timeout=False)
+        entries = build_waterfall(self.drain(driver))
+        summary = summarise(entries)
+
+        result = {
+            "platform": platform,
+            "test": test,
+            "url": url,
+            "cold": cold,
+            "entries": entries,
+            "summary": summary,
+            "violations": check_budgets(summary, self.budgets.get(platform, {})),
+        }
+        result["path"] = self._write(result)
+        self.results.append(result)
+        for listener in self.listeners:
+            listener(result)
+        logger.info(f"Network waterfall of {platform}: {summary['request_count']} request(s), "
+                    f"{summary['transfer_bytes'] / 1024:.0f} KiB transferred, "
+                    f"{len(result['violations'])} budget violation(s)")
+        return result
+
+    def results_for(self, test):
+        return [result for result in self.results if result["test"] == test]
+
+    def _write(self, result):
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = f"{result['platform']}-{len(self.results)}-{os.getpid()}.json"
+        path = os.path.join(self.output_dir, name)
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2)
+        return path
+
+
+def summary_table(results):
+    """Per-platform totals of the recorded loads, with their budget violations."""
+    lines = [f"{'platform':<10} {'requests':>9} {'KiB':>9} {'JS KiB':>9} {'largest KiB':>12} "
+             f"{'uncompressed':>13} {'duplicates':>11} {'violations':>11}"]
+    for result in results:
+        summary = result["summary"]
+        largest = summary["largest_asset"]["bytes"] if summary["largest_asset"] else 0
+        lines.append(
+            f"{str(result['platform']):<10} {summary['request_count']:>9} {summary['transfer_bytes'] / 1024:>9.0f} "
+            f"{summary['script_bytes'] / 1024:>9.0f} {largest / 1024:>12.0f} {len(summary['uncompressed_text']):>13} "
+            f"{len(summary['duplicates']):>11} {len(result['violations']):>11}"
+        )
+        for violation in result["violations"]:
+            lines.append(f"  over budget: {format_violation(violation)}")
+    return lines
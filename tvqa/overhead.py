@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the QA harness itself.
+A local fixture app shaped like the TV apps (root container, navigation menu,
+a grid of tiles and a video element) is served from this process, so the
+numbers depend only on Chrome, chromedriver and our own code: driver
+startup with the pool's hooks, the ``driver.get`` round-trip, WebDriverWait
+latency, batched versus per-element DOM queries and screenshot capture at
+TV resolutions. Results are stored as a JSON artifact of the run together with
+the git commit and compared with the previous run.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from tvqa import dom, workers
+from tvqa.artifacts import ArtifactStore
+from tvqa.browser_pool import BrowserPool, instrumentation_hooks
+from tvqa.commands import CommandTimer
+from tvqa.drivers import DriverService
+from tvqa.perf_collector import PerfCollector
+from tvqa.playback import PlaybackMonitor
+from tvqa.readiness import AppReadiness
+from tvqa.responsive import set_viewport, clear_viewport, RESOLUTIONS
+from tvqa.stats import describe
+
+logger = logging.getLogger(__name__)
+
+MENU_ITEMS = 8
+TILES = 24
+
+# How long the fixture app takes to render the element WebDriverWait waits for
+WAIT_DELAY_MS = 200
+POLL_FREQUENCIES = (0.5, 0.05)
+
+# A p50 this much above the previous run's is reported as slower
+SLOWER_RATIO = 1.2
+
+FIXTURE_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>TV 2 Play fixture</title>
+<style>
+body {{ margin: 0; background: #111; color: #eee; font-family: sans-serif; }}
+.app-container {{ display: flex; height: 100vh; }}
+.menu {{ width: 18vw; padding: 2vh 1vw; }}
+.menu-item {{ padding: 1vh 1vw; }}
+.menu-item:focus {{ outline: 3px solid #fff; }}
+.content {{ flex: 1; padding: 2vh 1vw; }}
+video {{ width: 60vw; height: 34vw; background: #000; }}
+.grid {{ display: grid; grid-template-columns: repeat(6, 1fr); gap: 1vw; margin-top: 2vh; }}
+.tile {{ height: 8vw; background: linear-gradient(135deg, #234, #567); }}
+</style>
+</head>
+<body>
+<div id="app" class="app-container">
+  <nav class="menu"><ul>{menu}</ul></nav>
+  <main class="content">
+    <video class="player" muted playsinline></video>
+    <div class="grid">{tiles}</div>
+  </main>
+</div>
+</body>
+</html>
+""".format(
+    menu="".join(f'<li class="menu-item" tabindex="0">Menu {index}</li>' for index in range(MENU_ITEMS)),
+    tiles="".join(f'<div class="tile" tabindex="0">{index}</div>' for index in range(TILES)),
+)
+
+# Renders a late element after a delay and returns nothing; its render time is kept in the page
+DELAYED_ELEMENT_SCRIPT = """
+document.querySelectorAll('.late').forEach(function (el) { el.remove(); });
+setTimeout(function () {
+    var el = document.createElement('div');
+    el.className = 'late';
+    document.getElementById('app').appendChild(el);
+    window.__tvqaRenderedAt = Date.now();
+}, arguments[0]);
+"""
+
+
+class FixtureApp:
+    """Serves the fixture app on a local port."""
+
+    def __init__(self, host="127.0.0.1", port=0):
+        body = FIXTURE_HTML.encode("utf-8")
+
+        class FixtureHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("fixture app: " + format % args)
+
+        self._httpd = ThreadingHTTPServer((host, port), FixtureHandler)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        """Serve in a background thread."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fixture-app", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def git_commit():
+    """Commit the harness is at, or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def timed(function, *args):
+    """Milliseconds ``function(*args)`` took."""
+    start_time = time.perf_counter()
+    function(*args)
+    return (time.perf_counter() - start_time) * 1000
+
+
+def wait_latency(driver, poll_frequency):
+    """Milliseconds between the late element rendering and WebDriverWait returning it."""
+    driver.execute_script(DELAYED_ELEMENT_SCRIPT, WAIT_DELAY_MS)
+    WebDriverWait(driver, 5, poll_frequency=poll_frequency).until(
+        EC.presence_of_element_located((By.CSS_SELECTOR, ".late")))
+    found_at = time.time() * 1000
+    return found_at - driver.execute_script("return window.__tvqaRenderedAt;")
+
+
+def query_per_element(driver):
+    """What ``dom.inspect_dom`` returns, gathered with one WebDriver call per element property."""
+    return [(element.tag_name, element.is_displayed(), element.rect)
+            for element in driver.find_elements(By.CSS_SELECTOR, "*")]
+
+
+def capture(driver):
+    return driver.execute_cdp_cmd("Page.captureScreenshot", {"format": "png"})["data"]
+
+
+def run_overhead(iterations=10, headless=False, artifact_store=None):
+    """Measure every harness operation ``iterations`` times; returns ``{metric: stats}`` with metadata."""
+    artifact_store = artifact_store or ArtifactStore()
+    run_id = os.environ.get("TVQA_RUN_ID") or workers.new_run_id()
+    artifact_store.start_run(run_id)
+    app = FixtureApp().start()
+    app_ready = AppReadiness()
+    service = DriverService()
+    samples = {}
+
+    def sample(metric, value):
+        samples.setdefault(metric, []).append(value)
+
+    start_time = time.time()
+    try:
+        sample("driver_service_start", timed(service.start))
+        # Launch browsers the way the session pool does, with its instrumentation
+        hooks = instrumentation_hooks(CommandTimer(), app_ready,
+                                      PerfCollector(os.path.join(artifact_store.run_dir(run_id), "perf")),
+                                      PlaybackMonitor())
+        pool = BrowserPool(size=1, headless=headless, launch_hooks=hooks, driver_service=service)
+        for _ in range(iterations):
+            start = time.perf_counter()
+            driver = pool.new_driver()
+            sample("driver_startup", (time.perf_counter() - start) * 1000)
+            driver.quit()
+
+        driver = pool.new_driver()
+        try:
+            driver.get(app.url)
+            for _ in range(iterations):
+                sample("get", timed(driver.get, app.url))
+                sample("app_ready_wait", timed(app_ready.wait, driver))
+            for poll_frequency in POLL_FREQUENCIES:
+                for _ in range(iterations):
+                    sample(f"wait_latency_poll{int(poll_frequency * 1000)}ms", wait_latency(driver, poll_frequency))
+            for _ in range(iterations):
+                sample("dom_batched", timed(dom.inspect_dom, driver))
+                sample("dom_per_element", timed(query_per_element, driver))
+            for width, height in RESOLUTIONS:
+                set_viewport(driver, width, height)
+                try:
+                    capture(driver)
+                    for _ in range(iterations):
+                        sample(f"screenshot_{height}p", timed(capture, driver))
+                finally:
+                    clear_viewport(driver)
+            elements = len(dom.inspect_dom(driver))
+        finally:
+            driver.quit()
+    finally:
+        service.stop()
+        app.stop()
+
+    return {
+        "run_id": run_id,
+        "commit": git_commit(),
+        "iterations": iterations,
+        "headless": headless,
+        "elements": elements,
+        "duration": time.time() - start_time,
+        "metrics": {metric: describe(values) for metric, values in samples.items()},
+    }
+
+
+def save_results(results, artifact_store):
+    """Write the results as a JSON artifact of their run and return the path."""
+    path = os.path.join(artifact_store.run_dir(results["run_id"]), "overhead.json")
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    return artifact_store.add(results["run_id"], "overhead", path)
+
+
+def previous_results(artifact_store, exclude_run=None):
+    """The most recent saved results of a run other than ``exclude_run``, or None."""
+    for artifact in artifact_store.find(kind="overhead"):
+        if artifact["run_id"] != exclude_run:
+            return json.loads(artifact_store.read(artifact))
+    return None
+
+
+def format_results(results, previous=None):
+    """Table of min/p50/p90/CV per metric (ms), with the p50 of ``previous`` if given."""
+    header = f"{'metric':<26} {'n':>4} {'min':>9} {'p50':>9} {'p90':>9} {'cv':>7}"
+    if previous:
+        header += f" {'prev p50':>9} {'change':>8}  (vs {previous.get('commit') or previous['run_id']})"
+    lines = [header]
+    for metric, stats in results["metrics"].items():
+        line = (f"{metric:<26} {stats['n']:>4} {stats['min']:>9.1f} {stats['p50']:>9.1f} "
+                f"{stats['p90']:>9.1f} {stats['cv']:>7.1%}")
+        before = (previous or {}).get("metrics", {}).get(metric)
+        if before and before["p50"]:
+            ratio = stats["p50"] / before["p50"]
+            line += f" {before['p50']:>9.1f} {ratio - 1:>+8.1%}" + ("  slower" if ratio > SLOWER_RATIO else "")
+        lines.append(line)
+    return lines
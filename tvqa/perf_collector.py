@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Page performance collection based on current web platform APIs.
+PerformanceObservers for paint, largest-contentful-paint, layout-shift and
+longtask entries are injected before navigation; after the load the
+Navigation Timing Level 2 entry, the observed entries and a resource timing
+summary are read back and written as one JSON record per page load.
+"""
+
+import os
+import json
+import time
+import logging
+
+from tvqa import cdp, device_profiles
+from tvqa.cache_modes import clear_browser_state
+from tvqa.workers import worker_id
+
+logger = logging.getLogger(__name__)
+
+PERF_INIT_SCRIPT = """
+(function () {
+    if (window.__tvqaPerf || !window.PerformanceObserver) { return; }
+    var state = window.__tvqaPerf = {lcp: null, cls: 0, clsWindow: 0, clsMax: 0, windowStart: 0, lastShift: 0, longTasks: []};
+    function observe(type, callback) {
+        try { new PerformanceObserver(function (list) { list.getEntries().forEach(callback); })
+            .observe({type: type, buffered: true}); } catch (e) {}
+    }
+    observe('largest-contentful-paint', function (entry) {
+        state.lcp = {
+            startTime: entry.startTime, size: entry.size, url: entry.url || '',
+            element: entry.element ? entry.element.tagName.toLowerCase() : ''
+        };
+    });
+    observe('layout-shift', function (entry) {
+        if (entry.hadRecentInput) { return; }
+        state.cls += entry.value;
+        // Session windows: shifts less than 1 s apart, at most 5 s long
+        if (entry.startTime - state.lastShift > 1000 || entry.startTime - state.windowStart > 5000) {
+            state.windowStart = entry.startTime;
+            state.clsWindow = 0;
+        }
+        state.lastShift = entry.startTime;
+        state.clsWindow += entry.value;
+        state.clsMax = Math.max(state.clsMax, state.clsWindow);
+    });
+    observe('longtask', function (entry) {
+        state.longTasks.push({
+            startTime: entry.startTime, duration: entry.duration,
+            attribution: (entry.attribution || []).map(function (a) { return a.containerSrc || a.containerName || a.name; })
+        });
+    });
+})();
+"""
+
+COLLECT_SCRIPT = PERF_INIT_SCRIPT + """
+var done = arguments[arguments.length - 1];
+// Give buffered observer callbacks (if the script was only installed just now) a task to run
+setTimeout(function () {
+    var state = window.__tvqaPerf || {lcp: null, cls: 0, clsMax: 0, longTasks: []};
+    var nav = performance.getEntriesByType('navigation')[0];
+    var paints = {};
+    performance.getEntriesByType('paint').forEach(function (entry) { paints[entry.name] = entry.startTime; });
+    var resources = performance.getEntriesByType('resource').map(function (entry) {
+        return {
+            name: entry.name, initiatorType: entry.initiatorType,
+            startTime: entry.startTime, duration: entry.duration,
+            transferSize: entry.transferSize, encodedBodySize: entry.encodedBodySize,
+            decodedBodySize: entry.decodedBodySize
+        };
+    });
+    done({
+        url: location.href,
+        navigation: nav ? nav.toJSON() : null,
+        paint: paints,
+        lcp: state.lcp,
+        cls: state.cls,
+        cls_max_session: state.clsMax,
+        long_tasks: state.longTasks,
+        resources: resources,
+        service_worker: !!(navigator.serviceWorker && navigator.serviceWorker.controller)
+    });
+}, 0);
+"""
+
+
+def summarise(raw):
+    """Flatten a raw collection into ``{metric: number}`` (milliseconds, bytes, counts)."""
+    nav = raw.get("navigation") or {}
+    resources = raw.get("resources") or []
+    long_tasks = raw.get("long_tasks") or []
+    transfer = nav.get("transferSize", 0) + sum(entry["transferSize"] for entry in resources)
+    metrics = {
+        "ttfb": nav.get("responseStart"),
+        "dns": nav.get("domainLookupEnd", 0) - nav.get("domainLookupStart", 0) if nav else None,
+        "connect": nav.get("connectEnd", 0) - nav.get("connectStart", 0) if nav else None,
+        "response": nav.get("responseEnd", 0) - nav.get("responseStart", 0) if nav else None,
+        "dom_interactive": nav.get("domInteractive"),
+        "dom_content_loaded": nav.get("domContentLoadedEventEnd"),
+        "load": nav.get("loadEventEnd"),
+        "first_paint": raw.get("paint", {}).get("first-paint"),
+        "first_contentful_paint": raw.get("paint", {}).get("first-contentful-paint"),
+        "largest_contentful_paint": (raw.get("lcp") or {}).get("startTime"),
+        "cumulative_layout_shift": raw.get("cls_max_session"),
+        "long_task_count": len(long_tasks),
+        "long_task_total": sum(task["duration"] for task in long_tasks),
+        "resource_count": len(resources),
+        "cached_resources": sum(1 for entry in resources
+                                if entry["transferSize"] == 0 and entry["decodedBodySize"] > 0),
+        "transfer_bytes": transfer,
+    }
+    return {name: value for name, value in metrics.items() if value is not None}
+
+
+class PerfCollector:
+    """Collects one structured performance record per page load into ``output_dir``."""
+
+    def __init__(self, output_dir, listeners=()):
+        self.output_dir = output_dir
+        # JSON lines of this process's records
+        self.path = os.path.join(output_dir, f"{worker_id()}.jsonl")
+        # Callables receiving every record, e.g. the performance history store
+        self.listeners = list(listeners)
+        self.records = []
+
+    def install(self, driver):
+        """Register the observers so they run before any page script."""
+        cdp.add_init_script(driver, "perf", PERF_INIT_SCRIPT)
+
+    def collect(self, driver, platform=None, test=None, extra_metrics=None, ready=None, profile=None):
+        """Read the performance data of the current page and store the record.
+
+        ``ready`` records whether the app became ready before collection, when
+        known, and ``profile`` the name of the device profile it ran under.
+        """
+        raw = driver.execute_async_script(COLLECT_SCRIPT)
+        metrics = summarise(raw)
+        metrics.update(extra_metrics or {})
+        record = {
+            "timestamp": time.time(),
+            "worker": worker_id(),
+            "platform": platform,
+            "test": test,
+            "profile": profile,
+            "url": raw["url"],
+            "ready": ready,
+            "metrics": metrics,
+            "navigation": raw["navigation"],
+            "paint": raw["paint"],
+            "lcp": raw["lcp"],
+            "long_tasks": raw["long_tasks"],
+            "resources": raw["resources"],
+            "service_worker": raw["service_worker"],
+        }
+        self.records.append(record)
+        self._write(record)
+        for listener in self.listeners:
+            listener(record)
+        return record
+
+    def measure(self, driver, url, app_ready, platform=None, test=None, profile=None, cold=True):
+        """Load ``url`` in ``driver``, wait until the app is ready and collect.
+
+        The load starts from a cleared cache unless ``cold`` is unset, so the
+        sample does not depend on what the browser loaded before. With a
+        device ``profile`` the load runs throttled and the throttling is
+        lifted again afterwards.
+        """
+        if cold:
+            clear_browser_state(driver, url)
+        with device_profiles.applied(driver, profile):
+            driver.get(url)
+            ready = app_ready.wait(driver, raise_on_timeout=False)
+            # Timed in the page from navigation start; the wait itself only starts once driver.get returns
+            extra_metrics = {"app_ready": ready["ready_at"]} if ready["ready_at"] is not None else {}
+            return self.collect(driver, platform=platform, test=test, extra_metrics=extra_metrics,
+                                ready=ready["ready"], profile=profile["name"] if profile else None)
+
+    def _write(self, record):
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        logger.info(f"Performance record for {record['url']}: {record['metrics']}")
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+History of performance samples and a statistical regression gate.
+Every collected metric is stored in SQLite keyed by run, app build, platform,
+test, device profile and mode (live or replayed network, headless browser). A run is compared with a rolling baseline of previous runs using a
+one-sided Mann-Whitney U test, so a consistent slowdown is flagged even when it
+stays under any fixed threshold, while a single noisy sample is not.
+"""
+
+import os
+import math
+import time
+import sqlite3
+import logging
+
+logger = logging.getLogger(__name__)
+
+HISTORY_PATH = "artifacts/perf_history.sqlite"
+
+# Metrics where a larger value is an improvement; every other metric is "lower is better"
+HIGHER_IS_BETTER = {"cached_resources", "service_worker", "decoded_frames", "played_seconds", "bitrate_kbps"}
+
+# Sample sizes up to which the exact U distribution is used instead of the normal approximation
+EXACT_LIMIT = 20
+
+# Samples a series needs in the current run, and in its baseline, before it is judged
+MIN_CURRENT = 3
+MIN_BASELINE = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    build TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    test TEXT NOT NULL,
+    profile TEXT NOT NULL DEFAULT 'none',
+    mode TEXT NOT NULL DEFAULT 'live',
+    metric TEXT NOT NULL,
+    value REAL NOT NULL,
+    recorded_at REAL NOT NULL
+);
+"""
+
+# Created once histories from before device profiles and modes have their columns
+INDEXES = """
+DROP INDEX IF EXISTS samples_profile_series;
+CREATE INDEX IF NOT EXISTS samples_series ON samples (platform, test, profile, mode, metric, run_id);
+"""
+
+
+def run_mode(replay=False, latency_ms=0, bandwidth_kbps=None, headless=False):
+    """Name of the conditions a run measures under, e.g. "live" or "replay 50ms 2000kbps headless"."""
+    parts = ["replay" if replay else "live"]
+    if replay and latency_ms:
+        parts.append(f"{latency_ms:g}ms")
+    if replay and bandwidth_kbps:
+        parts.append(f"{bandwidth_kbps:g}kbps")
+    if headless:
+        parts.append("headless")
+    return " ".join(parts)
+
+
+def median(values):
+    """Median of a non-empty sequence."""
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def _exact_upper_tail(u, n1, n2):
+    """P(U >= u) under H0 for samples without ties, by counting rank arrangements."""
+    # counts[i][j][k]: arrangements of i "current" and j "baseline" values with U == k
+    counts = [[None] * (n2 + 1) for _ in range(n1 + 1)]
+    for i in range(n1 + 1):
+        for j in range(n2 + 1):
+            if i == 0 or j == 0:
+                counts[i][j] = [1]
+                continue
+            # The largest value is either a "current" one (beating all j baselines) or a baseline one
+            with_current = [0] * j + counts[i - 1][j]
+            with_baseline = counts[i][j - 1]
+            size = max(len(with_current), len(with_baseline))
+            counts[i][j] = [
+                (with_current[k] if k < len(with_current) else 0) +
+                (with_baseline[k] if k < len(with_baseline) else 0)
+                for k in range(size)
+            ]
+    distribution = counts[n1][n2]
+    total = sum(distribution)
+    return sum(distribution[math.ceil(u):]) / total
+
+
+def mann_whitney_u(baseline, current):
+    """One-sided Mann-Whitney U test that ``current`` tends to exceed ``baseline``.
+
+    Returns ``(u, p_value)`` where ``u`` counts (current, baseline) pairs in
+    which the current value is larger, ties counting one half.
+    """
+    n1, n2 = len(current), len(baseline)
+    combined = sorted([(value, 0) for value in current] + [(value, 1) for value in baseline])
+
+    ranks = [0.0] * len(combined)
+    tie_term = 0
+    index = 0
+    while index < len(combined):
+        end = index
+        while end + 1 < len(combined) and combined[end + 1][0] == combined[index][0]:
+            end += 1
+        for position in range(index, end + 1):
+            ranks[position] = (index + end) / 2 + 1
+        size = end - index + 1
+        tie_term += size ** 3 - size
+        index = end + 1
+
+    rank_sum = sum(rank for rank, (_, group) in zip(ranks, combined) if group == 0)
+    u = rank_sum - n1 * (n1 + 1) / 2
+
+    if tie_term == 0 and n1 + n2 <= EXACT_LIMIT:
+        return u, _exact_upper_tail(u, n1, n2)
+
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return u, 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return u, 0.5 * math.erfc(z / math.sqrt(2))
+
+
+class PerfStore:
+    """SQLite-backed history of per-platform, per-metric samples.
+
+    Samples added through this store are recorded under ``mode`` (see :func:`run_mode`).
+    """
+
+    def __init__(self, path=HISTORY_PATH, mode="live"):
+        self.path = path
+        self.mode = mode
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(samples)")]
+            if "profile" not in columns:
+                # Samples recorded before device profiles existed ran unthrottled
+                connection.execute("ALTER TABLE samples ADD COLUMN profile TEXT NOT NULL DEFAULT 'none'")
+            if "mode" not in columns:
+                # Samples recorded before modes existed are taken to come from live loads
+                connection.execute("ALTER TABLE samples ADD COLUMN mode TEXT NOT NULL DEFAULT 'live'")
+            connection.executescript(INDEXES)
+
+    def _connect(self):
+        # Several xdist workers may write at once; wait for the lock instead of failing
+        return sqlite3.connect(self.path, timeout=30)
+
+    def add_record(self, run_id, build, record):
+        """Store every metric of a perf_collector record.
+
+        Samples are kept apart per device profile and mode, so throttled and
+        unthrottled, or replayed and live, loads never share a baseline.
+        """
+        rows = [
+            (run_id, build, record["platform"] or "unknown", record["test"] or "unknown",
+             record.get("profile") or "none", self.mode, metric, float(value), record["timestamp"])
+            for metric, value in record["metrics"].items()
+        ]
+        with self._connect() as connection:
+            connection.executemany(
+                "INSERT INTO samples (run_id, build, platform, test, profile, mode, metric, value, recorded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def series(self, run_id):
+        """Return the (platform, test, profile, mode, metric) series that have samples in ``run_id``."""
+        with self._connect() as connection:
+            return connection.execute(
+                "SELECT DISTINCT platform, test, profile, mode, metric FROM samples WHERE run_id = ? "
+                "ORDER BY platform, test, profile, mode, metric", (run_id,)
+            ).fetchall()
+
+    def values(self, series, run_id):
+        """Samples of one ``series`` (as returned by :meth:`series`) in ``run_id``."""
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT value FROM samples WHERE platform = ? AND test = ? AND profile = ? AND mode = ? "
+                "AND metric = ? AND run_id = ?",
+                (*series, run_id)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def baseline(self, series, run_id, runs=20):
+        """Samples of one ``series`` from the ``runs`` most recent runs before ``run_id``."""
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT value FROM samples WHERE platform = ? AND test = ? AND profile = ? AND mode = ? "
+                "AND metric = ? AND run_id IN ("
+                "  SELECT DISTINCT run_id FROM samples"
+                "  WHERE platform = ? AND test = ? AND profile = ? AND mode = ? AND metric = ? AND run_id < ?"
+                "  ORDER BY run_id DESC LIMIT ?)",
+                (*series, *series, run_id, runs)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def compare(self, run_id, alpha=0.05, min_effect=0.05, baseline_runs=20, min_current=MIN_CURRENT,
+                min_baseline=MIN_BASELINE):
+        """Compare every series of ``run_id`` with its rolling baseline.
+
+        A series is a "regression" (or "improvement") when the Mann-Whitney p-value
+        is below ``alpha`` and the medians differ by at least ``min_effect``
+        (relative). Series with fewer than ``min_current`` samples in the run or
+        ``min_baseline`` in the baseline are reported as "insufficient data", so
+        a single noisy load never gates a build. Compare a run once all of its
+        processes have stored their samples.
+        """
+        start_time = time.time()
+        verdicts = []
+        for series in self.series(run_id):
+            platform, test, profile, mode, metric = series
+            current = self.values(series, run_id)
+            baseline = self.baseline(series, run_id, runs=baseline_runs)
+            verdict = {
+                "platform": platform, "test": test, "profile": profile, "mode": mode, "metric": metric,
+                "current_samples": len(current), "baseline_samples": len(baseline),
+                "current_median": median(current),
+                "baseline_median": median(baseline) if baseline else None,
+                "change": None, "p_value": None, "verdict": "insufficient data",
+            }
+            if len(current) >= min_current and len(baseline) >= min_baseline:
+                worse_if_higher = metric not in HIGHER_IS_BETTER
+                reference = verdict["baseline_median"]
+                change = (verdict["current_median"] - reference) / abs(reference) if reference else 0.0
+                _, p_worse = mann_whitney_u(baseline, current) if worse_if_higher else mann_whitney_u(current, baseline)
+                _, p_better = mann_whitney_u(current, baseline) if worse_if_higher else mann_whitney_u(baseline, current)
+                effect = change if worse_if_higher else -change
+                verdict["change"] = change
+                if p_worse < alpha and effect >= min_effect:
+                    verdict.update(verdict="regression", p_value=p_worse)
+                elif p_better < alpha and effect <= -min_effect:
+                    verdict.update(verdict="improvement", p_value=p_better)
+                else:
+                    verdict.update(verdict="no change", p_value=min(p_worse, p_better))
+            verdicts.append(verdict)
+        logger.info(f"Compared {len(verdicts)} series of run {run_id} in {time.time() - start_time:.2f} seconds")
+        return verdicts
+
+
+def format_verdict(verdict):
+    """One-line description of a compare() verdict."""
+    conditions = [name for name, default in ((verdict.get("profile", "none"), "none"),
+                                             (verdict.get("mode", "live"), "live")) if name != default]
+    tags = f" [{', '.join(conditions)}]" if conditions else ""
+    line = f"{verdict['platform']} {verdict['test']}{tags} {verdict['metric']}: {verdict['verdict']}"
+    if verdict["change"] is not None:
+        line += (f" (median {verdict['baseline_median']:.1f} -> {verdict['current_median']:.1f}, "
+                 f"{verdict['change']:+.1%}, p={verdict['p_value']:.3f}, "
+                 f"n={verdict['current_samples']} vs {verdict['baseline_samples']})")
+    return line
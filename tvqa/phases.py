@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Where each test's wall time goes.
+Every pytest phase (setup, call, teardown) is split into browser acquisition,
+navigation, explicit sleeps, polling waits, DOM queries, screenshot I/O,
+other WebDriver commands, and the test's own code (assertions) or fixture
+code. Spans nest like a call stack and only self time is counted, so the
+stacks can be written in the folded format of flame graphs (flamegraph.pl,
+speedscope) and summed per platform. Only the thread running the test is
+accounted; helper threads work in parallel with it. Sleeps and WebDriverWait
+polling are timed through wrappers that are only in place while a test runs.
+"""
+
+import time
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+
+from selenium.webdriver.support.ui import WebDriverWait
+
+logger = logging.getLogger(__name__)
+
+# Categories of the phase budget, in report order
+CATEGORIES = ("acquisition", "navigation", "sleep", "wait", "dom", "screenshot", "webdriver",
+              "assertions", "fixtures")
+
+# What is left of a pytest phase outside every span
+RESIDUAL = {"setup": "fixtures", "call": "assertions", "teardown": "fixtures"}
+
+NAVIGATION_COMMANDS = {"get", "goBack", "goForward", "refresh", "cdp:Page.navigate", "cdp:Page.reload"}
+SCREENSHOT_COMMANDS = {"screenshot", "elementScreenshot", "fullPageScreenshot", "cdp:Page.captureScreenshot"}
+DOM_COMMANDS = {"getTitle", "getPageSource", "getCurrentUrl", "cdp:Runtime.evaluate"}
+DOM_PREFIXES = ("find", "getElement", "isElement", "executeScript", "executeAsyncScript",
+                "w3cExecuteScript", "cdp:DOM.")
+
+FOLDED_NAME = "phases.folded"
+
+_clock = None
+_patched = []
+
+
+def command_category(name):
+    """Budget category of a WebDriver command (as named by :mod:`tvqa.commands`)."""
+    if name in NAVIGATION_COMMANDS:
+        return "navigation"
+    if name in SCREENSHOT_COMMANDS:
+        return "screenshot"
+    if name in DOM_COMMANDS or name.startswith(DOM_PREFIXES):
+        return "dom"
+    return "webdriver"
+
+
+class PhaseClock:
+    """Self time per span stack of the running test."""
+
+    def __init__(self):
+        self.results = []
+        self.test = None
+        self.platform = None
+        self._thread = None
+        # Open spans as [name, start, time of finished children]
+        self._frames = []
+        self._stacks = {}
+        self._wall = 0.0
+
+    def start_test(self, test, platform):
+        self.test, self.platform = test, platform
+        self._thread = threading.get_ident()
+        self._stacks = {}
+        self._wall = 0.0
+        _patch()
+
+    def finish_test(self):
+        """Store the accounted test as ``{test, platform, wall, stacks}`` (milliseconds)."""
+        if self.test is not None:
+            self.results.append({"test": self.test, "platform": self.platform, "wall": self._wall,
+                                 "stacks": self._stacks})
+        self.test = None
+        self._thread = None
+        self._frames = []
+        _unpatch()
+
+    def accounting(self):
+        """True on the thread running the current test."""
+        return self._thread is not None and threading.get_ident() == self._thread
+
+    def push(self, name):
+        self._frames.append([name, time.perf_counter(), 0.0])
+
+    def pop(self):
+        name, start_time, children = self._frames.pop()
+        elapsed = (time.perf_counter() - start_time) * 1000
+        if self._frames:
+            path = tuple(frame[0] for frame in self._frames) + (name,)
+            self._frames[-1][2] += elapsed
+        else:
+            # A pytest phase: its self time is the test's or the fixtures' own code
+            path = (name, RESIDUAL.get(name, "other"))
+            self._wall += elapsed
+        self._add(path, elapsed - children)
+
+    def command(self, name, ms):
+        """Account a finished WebDriver command (a :class:`tvqa.commands.CommandTimer` listener)."""
+        if not self._frames or not self.accounting():
+            return
+        self._frames[-1][2] += ms
+        self._add(tuple(frame[0] for frame in self._frames) + (command_category(name), name), ms)
+
+    def _add(self, path, ms):
+        key = ";".join(path)
+        self._stacks[key] = self._stacks.get(key, 0.0) + max(ms, 0.0)
+
+
+@contextmanager
+def span(name):
+    """Account the enclosed time (or decorated call) to ``name`` on the test's thread."""
+    clock = _clock
+    if clock is None or not clock._frames or not clock.accounting():
+        yield
+        return
+    clock.push(name)
+    try:
+        yield
+    finally:
+        clock.pop()
+
+
+def category(stack):
+    """Budget category of a folded stack: its outermost span below the pytest phase."""
+    frames = stack.split(";")
+    return frames[1] if len(frames) > 1 else "other"
+
+
+def _timed(owner, attribute, name):
+    original = getattr(owner, attribute)
+
+    @functools.wraps(original)
+    def timed(*args, **kwargs):
+        # Calls from other threads (screenshot writer, pool helpers) pass straight through
+        with span(name):
+            return original(*args, **kwargs)
+
+    setattr(owner, attribute, timed)
+    _patched.append((owner, attribute, original))
+
+
+def _patch():
+    """Give explicit sleeps and WebDriverWait polling their own spans until :func:`_unpatch`."""
+    if _patched:
+        return
+    _timed(time, "sleep", "sleep")
+    _timed(WebDriverWait, "until", "wait")
+    _timed(WebDriverWait, "until_not", "wait")
+
+
+def _unpatch():
+    while _patched:
+        owner, attribute, original = _patched.pop()
+        setattr(owner, attribute, original)
+
+
+def install():
+    """Start accounting this process; sleeps and waits are only wrapped from a test's setup to its teardown."""
+    global _clock
+    uninstall()
+    _clock = PhaseClock()
+    return _clock
+
+
+def uninstall():
+    global _clock
+    _unpatch()
+    _clock = None
+
+
+def clock():
+    """The clock created by :func:`install`."""
+    return _clock
+
+
+def aggregate(results):
+    """Sum the tests' stacks per platform: ``{platform: {stack: ms}}``."""
+    platforms = {}
+    for result in results:
+        stacks = platforms.setdefault(result["platform"] or "other", {})
+        for stack, ms in result["stacks"].items():
+            stacks[stack] = stacks.get(stack, 0.0) + ms
+    return platforms
+
+
+def write_folded(results, path):
+    """Write the per-platform stacks as folded flame-graph lines (values in microseconds)."""
+    with open(path, "w", encoding="utf-8") as f:
+        for platform, stacks in sorted(aggregate(results).items()):
+            for stack, ms in sorted(stacks.items()):
+                if ms * 1000 >= 1:
+                    f.write(f"{platform};{stack} {int(ms * 1000)}\n")
+    return path
+
+
+def budget_table(results):
+    """Share of the accounted time per category, one row per platform."""
+    tests = {}
+    for result in results:
+        platform = result["platform"] or "other"
+        tests[platform] = tests.get(platform, 0) + 1
+    lines = [f"{'platform':<10} {'tests':>5} {'wall s':>8} " + " ".join(f"{name[:11]:>11}" for name in CATEGORIES)]
+    for platform, stacks in sorted(aggregate(results).items()):
+        totals = {}
+        for stack, ms in stacks.items():
+            totals[category(stack)] = totals.get(category(stack), 0.0) + ms
+        wall = sum(totals.values()) or 1.0
+        lines.append(f"{platform:<10} {tests[platform]:>5} {wall / 1000:>8.1f} "
+                     + " ".join(f"{totals.get(name, 0.0) / wall:>11.1%}" for name in CATEGORIES))
+    return lines
@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+The TV platforms under test: app URL and the user agent of the TV browser.
+"""
+
+PLATFORMS = {
+    "samsung": {
+        "url": "https://ctv.play.tv2.no/production/play/samsung/index.html",
+        "user_agent": "Mozilla/5.0 (SMART-TV; SAMSUNG; SmartTV; en) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/69.0.3497.106 Safari/537.36",
+    },
+    "lg": {
+        "url": "https://ctv.play.tv2.no/production/play/lg/index.html",
+        "user_agent": "Mozilla/5.0 (Web0S; Linux/SmartTV) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/79.0.3945.79 Safari/537.36",
+    },
+    "philips": {
+        "url": "https://ctv.play.tv2.no/production/play/philips/index.html",
+        "user_agent": "Mozilla/5.0 (SMART-TV; PHILIPS-OS) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    },
+}
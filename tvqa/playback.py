@@ -0,0 +1,421 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Video playback quality-of-experience (QoE) measurements.
+A script injected before any page script listens (in the capture phase) to
+the media events of every video element and records time to first frame,
+startup delay, stalls, rendition switches and seeks as they happen;
+dropped and decoded frames come from getVideoPlaybackQuality() and the
+bitrate from the decoded byte count when the record is collected. A local,
+range-capable stream server plays a test stream without network access, and
+every record is checked against the platform's QoE budget. The test stream is
+encoded once by the browser itself (WebCodecs) from a canvas test pattern.
+"""
+
+import os
+import re
+import time
+import base64
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tvqa import cdp, webm
+from tvqa.workers import worker_id
+
+logger = logging.getLogger(__name__)
+
+# Test stream played by the offline playback tests, generated on first use (see generate_stream)
+STREAM_PATH = os.environ.get("TVQA_TEST_STREAM", "artifacts/media/test_stream.webm")
+
+# The generated stream: long enough to play, seek back and play on, with a key frame every second
+STREAM_SIZE = (640, 360)
+STREAM_FPS = 25
+STREAM_SECONDS = 12
+STREAM_BITRATE = 800000
+
+# Upper limits per platform; the lower-end Philips sets get a little more startup time
+QOE_BUDGETS = {
+    "samsung": {"time_to_first_frame": 2000, "startup_delay": 1500, "stall_total": 500,
+                "dropped_ratio": 0.02, "seek_latency_max": 1500},
+    "lg": {"time_to_first_frame": 2000, "startup_delay": 1500, "stall_total": 500,
+           "dropped_ratio": 0.02, "seek_latency_max": 1500},
+    "philips": {"time_to_first_frame": 2500, "startup_delay": 2000, "stall_total": 500,
+                "dropped_ratio": 0.03, "seek_latency_max": 2000},
+}
+
+PLAYBACK_INIT_SCRIPT = """
+(function () {
+    if (window.__tvqaPlayback) { return; }
+    var state = window.__tvqaPlayback = {elements: [], videos: []};
+    function entry(video) {
+        var index = state.elements.indexOf(video);
+        if (index < 0) {
+            index = state.elements.push(video) - 1;
+            state.videos.push({
+                src: '', loadStart: null, playRequested: null, playing: null, firstFrame: null,
+                stalls: [], stallStart: null, seeks: [], seekStart: null, renditions: []
+            });
+        }
+        return state.videos[index];
+    }
+    function watchFirstFrame(video, record) {
+        if (video.requestVideoFrameCallback) {
+            video.requestVideoFrameCallback(function (now, metadata) {
+                if (record.firstFrame === null) { record.firstFrame = metadata.presentationTime || now; }
+            });
+        } else {
+            video.addEventListener('loadeddata', function () {
+                if (record.firstFrame === null) { record.firstFrame = performance.now(); }
+            }, {once: true});
+        }
+    }
+    var handlers = {
+        loadstart: function (video, record, now) {
+            if (record.loadStart === null) { record.loadStart = now; }
+            record.src = video.currentSrc || video.src;
+        },
+        play: function (video, record, now) {
+            if (record.playRequested === null) { record.playRequested = now; watchFirstFrame(video, record); }
+        },
+        playing: function (video, record, now) {
+            if (record.playing === null) { record.playing = now; }
+            if (record.stallStart !== null) {
+                record.stalls.push({start: record.stallStart, duration: now - record.stallStart});
+                record.stallStart = null;
+            }
+        },
+        waiting: function (video, record, now) {
+            // Waiting before the first frame is startup, waiting during a seek is the seek
+            if (record.playing !== null && record.stallStart === null && !video.seeking) { record.stallStart = now; }
+        },
+        seeking: function (video, record, now) { record.seekStart = now; },
+        seeked: function (video, record, now) {
+            if (record.seekStart !== null) { record.seeks.push(now - record.seekStart); record.seekStart = null; }
+        },
+        resize: function (video, record, now) {
+            record.renditions.push({time: now, width: video.videoWidth, height: video.videoHeight});
+        }
+    };
+    Object.keys(handlers).forEach(function (type) {
+        // Media events do not bubble, but they do pass the document in the capture phase
+        document.addEventListener(type, function (event) {
+            if (event.target instanceof HTMLVideoElement) {
+                handlers[type](event.target, entry(event.target), performance.now());
+            }
+        }, true);
+    });
+})();
+"""
+
+COLLECT_SCRIPT = """
+var state = window.__tvqaPlayback;
+if (!state) { return []; }
+var now = performance.now();
+return state.videos.map(function (record, index) {
+    var video = state.elements[index];
+    var quality = video.getVideoPlaybackQuality ? video.getVideoPlaybackQuality() : null;
+    var stalls = record.stalls.slice();
+    if (record.stallStart !== null) { stalls.push({start: record.stallStart, duration: now - record.stallStart}); }
+    return {
+        src: record.src, loadStart: record.loadStart, playRequested: record.playRequested,
+        playing: record.playing, firstFrame: record.firstFrame, stalls: stalls, seeks: record.seeks,
+        renditions: record.renditions, currentTime: video.currentTime, paused: video.paused,
+        playedTime: playedTime(video.played),
+        droppedFrames: quality ? quality.droppedVideoFrames : null,
+        decodedFrames: quality ? quality.totalVideoFrames : null,
+        decodedBytes: typeof video.webkitVideoDecodedByteCount === 'number' ? video.webkitVideoDecodedByteCount : null
+    };
+});
+function playedTime(ranges) {
+    var total = 0;
+    for (var i = 0; i < ranges.length; i++) { total += ranges.end(i) - ranges.start(i); }
+    return total;
+}
+"""
+
+# Encodes a moving canvas test pattern with WebCodecs and returns the VP8 chunks (base64)
+GENERATE_SCRIPT = """
+var width = arguments[0], height = arguments[1], fps = arguments[2], seconds = arguments[3];
+var bitrate = arguments[4], done = arguments[arguments.length - 1];
+if (!window.VideoEncoder) { return done({error: 'WebCodecs VideoEncoder is not available'}); }
+var canvas = document.createElement('canvas');
+canvas.width = width;
+canvas.height = height;
+var context = canvas.getContext('2d');
+var chunks = [];
+var encoder = new VideoEncoder({
+    output: function (chunk) {
+        var data = new Uint8Array(chunk.byteLength), binary = '';
+        chunk.copyTo(data);
+        for (var i = 0; i < data.length; i += 0x8000) {
+            binary += String.fromCharCode.apply(null, data.subarray(i, i + 0x8000));
+        }
+        chunks.push({key: chunk.type === 'key', timestamp: chunk.timestamp, data: btoa(binary)});
+    },
+    error: function (error) { done({error: String(error)}); }
+});
+encoder.configure({codec: 'vp8', width: width, height: height, bitrate: bitrate, framerate: fps});
+for (var index = 0; index < fps * seconds; index++) {
+    // A moving bar and the frame number over a slowly changing background, so every frame differs
+    context.fillStyle = 'hsl(' + (index * 3 % 360) + ', 60%, 30%)';
+    context.fillRect(0, 0, width, height);
+    context.fillStyle = '#fff';
+    context.fillRect(index * 7 % width, 0, width / 16, height);
+    context.font = (height / 6) + 'px sans-serif';
+    context.fillText(String(index), width / 20, height / 4);
+    var frame = new VideoFrame(canvas, {timestamp: Math.round(index * 1e6 / fps), duration: Math.round(1e6 / fps)});
+    encoder.encode(frame, {keyFrame: index % fps === 0});
+    frame.close();
+}
+encoder.flush().then(function () {
+    encoder.close();
+    done({chunks: chunks});
+}, function (error) { done({error: String(error)}); });
+"""
+
+# Resolves once the video has played until ``position`` (or false after the timeout)
+PLAY_UNTIL_SCRIPT = """
+var video = arguments[0], position = arguments[1], timeout = arguments[2];
+var done = arguments[arguments.length - 1];
+if (video.currentTime >= position) { return done(true); }
+var timer = setTimeout(function () { video.removeEventListener('timeupdate', check); done(false); }, timeout);
+function check() {
+    if (video.currentTime >= position) {
+        clearTimeout(timer);
+        video.removeEventListener('timeupdate', check);
+        done(true);
+    }
+}
+video.addEventListener('timeupdate', check);
+var started = video.play();
+if (started && started.catch) { started.catch(function () {}); }
+"""
+
+SEEK_SCRIPT = """
+var video = arguments[0], position = arguments[1], timeout = arguments[2];
+var done = arguments[arguments.length - 1];
+var timer = setTimeout(function () { done(false); }, timeout);
+video.addEventListener('seeked', function () { clearTimeout(timer); done(true); }, {once: true});
+video.currentTime = position;
+"""
+
+PLAYER_PAGE = """<!DOCTYPE html>
+<html><head><title>TV 2 Play test stream</title>
+<style>html, body {{ margin: 0; background: #000; }} video {{ width: 100vw; height: 100vh; }}</style>
+</head><body><video id="player" src="/{name}" muted playsinline preload="auto"></video></body></html>
+"""
+
+
+def summarise(video):
+    """Flatten the record of one video element into ``{metric: number}`` (ms, counts, ratios)."""
+    start = video["playRequested"] if video["playRequested"] is not None else video["loadStart"]
+    stalls = video["stalls"]
+    seeks = video["seeks"]
+    metrics = {
+        "time_to_first_frame": video["firstFrame"] - start
+        if video["firstFrame"] is not None and start is not None else None,
+        "startup_delay": video["playing"] - video["playRequested"]
+        if video["playing"] is not None and video["playRequested"] is not None else None,
+        "stall_count": len(stalls),
+        "stall_total": sum(stall["duration"] for stall in stalls),
+        "rendition_switches": max(len(video["renditions"]) - 1, 0),
+        "seek_count": len(seeks),
+        "seek_latency_mean": sum(seeks) / len(seeks) if seeks else None,
+        "seek_latency_max": max(seeks) if seeks else None,
+        "played_seconds": video["currentTime"],
+        "bitrate_kbps": video["decodedBytes"] * 8 / video["playedTime"] / 1000
+        if video.get("decodedBytes") and video.get("playedTime") else None,
+        "dropped_frames": video["droppedFrames"],
+        "decoded_frames": video["decodedFrames"],
+        "dropped_ratio": video["droppedFrames"] / video["decodedFrames"] if video["decodedFrames"] else None,
+    }
+    return {name: value for name, value in metrics.items() if value is not None}
+
+
+def generate_stream(driver, path, size=STREAM_SIZE, fps=STREAM_FPS, seconds=STREAM_SECONDS, bitrate=STREAM_BITRATE):
+    """Encode the test pattern with ``driver``'s VP8 encoder and write it to ``path`` as a seekable WebM file.
+
+    WebCodecs needs a secure context, so ``driver`` should be on a localhost
+    page such as the stream server's player.
+    """
+    width, height = size
+    result = driver.execute_async_script(GENERATE_SCRIPT, width, height, fps, seconds, bitrate)
+    if result.get("error"):
+        raise RuntimeError(f"Could not encode the test stream: {result['error']}")
+    frames = [(round(chunk["timestamp"] / 1000), chunk["key"], base64.b64decode(chunk["data"]))
+              for chunk in sorted(result["chunks"], key=lambda chunk: chunk["timestamp"])]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Written under another name first so an interrupted run leaves no truncated stream behind
+    webm.write_webm(path + ".part", frames, width, height, duration_ms=seconds * 1000)
+    os.replace(path + ".part", path)
+    logger.info(f"Generated a {seconds}s {width}x{height} test stream at {path} "
+                f"({os.path.getsize(path) / 1024:.0f} KiB)")
+    return path
+
+
+def check_budget(record, budgets=QOE_BUDGETS):
+    """Budget violations of a playback record as human-readable strings."""
+    budget = budgets.get(record["platform"], {})
+    return [
+        f"{record['platform']} {metric} {record['metrics'][metric]:.3g} > {limit}"
+        for metric, limit in budget.items()
+        if metric in record["metrics"] and record["metrics"][metric] > limit
+    ]
+
+
+class PlaybackMonitor:
+    """Collects one QoE record per played video and keeps them for the per-platform summary."""
+
+    def __init__(self, budgets=QOE_BUDGETS, listeners=()):
+        self.budgets = budgets
+        # Callables receiving every record, e.g. the performance history store
+        self.listeners = list(listeners)
+        self.records = []
+
+    def install(self, driver):
+        """Register the media event listeners so they run before any page script."""
+        cdp.add_init_script(driver, "playback", PLAYBACK_INIT_SCRIPT)
+
+    def play(self, driver, video, seconds=5, timeout=30):
+        """Start ``video`` and wait (event-driven) until ``seconds`` of it have played."""
+        played = driver.execute_async_script(PLAY_UNTIL_SCRIPT, video, seconds, timeout * 1000)
+        if not played:
+            logger.warning(f"Video did not reach {seconds}s of playback within {timeout}s")
+        return played
+
+    def seek(self, driver, video, position, timeout=10):
+        """Seek ``video`` to ``position`` seconds and wait for the seek to complete."""
+        return driver.execute_async_script(SEEK_SCRIPT, video, position, timeout * 1000)
+
+    def collect(self, driver, platform=None, test=None):
+        """Read the QoE data of the first instrumented video on the page and store the record."""
+        videos = driver.execute_script(COLLECT_SCRIPT)
+        if not videos:
+            return None
+        record = {
+            "timestamp": time.time(),
+            "worker": worker_id(),
+            "platform": platform,
+            "test": test,
+            "src": videos[0]["src"],
+            "metrics": summarise(videos[0]),
+            "stalls": videos[0]["stalls"],
+            "renditions": videos[0]["renditions"],
+        }
+        record["violations"] = check_budget(record, self.budgets)
+        self.records.append(record)
+        for listener in self.listeners:
+            listener(record)
+        logger.info(f"Playback QoE of {record['src']}: {record['metrics']}")
+        return record
+
+
+def summary_table(records):
+    """Median of every QoE metric per platform, with the number of budget violations."""
+    grouped = {}
+    for record in records:
+        per_platform = grouped.setdefault(record["platform"], {"playbacks": 0, "violations": 0, "metrics": {}})
+        per_platform["playbacks"] += 1
+        per_platform["violations"] += len(record["violations"])
+        for metric, value in record["metrics"].items():
+            per_platform["metrics"].setdefault(metric, []).append(value)
+
+    lines = []
+    for platform in sorted(grouped, key=str):
+        entry = grouped[platform]
+        lines.append(f"{platform}: {entry['playbacks']} playback(s), {entry['violations']} budget violation(s)")
+        for metric, values in sorted(entry["metrics"].items()):
+            ordered = sorted(values)
+            lines.append(f"  {metric:<22} {ordered[len(ordered) // 2]:>12.3f}")
+    return lines
+
+
+class StreamServer:
+    """Serves a local test stream, with HTTP range requests, and a minimal player page at ``/``."""
+
+    def __init__(self, media_path=STREAM_PATH, host="127.0.0.1", port=0):
+        self.media_path = media_path
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def origin(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def player_url(self):
+        return self.origin + "/"
+
+    def _handler_class(self):
+        server = self
+        name = os.path.basename(self.media_path)
+        content_type = "video/webm" if name.endswith(".webm") else "video/mp4"
+
+        class StreamHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path in ("/", "/index.html"):
+                    body = PLAYER_PAGE.format(name=name).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                if self.path.split("?", 1)[0] != f"/{name}":
+                    self.send_error(404)
+                    return
+
+                size = os.path.getsize(server.media_path)
+                start, end = 0, size - 1
+                match = re.match(r"bytes=(\d*)-(\d*)", self.headers.get("Range", ""))
+                if match:
+                    if match.group(1):
+                        start = int(match.group(1))
+                        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+                    else:
+                        start = max(size - int(match.group(2)), 0)
+                    if start >= size:
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{size}")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Length", str(end - start + 1))
+                self.end_headers()
+                with open(server.media_path, "rb") as f:
+                    f.seek(start)
+                    remaining = end - start + 1
+                    while remaining > 0:
+                        chunk = f.read(min(remaining, 256 * 1024))
+                        if not chunk:
+                            break
+                        try:
+                            self.wfile.write(chunk)
+                        except (BrokenPipeError, ConnectionResetError):
+                            # The browser cancels range requests it no longer needs
+                            return
+                        remaining -= len(chunk)
+
+            def log_message(self, format, *args):
+                logger.debug("stream: " + format % args)
+
+        return StreamHandler
+
+    def start(self):
+        """Serve in a background thread."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="stream-server", daemon=True)
+        self._thread.start()
+        logger.info(f"Stream server for {self.media_path} listening on {self.origin}")
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
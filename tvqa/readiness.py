@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Event-driven "app ready" detection.
+Instead of sleeping a fixed number of seconds after navigation, the page is
+instrumented (in-flight fetch/XHR, resource timing and DOM mutations) and a
+single asynchronous script resolves as soon as the app is quiet and its root
+container is present.
+"""
+
+import time
+import logging
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from tvqa import cdp, phases
+
+logger = logging.getLogger(__name__)
+
+# Root container rendered by the TV 2 Play apps once they have booted
+APP_ROOT_SELECTOR = ".app-container, #app, .tv-app"
+
+READINESS_INIT_SCRIPT = """
+(function () {
+    if (window.__tvqaReady) { return; }
+    var state = window.__tvqaReady = {
+        inflight: 0,
+        lastNetwork: performance.now(),
+        lastMutation: performance.now()
+    };
+    function begin() { state.inflight++; state.lastNetwork = performance.now(); }
+    function end() { state.inflight = Math.max(0, state.inflight - 1); state.lastNetwork = performance.now(); }
+
+    if (window.fetch) {
+        var originalFetch = window.fetch;
+        window.fetch = function () {
+            begin();
+            return originalFetch.apply(this, arguments).then(
+                function (response) { end(); return response; },
+                function (error) { end(); throw error; }
+            );
+        };
+    }
+    if (window.XMLHttpRequest) {
+        var originalSend = XMLHttpRequest.prototype.send;
+        XMLHttpRequest.prototype.send = function () {
+            begin();
+            this.addEventListener('loadend', end);
+            return originalSend.apply(this, arguments);
+        };
+    }
+    if (window.PerformanceObserver) {
+        try {
+            new PerformanceObserver(function () { state.lastNetwork = performance.now(); })
+                .observe({type: 'resource', buffered: true});
+        } catch (e) {}
+    }
+    new MutationObserver(function () { state.lastMutation = performance.now(); })
+        .observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+})();
+"""
+
+READINESS_WAIT_SCRIPT = READINESS_INIT_SCRIPT + """
+var selector = arguments[0];
+var networkIdle = arguments[1];
+var domIdle = arguments[2];
+var timeout = arguments[3];
+var done = arguments[arguments.length - 1];
+var state = window.__tvqaReady;
+var start = performance.now();
+
+function check() {
+    var now = performance.now();
+    var pending = [];
+    var delay = 16;
+    if (document.readyState !== 'complete') { pending.push('document'); }
+    if (selector && !document.querySelector(selector)) { pending.push('root'); }
+    if (state.inflight > 0) {
+        pending.push('network');
+    } else if (now - state.lastNetwork < networkIdle) {
+        pending.push('network');
+        delay = Math.max(delay, networkIdle - (now - state.lastNetwork));
+    }
+    if (now - state.lastMutation < domIdle) {
+        pending.push('dom');
+        delay = Math.max(delay, domIdle - (now - state.lastMutation));
+    }
+    if (!pending.length || now - start >= timeout) {
+        // performance.now() counts from the navigation start of this document
+        done({pending: pending, inflight: state.inflight, readyAt: pending.length ? null : now});
+        return;
+    }
+    setTimeout(check, Math.min(delay, Math.max(16, timeout - (now - start))));
+}
+check();
+"""
+
+
+class AppReadiness:
+    """Waits for network quiescence, DOM quiescence and the app root container."""
+
+    def __init__(self, timeout=20, network_idle_ms=500, dom_idle_ms=300, selector=APP_ROOT_SELECTOR):
+        self.timeout = timeout
+        self.network_idle_ms = network_idle_ms
+        self.dom_idle_ms = dom_idle_ms
+        self.selector = selector
+        self.waits = []
+
+    def install(self, driver):
+        """Instrument every document ``driver`` loads from now on."""
+        cdp.add_init_script(driver, "readiness", READINESS_INIT_SCRIPT)
+
+    @phases.span("wait")
+    def wait(self, driver, selector=None, timeout=None, raise_on_timeout=True):
+        """Block until the current page is ready and return how long it took.
+
+        Returns a dict with ``elapsed`` (seconds the wait took), ``ready_at``
+        (ms from navigation start to readiness, measured in the page),
+        ``ready`` and the conditions still ``pending`` when the wait ended.
+        Raises TimeoutException if the app is not ready within the timeout,
+        unless ``raise_on_timeout`` is False.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        selector = self.selector if selector is None else selector
+        start_time = time.time()
+        deadline = start_time + timeout
+        result = {"pending": ["document"], "readyAt": None}
+
+        driver.set_script_timeout(timeout + 5)
+        while time.time() < deadline:
+            remaining_ms = max(0, (deadline - time.time()) * 1000)
+            try:
+                result = driver.execute_async_script(
+                    READINESS_WAIT_SCRIPT, selector, self.network_idle_ms, self.dom_idle_ms, remaining_ms
+                )
+            except WebDriverException as e:
+                # The document was replaced (navigation/reload) while we waited; try the new one
+                logger.debug(f"Readiness check interrupted, retrying: {e}")
+                time.sleep(0.05)
+                continue
+            if not result["pending"]:
+                break
+
+        record = {
+            "url": driver.current_url,
+            "elapsed": time.time() - start_time,
+            "ready": not result["pending"],
+            "pending": result["pending"],
+            # When the page became ready, in ms since its navigation start (None if it did not)
+            "ready_at": result.get("readyAt"),
+        }
+        self.waits.append(record)
+
+        if record["ready"]:
+            logger.info(f"App ready after {record['elapsed']:.2f} seconds")
+        else:
+            message = f"App not ready after {timeout} seconds, still waiting for: {', '.join(record['pending'])}"
+            if raise_on_timeout:
+                raise TimeoutException(message)
+            logger.warning(message)
+        return record
+
+    def stats(self):
+        """Summarise the recorded waits."""
+        durations = [record["elapsed"] for record in self.waits]
+        return {
+            "waits": len(durations),
+            "timeouts": sum(1 for record in self.waits if not record["ready"]),
+            "total": sum(durations),
+            "mean": sum(durations) / len(durations) if durations else 0.0,
+            "max": max(durations) if durations else 0.0,
+        }
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Remote-control input for the TV apps.
+Keys are delivered through the DevTools protocol as native key events with
+the key codes each platform's remote produces (Back is 10009 on Tizen, 461 on
+webOS, Backspace on Philips). Every press measures, inside the page, the time
+from the keydown event until focus moves and until the next frame after it.
+"""
+
+import json
+import time
+import logging
+
+from tvqa.stats import describe
+
+logger = logging.getLogger(__name__)
+
+FOCUS_SELECTOR = ":focus, .focused, [data-focused='true']"
+
+# How long to wait for focus to move after a key press
+FOCUS_TIMEOUT_MS = 1000
+
+_ARROWS = {
+    "left": {"key": "ArrowLeft", "code": "ArrowLeft", "keyCode": 37},
+    "up": {"key": "ArrowUp", "code": "ArrowUp", "keyCode": 38},
+    "right": {"key": "ArrowRight", "code": "ArrowRight", "keyCode": 39},
+    "down": {"key": "ArrowDown", "code": "ArrowDown", "keyCode": 40},
+    "ok": {"key": "Enter", "code": "Enter", "keyCode": 13, "text": "\r"},
+}
+
+KEYMAPS = {
+    "samsung": dict(_ARROWS, back={"key": "XF86Back", "code": "", "keyCode": 10009}),
+    "lg": dict(_ARROWS, back={"key": "GoBack", "code": "", "keyCode": 461}),
+    "philips": dict(_ARROWS, back={"key": "Backspace", "code": "Backspace", "keyCode": 8}),
+}
+
+# Page functions locating the focused element and describing it by its ancestor path
+FOCUS_HELPERS = """
+function focusedElement() {
+    var active = document.activeElement;
+    if (active && active !== document.body && active !== document.documentElement) { return active; }
+    var marked = document.querySelectorAll(""" + json.dumps(FOCUS_SELECTOR) + """);
+    return marked.length ? marked[marked.length - 1] : null;
+}
+function describe(element) {
+    var parts = [];
+    for (; element && element.nodeType === 1 && parts.length < 6; element = element.parentElement) {
+        var part = element.tagName.toLowerCase();
+        if (element.id) { part += '#' + element.id; }
+        else if (typeof element.className === 'string' && element.className.trim()) {
+            part += '.' + element.className.trim().split(/\\s+/).slice(0, 2).join('.');
+        }
+        parts.unshift(part);
+    }
+    return parts.join(' > ');
+}
+"""
+
+ARM_SCRIPT = FOCUS_HELPERS + """
+if (!window.__tvqaRemote) {
+    var remote = window.__tvqaRemote = {focusedElement: focusedElement, describe: describe};
+    function focusMoved() {
+        var probe = remote.probe;
+        if (!probe || probe.focusAt !== null || probe.keyAt === null) { return; }
+        var path = describe(focusedElement());
+        if (path === probe.before) { return; }
+        probe.focusAt = performance.now();
+        probe.after = path;
+        // The second animation frame callback runs once the frame with the new focus was produced
+        requestAnimationFrame(function () {
+            requestAnimationFrame(function () { probe.frameAt = performance.now(); });
+        });
+    }
+    window.addEventListener('keydown', function (event) {
+        if (remote.probe && remote.probe.keyAt === null) { remote.probe.keyAt = event.timeStamp; }
+    }, true);
+    document.addEventListener('focusin', focusMoved, true);
+    new MutationObserver(focusMoved).observe(document.documentElement, {
+        attributes: true, subtree: true, attributeFilter: ['class', 'data-focused']
+    });
+}
+window.__tvqaRemote.probe = {
+    keyAt: null, focusAt: null, frameAt: null,
+    before: describe(focusedElement()), after: null
+};
+"""
+
+RESULT_SCRIPT = """
+var timeout = arguments[0], done = arguments[arguments.length - 1];
+var started = performance.now();
+(function poll() {
+    var probe = window.__tvqaRemote && window.__tvqaRemote.probe;
+    if (!probe) { return done(null); }
+    if ((probe.focusAt !== null && probe.frameAt !== null) || performance.now() - started > timeout) {
+        return done({
+            keyAt: probe.keyAt, focusAt: probe.focusAt, frameAt: probe.frameAt,
+            before: probe.before, after: probe.after
+        });
+    }
+    setTimeout(poll, 5);
+})();
+"""
+
+
+class RemoteControl:
+    """Sends D-pad keys to the app in ``driver`` the way ``platform``'s remote does."""
+
+    def __init__(self, driver, platform, timeout_ms=FOCUS_TIMEOUT_MS, listeners=()):
+        self.driver = driver
+        self.platform = platform
+        self.keymap = KEYMAPS[platform]
+        self.timeout_ms = timeout_ms
+        # Callables receiving every press result, e.g. the session's latency summary
+        self.listeners = list(listeners)
+        self.presses = []
+
+    def send_key(self, key):
+        """Dispatch a native keydown/keyup pair for ``key`` (left, up, right, down, ok, back).
+
+        Keys that produce text (Enter for ``ok``) are sent as a ``keyDown``
+        with the text, as Puppeteer does, so the page also gets the keypress
+        and default action of Enter; the others are sent as a ``rawKeyDown``.
+        """
+        spec = self.keymap[key]
+        event = {
+            "key": spec["key"], "code": spec["code"],
+            "windowsVirtualKeyCode": spec["keyCode"], "nativeVirtualKeyCode": spec["keyCode"],
+        }
+        if spec.get("text"):
+            key_down = dict(event, type="keyDown", text=spec["text"], unmodifiedText=spec["text"])
+        else:
+            key_down = dict(event, type="rawKeyDown")
+        self.driver.execute_cdp_cmd("Input.dispatchKeyEvent", key_down)
+        self.driver.execute_cdp_cmd("Input.dispatchKeyEvent", dict(event, type="keyUp"))
+
+    def press(self, key, record=True):
+        """Press ``key`` and measure key-to-focus and key-to-next-frame latency (ms).
+
+        Latencies are None when focus did not move within the timeout. With
+        ``record`` unset the press is not counted in the latency statistics.
+        """
+        self.driver.execute_script(ARM_SCRIPT)
+        start_time = time.time()
+        self.send_key(key)
+        probe = self.driver.execute_async_script(RESULT_SCRIPT, self.timeout_ms) or {}
+
+        key_at = probe.get("keyAt")
+        focus_at, frame_at = probe.get("focusAt"), probe.get("frameAt")
+        result = {
+            "platform": self.platform,
+            "key": key,
+            "focus_changed": focus_at is not None,
+            "focus_latency": focus_at - key_at if focus_at is not None and key_at is not None else None,
+            "frame_latency": frame_at - key_at if frame_at is not None and key_at is not None else None,
+            "before": probe.get("before"),
+            "after": probe.get("after"),
+            "elapsed": time.time() - start_time,
+        }
+        if record:
+            self.presses.append(result)
+            for listener in self.listeners:
+                listener(result)
+        logger.info(f"{self.platform} {key}: focus {result['before']!r} -> {result['after']!r} "
+                    f"({result['focus_latency']} ms to focus, {result['frame_latency']} ms to next frame)")
+        return result
+
+    def sequence(self, keys):
+        """Press every key in ``keys`` in turn and return the results."""
+        return [self.press(key) for key in keys]
+
+
+def latency_table(presses):
+    """Per-platform, per-key distribution of key-to-focus and key-to-frame latency."""
+    grouped = {}
+    for press in presses:
+        entry = grouped.setdefault((press["platform"], press["key"]), {"presses": 0, "focus": [], "frame": []})
+        entry["presses"] += 1
+        if press["focus_latency"] is not None:
+            entry["focus"].append(press["focus_latency"])
+        if press["frame_latency"] is not None:
+            entry["frame"].append(press["frame_latency"])
+
+    lines = [f"{'platform':<10} {'key':<6} {'moved':>9} {'focus p50':>10} {'focus p90':>10} "
+             f"{'frame p50':>10} {'frame p90':>10} {'frame max':>10}"]
+    for (platform, key), entry in sorted(grouped.items()):
+        focus = describe(entry["focus"]) if entry["focus"] else None
+        frame = describe(entry["frame"]) if entry["frame"] else None
+        cells = [
+            f"{focus['p50']:>10.1f}" if focus else f"{'-':>10}",
+            f"{focus['p90']:>10.1f}" if focus else f"{'-':>10}",
+            f"{frame['p50']:>10.1f}" if frame else f"{'-':>10}",
+            f"{frame['p90']:>10.1f}" if frame else f"{'-':>10}",
+            f"{max(entry['frame']):>10.1f}" if frame else f"{'-':>10}",
+        ]
+        lines.append(f"{platform:<10} {key:<6} {len(entry['focus']):>4}/{entry['presses']:<4} {' '.join(cells)}")
+    return lines
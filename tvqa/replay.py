@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Record/replay of the HTTP traffic of the TV apps.
+In record mode every exchange a pooled browser makes is captured from the
+DevTools Network domain into HAR archives. In replay mode a local HTTP server
+serves the archived responses, so the suite runs offline with repeatable
+timings. Recorded URLs ``https://host/path`` are served as
+``http://127.0.0.1:<port>/host/path``; absolute URLs inside HTML, JS, CSS and
+JSON bodies are rewritten the same way.
+"""
+
+import os
+import re
+import json
+import time
+import glob
+import base64
+import logging
+import threading
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tvqa import devtools_log
+from tvqa.workers import worker_id
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = "artifacts/replay"
+
+# Headers that no longer describe the stored body, or that would block the local origin
+DROPPED_HEADERS = {
+    "content-encoding", "content-length", "transfer-encoding", "connection",
+    "strict-transport-security", "content-security-policy", "alt-svc",
+}
+
+TEXT_TYPES = ("text/", "javascript", "json", "xml", "css")
+
+# The replay server in use, if replay mode is active in this process
+_active_server = None
+
+
+def app_url(url):
+    """Return ``url``, or its replay endpoint when replay mode is active."""
+    if _active_server is None:
+        return url
+    return _active_server.replay_url(url)
+
+
+def activate(server):
+    """Route app_url() through ``server`` (None switches back to the network)."""
+    global _active_server
+    _active_server = server
+
+
+def _headers_list(headers):
+    return [{"name": name, "value": str(value)} for name, value in (headers or {}).items()]
+
+
+class HarRecorder:
+    """Collects Network events of pooled browsers into a HAR archive."""
+
+    def __init__(self, archive_dir=ARCHIVE_DIR):
+        self.archive_dir = archive_dir
+        self.entries = {}
+        self._pending = {}
+
+    def capture(self, driver, events=None):
+        """Turn Network events of ``driver`` into HAR entries.
+
+        ``events`` are ``(method, params)`` tuples already read from the
+        performance log; by default the log is drained here.
+        """
+        if events is None:
+            events = devtools_log.read_events(driver, "Network.")
+        finished = []
+        for method, params in events:
+            request_id = params.get("requestId")
+            if method == "Network.requestWillBeSent":
+                if "redirectResponse" in params and request_id in self._pending:
+                    self._complete(self._pending.pop(request_id), params["redirectResponse"], None)
+                self._pending[request_id] = {"request": params["request"], "wallTime": params.get("wallTime"),
+                                             "timestamp": params.get("timestamp")}
+            elif method == "Network.responseReceived" and request_id in self._pending:
+                self._pending[request_id]["response"] = params["response"]
+            elif method == "Network.loadingFinished" and request_id in self._pending:
+                self._pending[request_id]["encodedDataLength"] = params.get("encodedDataLength", -1)
+                self._pending[request_id]["finished"] = params.get("timestamp")
+                finished.append(request_id)
+            elif method == "Network.loadingFailed":
+                self._pending.pop(request_id, None)
+
+        for request_id in finished:
+            pending = self._pending.pop(request_id)
+            if "response" not in pending:
+                continue
+            try:
+                body = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+            except Exception as e:
+                logger.debug(f"No body for {pending['request']['url']}: {e}")
+                body = None
+            self._complete(pending, pending["response"], body)
+
+    def _complete(self, pending, response, body):
+        request = pending["request"]
+        url = request["url"]
+        if not url.startswith(("http://", "https://")):
+            return
+
+        content = {"size": 0, "mimeType": response.get("mimeType", "")}
+        if body is not None:
+            content["text"] = body["body"]
+            if body.get("base64Encoded"):
+                content["encoding"] = "base64"
+                content["size"] = len(base64.b64decode(body["body"]))
+            else:
+                content["size"] = len(body["body"].encode("utf-8"))
+
+        started = datetime.fromtimestamp(pending.get("wallTime") or time.time(), tz=timezone.utc)
+        elapsed = 0
+        if pending.get("finished") and pending.get("timestamp"):
+            elapsed = (pending["finished"] - pending["timestamp"]) * 1000
+        query = urlsplit(url).query
+        entry = {
+            "startedDateTime": started.isoformat(),
+            "time": elapsed,
+            "request": {
+                "method": request.get("method", "GET"),
+                "url": url,
+                "httpVersion": response.get("protocol", "HTTP/1.1"),
+                "headers": _headers_list(request.get("headers")),
+                "queryString": [{"name": name, "value": value} for name, _, value in
+                                (part.partition("=") for part in query.split("&") if part)],
+                "cookies": [],
+                "headersSize": -1,
+                "bodySize": len(request.get("postData", "")),
+            },
+            "response": {
+                "status": response.get("status", 200),
+                "statusText": response.get("statusText", ""),
+                "httpVersion": response.get("protocol", "HTTP/1.1"),
+                "headers": _headers_list(response.get("headers")),
+                "cookies": [],
+                "content": content,
+                "redirectURL": next((value for name, value in (response.get("headers") or {}).items()
+                                     if name.lower() == "location"), ""),
+                "headersSize": -1,
+                "bodySize": pending.get("encodedDataLength", -1),
+            },
+            "cache": {},
+            "timings": {"send": 0, "wait": elapsed, "receive": 0},
+        }
+        if "postData" in request:
+            entry["request"]["postData"] = {"mimeType": "", "text": request["postData"]}
+        # Keep the latest exchange per method and URL
+        self.entries[(entry["request"]["method"], url)] = entry
+
+    def save(self):
+        """Write this worker's archive to ``<archive_dir>/<worker>.har``."""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"{worker_id()}.har")
+        har = {
+            "log": {
+                "version": "1.2",
+                "creator": {"name": "tvqa", "version": "1.0"},
+                "entries": list(self.entries.values()),
+            }
+        }
+        with open(path, "w") as f:
+            json.dump(har, f)
+        logger.info(f"Recorded {len(self.entries)} HTTP exchanges to {path}")
+        return path
+
+
+class ReplayServer:
+    """Serves archived HAR responses from a local HTTP server."""
+
+    def __init__(self, archive_dir=ARCHIVE_DIR, latency_ms=0, bandwidth_kbps=None, host="127.0.0.1", port=0):
+        self.archive_dir = archive_dir
+        self.latency_ms = latency_ms
+        self.bandwidth_kbps = bandwidth_kbps
+        self.responses = {}
+        self.hosts = set()
+        self.misses = []
+        self._load()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def origin(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _load(self):
+        counts = {}
+        for path in sorted(glob.glob(os.path.join(self.archive_dir, "*.har"))):
+            with open(path) as f:
+                entries = json.load(f)["log"]["entries"]
+            for entry in entries:
+                request = entry["request"]
+                parts = urlsplit(request["url"])
+                self.hosts.add(parts.netloc)
+                counts[parts.netloc] = counts.get(parts.netloc, 0) + 1
+                self.responses[(request["method"], self._key(parts))] = entry["response"]
+        # The app's own host, for root-relative requests without a usable Referer
+        self.primary_host = max(counts, key=counts.get) if counts else None
+        hosts = "|".join(re.escape(host) for host in sorted(self.hosts, key=len, reverse=True))
+        self._host_pattern = re.compile(r"(?:https?:)?//(" + hosts + r")(?=[/\"'?#:]|$)") if hosts else None
+        logger.info(f"Loaded {len(self.responses)} archived responses for {len(self.hosts)} host(s)")
+
+    @staticmethod
+    def _key(parts):
+        return f"/{parts.netloc}{parts.path or '/'}" + (f"?{parts.query}" if parts.query else "")
+
+    def replay_url(self, url):
+        """Map a recorded URL to its address on this server."""
+        return self.origin + self._key(urlsplit(url))
+
+    def rewrite(self, text):
+        """Point absolute URLs of archived hosts at this server."""
+        if self._host_pattern is None:
+            return text
+        return self._host_pattern.sub(lambda match: f"{self.origin}/{match.group(1)}", text)
+
+    def lookup(self, method, path, referer=None):
+        """Return the archived response for a request path on this server.
+
+        Root-relative requests the app makes itself (``/production/...``) carry
+        no host; they are resolved against the host of the referring page, or
+        else the archive's primary host.
+        """
+        response = self._find(method, path)
+        if response is not None or path.split("/", 2)[1] in self.hosts:
+            return response
+        for host in (self._referer_host(referer), self.primary_host):
+            if host:
+                response = self._find(method, f"/{host}{path}")
+                if response is not None:
+                    return response
+        return None
+
+    def _referer_host(self, referer):
+        """Archived host of a referring page served by this server, or None."""
+        if not referer:
+            return None
+        parts = urlsplit(referer)
+        host = parts.path.split("/", 2)[1] if parts.path.startswith("/") else ""
+        if f"{parts.scheme}://{parts.netloc}" == self.origin and host in self.hosts:
+            return host
+        # A page that was not rewritten (e.g. a direct https:// referer)
+        return parts.netloc if parts.netloc in self.hosts else None
+
+    def _find(self, method, path):
+        response = self.responses.get((method, path))
+        if response is None and "?" in path:
+            # Cache-busting query strings change between runs; fall back to the bare path
+            bare = path.split("?", 1)[0]
+            response = next((value for (m, key), value in self.responses.items()
+                             if m == method and key.split("?", 1)[0] == bare), None)
+        return response
+
+    def body(self, response):
+        """Decoded (and, for text, rewritten) body of an archived response."""
+        content = response.get("content", {})
+        text = content.get("text", "")
+        if content.get("encoding") == "base64":
+            return base64.b64decode(text)
+        if any(kind in content.get("mimeType", "") for kind in TEXT_TYPES):
+            text = self.rewrite(text)
+        return text.encode("utf-8")
+
+    def _handler_class(self):
+        server = self
+
+        class ReplayHandler(BaseHTTPRequestHandler):
+            def _serve(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                response = server.lookup(self.command, self.path, self.headers.get("Referer"))
+                if server.latency_ms:
+                    time.sleep(server.latency_ms / 1000)
+                if response is None:
+                    server.misses.append(f"{self.command} {self.path}")
+                    logger.warning(f"Replay miss: {self.command} {self.path}")
+                    self.send_error(404, "Not in replay archive")
+                    return
+
+                body = server.body(response)
+                self.send_response(response["status"], response.get("statusText") or None)
+                for header in response["headers"]:
+                    name = header["name"].lower()
+                    if name in DROPPED_HEADERS:
+                        continue
+                    value = server.rewrite(header["value"]) if name == "location" else header["value"]
+                    # DevTools joins repeated headers (e.g. set-cookie) with newlines
+                    for line in value.split("\n"):
+                        self.send_header(header["name"], line)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self._write(body)
+
+            def _write(self, body):
+                if not server.bandwidth_kbps:
+                    self.wfile.write(body)
+                    return
+                # Throttle by writing 10 ms worth of data at a time
+                chunk = max(1, int(server.bandwidth_kbps * 1000 / 8 / 100))
+                for offset in range(0, len(body), chunk):
+                    self.wfile.write(body[offset:offset + chunk])
+                    time.sleep(0.01)
+
+            do_GET = do_POST = do_HEAD = do_OPTIONS = _serve
+
+            def log_message(self, format, *args):
+                logger.debug("replay: " + format % args)
+
+        return ReplayHandler
+
+    def start(self):
+        """Serve in a background thread."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="replay-server", daemon=True)
+        self._thread.start()
+        logger.info(f"Replay server listening on {self.origin}")
+        return self
+
+    def stop(self):
+        """Shut the server down."""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self.misses:
+            logger.warning(f"Replay server missed {len(self.misses)} request(s)")
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Responsive sweeps over several TV resolutions.
+Viewports are switched with the DevTools device-metrics override instead of
+resizing the OS window, so the app is not reloaded when it re-lays itself
+out on resize; it is only reloaded when its root did not follow the new
+viewport (apps that size themselves once at start-up). Resolutions can also
+be spread over several pooled browsers in parallel.
+"""
+
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from tvqa import phases
+from tvqa.readiness import APP_ROOT_SELECTOR
+
+logger = logging.getLogger(__name__)
+
+# TV resolutions checked by default
+RESOLUTIONS = [(1280, 720), (1920, 1080), (3840, 2160)]
+
+# How far (in CSS pixels) the app root may be from the viewport size and still count as following it
+TOLERANCE = 10
+
+LAYOUT_SCRIPT = """
+var root = document.querySelector(arguments[0]);
+var rect = root ? root.getBoundingClientRect() : null;
+var doc = document.documentElement;
+return {
+    inner_width: window.innerWidth,
+    inner_height: window.innerHeight,
+    device_pixel_ratio: window.devicePixelRatio,
+    scroll_width: doc.scrollWidth,
+    scroll_height: doc.scrollHeight,
+    horizontal_overflow: doc.scrollWidth > window.innerWidth,
+    root_width: rect ? rect.width : null,
+    root_height: rect ? rect.height : null,
+    element_count: document.getElementsByTagName('*').length
+};
+"""
+
+
+def set_viewport(driver, width, height):
+    """Emulate a ``width`` x ``height`` viewport without touching the OS window."""
+    driver.execute_cdp_cmd("Emulation.setDeviceMetricsOverride", {
+        "width": width, "height": height, "deviceScaleFactor": 1, "mobile": False,
+    })
+
+
+def clear_viewport(driver):
+    driver.execute_cdp_cmd("Emulation.clearDeviceMetricsOverride", {})
+
+
+def follows_viewport(layout, width, height):
+    """True when the app root (or, without one, the page) was laid out for the viewport."""
+    root_width = layout["root_width"] if layout["root_width"] is not None else layout["inner_width"]
+    return abs(root_width - width) <= TOLERANCE and abs(layout["inner_height"] - height) <= TOLERANCE
+
+
+class ResponsiveSweep:
+    """Captures layout metrics and a screenshot of the app at several resolutions."""
+
+    def __init__(self, screenshot_service, app_ready, browser_pool=None, parallel=False,
+                 root_selector=APP_ROOT_SELECTOR):
+        self.screenshots = screenshot_service
+        self.app_ready = app_ready
+        # With ``parallel`` set, sweep() spreads resolutions over the pool's browsers
+        self.browser_pool = browser_pool
+        self.parallel = parallel
+        self.root_selector = root_selector
+        self.sweeps = []
+
+    def _capture(self, driver, width, height, platform, name, reload, test):
+        start_time = time.time()
+        set_viewport(driver, width, height)
+        self.app_ready.wait(driver, raise_on_timeout=False)
+        layout = driver.execute_script(LAYOUT_SCRIPT, self.root_selector)
+
+        reloaded = False
+        if reload is True or (reload == "auto" and not follows_viewport(layout, width, height)):
+            # The override survives the reload, so the app starts at the new size
+            driver.refresh()
+            self.app_ready.wait(driver, raise_on_timeout=False)
+            layout = driver.execute_script(LAYOUT_SCRIPT, self.root_selector)
+            reloaded = True
+
+        screenshot = self.screenshots.capture(driver, f"{platform}_{name}_{width}x{height}",
+                                              test=test, platform=platform)
+        return {
+            "width": width,
+            "height": height,
+            "layout": layout,
+            "reloaded": reloaded,
+            "screenshot": screenshot,
+            "elapsed": time.time() - start_time,
+        }
+
+    def sweep(self, driver, platform, resolutions=RESOLUTIONS, url=None, user_agent=None,
+              name="responsive", reload="auto", test=None):
+        """Capture every resolution, in parallel browsers when enabled and ``url`` is given.
+
+        Returns ``{platform, resolutions, parallel, elapsed}`` where every
+        resolution carries its layout metrics and stored screenshot.
+        """
+        # The calling test holds one pooled browser already; the others take the resolutions
+        if self.parallel and self.browser_pool is not None and self.browser_pool.size > 1 and url:
+            return self.sweep_parallel(self.browser_pool, url, platform, resolutions, user_agent=user_agent,
+                                       name=name, test=test, max_workers=self.browser_pool.size - 1)
+        return self.sweep_in_place(driver, platform, resolutions, name=name, reload=reload, test=test)
+
+    def sweep_in_place(self, driver, platform, resolutions=RESOLUTIONS, name="responsive", reload="auto",
+                       test=None):
+        """Visit every resolution in ``driver``'s current page.
+
+        ``reload`` is "auto" (reload only when the app did not follow the new
+        viewport), True or False.
+        """
+        start_time = time.time()
+        try:
+            results = [self._capture(driver, width, height, platform, name, reload, test)
+                       for width, height in resolutions]
+        finally:
+            clear_viewport(driver)
+        return self._finish(platform, results, start_time, parallel=1)
+
+    def sweep_parallel(self, browser_pool, url, platform, resolutions=RESOLUTIONS, user_agent=None,
+                       name="responsive", test=None, max_workers=None):
+        """Like sweep(), but every resolution loads ``url`` in its own pooled browser, concurrently."""
+        start_time = time.time()
+        max_workers = min(max_workers or browser_pool.size, len(resolutions))
+
+        def visit(resolution):
+            width, height = resolution
+            with browser_pool.lease(user_agent=user_agent) as driver:
+                # Start at the target size so the app never needs a second load
+                set_viewport(driver, width, height)
+                try:
+                    driver.get(url)
+                    return self._capture(driver, width, height, platform, name, "auto", test)
+                finally:
+                    clear_viewport(driver)
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="responsive") as executor:
+            results = list(executor.map(visit, resolutions))
+        return self._finish(platform, results, start_time, parallel=max_workers)
+
+    def _finish(self, platform, results, start_time, parallel):
+        # Screenshots were encoded and written while the sweep went on
+        with phases.span("screenshot"):
+            for result in results:
+                result["screenshot"] = result["screenshot"].result()
+        sweep = {
+            "platform": platform,
+            "resolutions": results,
+            "parallel": parallel,
+            "elapsed": time.time() - start_time,
+        }
+        self.sweeps.append(sweep)
+        logger.info(f"Responsive sweep of {platform}: {len(results)} resolution(s) in {sweep['elapsed']:.2f}s, "
+                    f"{sum(result['reloaded'] for result in results)} reload(s)")
+        return sweep
+
+    def stats(self):
+        return [
+            {"platform": sweep["platform"], "resolutions": len(sweep["resolutions"]),
+             "reloads": sum(result["reloaded"] for result in sweep["resolutions"]),
+             "parallel": sweep["parallel"], "elapsed": sweep["elapsed"]}
+            for sweep in self.sweeps
+        ]
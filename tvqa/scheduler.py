@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Duration-aware test scheduling for run_tests.py.
+Per-test durations from previous runs are kept in a small JSON store. Tests are
+grouped by platform suite/class (so a worker keeps reusing its warm browser for
+a whole group) and the groups are packed onto workers longest-first.
+"""
+
+import os
+import json
+import heapq
+import logging
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+DURATIONS_PATH = "artifacts/test_durations.json"
+# Weight of the newest sample when smoothing stored durations
+SMOOTHING = 0.5
+# Assumed duration of a test that has never run before
+DEFAULT_DURATION = 10.0
+
+
+def load_durations(path=DURATIONS_PATH):
+    """Return ``{nodeid: seconds}`` from the duration store (empty if missing)."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def update_durations(new_durations, path=DURATIONS_PATH):
+    """Merge freshly measured durations into the store, smoothing old values."""
+    durations = load_durations(path)
+    for nodeid, seconds in new_durations.items():
+        previous = durations.get(nodeid)
+        durations[nodeid] = seconds if previous is None else (
+            SMOOTHING * seconds + (1 - SMOOTHING) * previous
+        )
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(durations, f, indent=2, sort_keys=True)
+    return durations
+
+
+def collect_test_ids(paths, run_id=None):
+    """Ask pytest which tests ``paths`` contain, in collection order.
+
+    The collection runs under ``run_id`` (the run the tests will be part of)
+    and never applies the artifact retention policy.
+    """
+    # pytest.ini's addopts (-v) would cancel -q and print a tree instead of node ids
+    env = dict(os.environ, TVQA_RUN_ID=run_id) if run_id else None
+    result = subprocess.run(
+        ["python", "-m", "pytest", "--collect-only", "-q", "-o", "addopts=", "-o", "log_cli=false",
+         "--no-retention", *paths],
+        capture_output=True, text=True, env=env
+    )
+    return [line.strip() for line in result.stdout.splitlines() if "::" in line]
+
+
+def group_key(nodeid):
+    """Tests of the same class, or module-level tests of the same file, share a browser."""
+    parts = nodeid.split("::")
+    if len(parts) > 2:
+        return "::".join(parts[:2])
+    return parts[0]
+
+
+def expected_duration(nodeid, durations):
+    """Stored duration of a test, or the median of known tests for new ones."""
+    if nodeid in durations:
+        return durations[nodeid]
+    known = sorted(durations.values())
+    return known[len(known) // 2] if known else DEFAULT_DURATION
+
+
+def plan(test_ids, durations, workers):
+    """Pack test groups onto ``workers`` bins, longest group first (LPT).
+
+    Returns a list of bins, each ``{"tests": [...], "expected": seconds}``,
+    with the groups inside a bin also ordered longest-first.
+    """
+    groups = {}
+    for nodeid in test_ids:
+        groups.setdefault(group_key(nodeid), []).append(nodeid)
+
+    weighted = sorted(
+        ((sum(expected_duration(nodeid, durations) for nodeid in tests), key, tests)
+         for key, tests in groups.items()),
+        reverse=True
+    )
+
+    bins = [{"tests": [], "expected": 0.0} for _ in range(max(1, min(workers, len(weighted))))]
+    heap = [(0.0, index) for index in range(len(bins))]
+    for seconds, key, tests in weighted:
+        load, index = heapq.heappop(heap)
+        bins[index]["tests"].extend(tests)
+        bins[index]["expected"] += seconds
+        heapq.heappush(heap, (load + seconds, index))
+        logger.debug(f"Scheduled {key} ({seconds:.1f}s) on worker {index}")
+    return bins
+
+
+def makespan(bins):
+    """Expected wall time of a plan: the load of its busiest worker."""
+    return max((entry["expected"] for entry in bins), default=0.0)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Asynchronous, content-addressed screenshot writer.
+The test thread only asks Chrome for the frame over the DevTools protocol;
+decoding, hashing and writing happen on a background thread. Images are
+stored once per content hash under ``objects/`` and every capture adds a
+name -> hash line to the worker's manifest, so the many identical frames a
+run produces (the same page at the same size) cost a single file.
+"""
+
+import os
+import json
+import time
+import base64
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from tvqa import phases
+from tvqa.workers import worker_id
+
+logger = logging.getLogger(__name__)
+
+SCREENSHOTS_DIR = "artifacts/screenshots"
+
+_SERVICE_KEY = pytest.StashKey()
+
+
+class ScreenshotService:
+    """Captures screenshots on the calling thread and stores them in the background."""
+
+    def __init__(self, root=SCREENSHOTS_DIR, listeners=()):
+        self.root = root
+        # Callables receiving every stored entry, e.g. the artifact index
+        self.listeners = list(listeners)
+        self.objects_dir = os.path.join(root, "objects")
+        self.manifest_path = os.path.join(root, f"manifest-{worker_id()}.jsonl")
+        self._executor = None
+        self._lock = threading.Lock()
+        self.captures = 0
+        self.duplicates = 0
+        self.bytes_written = 0
+        self.bytes_saved = 0
+        self.capture_time = 0.0
+        self.background_time = 0.0
+
+    def start(self):
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="screenshots")
+        return self
+
+    @phases.span("screenshot")
+    def capture(self, driver, name, test=None, platform=None, kind="screenshot"):
+        """Grab the current frame and queue it for storage.
+
+        Returns a future resolving to the manifest entry
+        ``{name, kind, hash, path, bytes, duplicate, ...}``.
+        """
+        start_time = time.time()
+        data = driver.execute_cdp_cmd("Page.captureScreenshot", {"format": "png"})["data"]
+        elapsed = time.time() - start_time
+        with self._lock:
+            self.captures += 1
+            self.capture_time += elapsed
+        entry = {
+            "name": name,
+            "kind": kind,
+            "test": test,
+            "platform": platform,
+            "timestamp": time.time(),
+            "capture_time": elapsed,
+        }
+        return self._executor.submit(self._store, data, entry)
+
+    def _store(self, data, entry):
+        start_time = time.time()
+        png = base64.b64decode(data)
+        digest = hashlib.sha256(png).hexdigest()
+        path = self.object_path(digest)
+        duplicate = os.path.exists(path)
+        if not duplicate:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write under a temporary name so other workers never see a partial image
+            temporary = f"{path}.{worker_id()}.tmp"
+            with open(temporary, "wb") as f:
+                f.write(png)
+            os.replace(temporary, path)
+
+        entry.update(hash=digest, path=path, bytes=len(png), duplicate=duplicate)
+        with open(self.manifest_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+        with self._lock:
+            if duplicate:
+                self.duplicates += 1
+                self.bytes_saved += len(png)
+            else:
+                self.bytes_written += len(png)
+            self.background_time += time.time() - start_time
+        for listener in self.listeners:
+            listener(entry)
+        logger.info(f"Screenshot {entry['name']} -> {path}{' (duplicate)' if duplicate else ''}")
+        return entry
+
+    def object_path(self, digest):
+        """Where the image with content hash ``digest`` is stored."""
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}.png")
+
+    def flush(self):
+        """Wait until every queued screenshot is on disk."""
+        if self._executor is not None:
+            # A no-op task completes only after everything queued before it
+            self._executor.submit(lambda: None).result()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self):
+        return {
+            "captures": self.captures,
+            "duplicates": self.duplicates,
+            "bytes_written": self.bytes_written,
+            "bytes_saved": self.bytes_saved,
+            "capture_time": self.capture_time,
+            "background_time": self.background_time,
+        }
+
+
+def install(config, root=SCREENSHOTS_DIR, listeners=()):
+    """Start the session's screenshot service (call from pytest_configure)."""
+    config.stash[_SERVICE_KEY] = ScreenshotService(root, listeners).start()
+    return config.stash[_SERVICE_KEY]
+
+
+def service(config):
+    """The screenshot service started by :func:`install`."""
+    return config.stash[_SERVICE_KEY]
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Soak runs with JS heap and DOM-node leak detection.
+A navigation loop is repeated for a fixed duration or number of iterations,
+and after every few iterations the page is garbage collected and sampled over
+the DevTools protocol: JS heap, DOM nodes, event listeners and detached DOM
+nodes. A straight line is fitted through every series; a metric leaks when it
+grows (almost) monotonically and the fitted growth over the run exceeds its
+threshold. Heap snapshots are written at the start and end for diffing in
+DevTools' Memory panel.
+"""
+
+import os
+import math
+import time
+import logging
+
+import trio
+
+from tvqa import cdp
+
+logger = logging.getLogger(__name__)
+
+# Length of a soak run when no duration is given
+ITERATIONS = 50
+
+# Largest growth of a metric over a soak run that is not treated as a leak
+THRESHOLDS = {
+    "js_heap_used": 10 * 1024 ** 2,
+    "nodes": 1000,
+    "listeners": 250,
+    "detached_nodes": 200,
+}
+
+# Share of consecutive samples that must not decrease for growth to count as monotonic
+MONOTONIC_RATIO = 0.8
+
+OBJECT_GROUP = "tvqa-soak"
+
+DETACHED_NODES_FUNCTION = """
+function () {
+    var detached = 0;
+    for (var i = 0; i < this.length; i++) {
+        // The query also returns Node's derived prototypes, which throw on isConnected
+        try { if (!this[i].isConnected) { detached++; } } catch (e) {}
+    }
+    return detached;
+}
+"""
+
+
+def count_detached_nodes(driver):
+    """Number of DOM nodes on the JS heap that are no longer in a document."""
+    try:
+        prototype = driver.execute_cdp_cmd("Runtime.evaluate", {
+            "expression": "Node.prototype", "objectGroup": OBJECT_GROUP,
+        })["result"]
+        nodes = driver.execute_cdp_cmd("Runtime.queryObjects", {
+            "prototypeObjectId": prototype["objectId"], "objectGroup": OBJECT_GROUP,
+        })["objects"]
+        return driver.execute_cdp_cmd("Runtime.callFunctionOn", {
+            "objectId": nodes["objectId"], "functionDeclaration": DETACHED_NODES_FUNCTION, "returnByValue": True,
+        })["result"]["value"]
+    finally:
+        driver.execute_cdp_cmd("Runtime.releaseObjectGroup", {"objectGroup": OBJECT_GROUP})
+
+
+def sample_memory(driver):
+    """Collect garbage, then read heap size, DOM counters and detached nodes."""
+    driver.execute_cdp_cmd("HeapProfiler.collectGarbage", {})
+    metrics = {metric["name"]: metric["value"]
+               for metric in driver.execute_cdp_cmd("Performance.getMetrics", {})["metrics"]}
+    counters = driver.execute_cdp_cmd("Memory.getDOMCounters", {})
+    return {
+        "js_heap_used": metrics.get("JSHeapUsedSize"),
+        "js_heap_total": metrics.get("JSHeapTotalSize"),
+        "documents": counters["documents"],
+        "nodes": counters["nodes"],
+        "listeners": counters["jsEventListeners"],
+        "detached_nodes": count_detached_nodes(driver),
+    }
+
+
+def fit_trend(xs, ys):
+    """Least-squares line through ``(xs, ys)``: ``{slope, growth, r2, monotonic}``.
+
+    ``growth`` is the fitted change over the whole series and ``monotonic``
+    the share of consecutive steps that did not decrease.
+    """
+    n = len(xs)
+    mean_x, mean_y = sum(xs) / n, sum(ys) / n
+    sxx = sum((x - mean_x) ** 2 for x in xs)
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    syy = sum((y - mean_y) ** 2 for y in ys)
+    slope = sxy / sxx if sxx else 0.0
+    steps = [after >= before for before, after in zip(ys, ys[1:])]
+    return {
+        "slope": slope,
+        "growth": slope * (xs[-1] - xs[0]),
+        "r2": sxy ** 2 / (sxx * syy) if sxx and syy else 0.0,
+        "monotonic": sum(steps) / len(steps) if steps else 0.0,
+    }
+
+
+async def _write_heap_snapshot(session, devtools, path):
+    chunks = session.listen(devtools.heap_profiler.AddHeapSnapshotChunk, buffer_size=math.inf)
+    with open(path, "w") as f:
+        async with trio.open_nursery() as nursery:
+            async def write():
+                async for event in chunks:
+                    f.write(event.chunk)
+
+            nursery.start_soon(write)
+            await session.execute(devtools.heap_profiler.take_heap_snapshot(report_progress=False))
+            nursery.cancel_scope.cancel()
+        # Chunks received just before the command's response
+        while True:
+            try:
+                f.write(chunks.receive_nowait().chunk)
+            except trio.WouldBlock:
+                break
+
+
+def write_heap_snapshot(driver, path):
+    """Stream a heap snapshot of ``driver``'s page to ``path`` (a .heapsnapshot file)."""
+    start_time = time.time()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    cdp.run_session(driver, _write_heap_snapshot, path)
+    logger.info(f"Heap snapshot {path} ({os.path.getsize(path) / 1e6:.1f} MB) "
+                f"written in {time.time() - start_time:.1f}s")
+    return path
+
+
+class SoakRun:
+    """Repeats a navigation loop and watches the page's memory for leaks."""
+
+    def __init__(self, driver, platform, step, duration=None, iterations=ITERATIONS, sample_every=1,
+                 thresholds=THRESHOLDS, snapshots_dir=None):
+        self.driver = driver
+        self.platform = platform
+        # Callable running one iteration of the navigation loop, given the iteration number
+        self.step = step
+        # Seconds to soak for; without it, ``iterations`` loops are run
+        self.duration = duration
+        self.iterations = iterations
+        self.sample_every = sample_every
+        self.thresholds = thresholds
+        self.snapshots_dir = snapshots_dir
+
+    def _snapshot(self, label):
+        if not self.snapshots_dir:
+            return None
+        return write_heap_snapshot(self.driver, os.path.join(
+            self.snapshots_dir, f"{self.platform}-{int(time.time())}-{label}.heapsnapshot"))
+
+    def _done(self, iteration, start_time):
+        if self.duration is not None:
+            return time.time() - start_time >= self.duration
+        return iteration >= self.iterations
+
+    def run(self, test=None):
+        """Soak the page and return ``{platform, iterations, samples, trends, leaks, snapshots, ...}``."""
+        self.driver.execute_cdp_cmd("Performance.enable", {})
+        self.driver.execute_cdp_cmd("HeapProfiler.enable", {})
+        # The first loop fills caches and lazily created views; it is not part of the trend
+        self.step(0)
+        snapshots = [self._snapshot("start")]
+        samples = [dict(sample_memory(self.driver), iteration=0, elapsed=0.0)]
+
+        start_time = time.time()
+        iteration = 0
+        while not self._done(iteration, start_time):
+            iteration += 1
+            self.step(iteration)
+            if iteration % self.sample_every == 0:
+                samples.append(dict(sample_memory(self.driver), iteration=iteration,
+                                    elapsed=time.time() - start_time))
+        if samples[-1]["iteration"] != iteration:
+            samples.append(dict(sample_memory(self.driver), iteration=iteration, elapsed=time.time() - start_time))
+        snapshots.append(self._snapshot("end"))
+
+        trends, leaks = {}, []
+        iterations = [sample["iteration"] for sample in samples]
+        for metric, threshold in self.thresholds.items():
+            values = [sample[metric] for sample in samples]
+            if len(samples) < 2 or any(value is None for value in values):
+                continue
+            trend = fit_trend(iterations, values)
+            trend.update(start=values[0], end=values[-1], threshold=threshold)
+            trends[metric] = trend
+            if trend["growth"] > threshold and trend["monotonic"] >= MONOTONIC_RATIO:
+                leaks.append(metric)
+
+        result = {
+            "platform": self.platform,
+            "test": test,
+            "iterations": iteration,
+            "elapsed": time.time() - start_time,
+            "samples": samples,
+            "trends": trends,
+            "leaks": leaks,
+            "snapshots": [path for path in snapshots if path],
+        }
+        logger.info(f"Soak of {self.platform}: {iteration} iteration(s) in {result['elapsed']:.0f}s, "
+                    f"leaking: {', '.join(leaks) or 'nothing'}")
+        return result
+
+
+def format_leak(result, metric):
+    """One-line description of ``metric``'s trend in a soak result."""
+    trend = result["trends"][metric]
+    scale, unit, digits = (1024 ** 2, " MB", 1) if metric == "js_heap_used" else (1, "", 0)
+    return (f"{metric} {trend['start'] / scale:.{digits}f}{unit} -> {trend['end'] / scale:.{digits}f}{unit} "
+            f"(fitted growth {trend['growth'] / scale:+.{digits}f}{unit}, limit {trend['threshold'] / scale:.0f}{unit}, "
+            f"{trend['monotonic']:.0%} non-decreasing)")
+
+
+def summary_table(results):
+    """Start, end and fitted growth of every sampled metric per soak run."""
+    lines = []
+    for result in results:
+        lines.append(f"{result['platform']} ({result['test']}): {result['iterations']} iteration(s) in "
+                     f"{result['elapsed'] / 60:.1f} min, {len(result['leaks'])} leak(s)")
+        for metric in sorted(result["trends"]):
+            lines.append(f"  {'LEAK ' if metric in result['leaks'] else '     '}{format_leak(result, metric)}")
+    return lines
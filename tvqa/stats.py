@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Summary statistics of repeated measurements.
+Shared by the load benchmark, the harness benchmark and the remote-control
+latency summary.
+"""
+
+import math
+
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(values, pct):
+    """Percentile of ``values`` with linear interpolation between closest ranks."""
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    position = (len(ordered) - 1) * pct / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def describe(values):
+    """min, percentiles and coefficient of variation of a sample."""
+    mean = sum(values) / len(values)
+    variance = sum((value - mean) ** 2 for value in values) / (len(values) - 1) if len(values) > 1 else 0.0
+    stats = {"n": len(values), "min": min(values), "mean": mean}
+    for pct in PERCENTILES:
+        stats[f"p{pct}"] = percentile(values, pct)
+    stats["cv"] = math.sqrt(variance) / mean if mean else 0.0
+    return stats
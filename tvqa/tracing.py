@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Per-test Chrome performance traces.
+A trace is recorded through the DevTools Tracing domain on a separate
+DevTools session while the test runs. Chrome hands the finished trace over
+as a stream that is copied to disk chunk by chunk, and the summary is
+computed by parsing the file incrementally, so a trace is never held in
+memory as a whole. The summary splits main-thread time into scripting,
+style/layout, paint, GC and other work, and lists the long tasks by the
+script URL they spent their time in.
+"""
+
+import os
+import json
+import base64
+import logging
+import threading
+
+import trio
+
+from tvqa import cdp
+
+logger = logging.getLogger(__name__)
+
+# Categories of the DevTools Performance panel, without the screenshot and sampling overhead
+TRACE_CATEGORIES = [
+    "devtools.timeline",
+    "disabled-by-default-devtools.timeline",
+    "disabled-by-default-devtools.timeline.frame",
+    "toplevel",
+    "v8",
+    "v8.execute",
+    "blink.user_timing",
+    "loading",
+]
+
+# Main-thread events and the work they stand for; nested events of other names inherit their parent's
+EVENT_GROUPS = {
+    "scripting": ("EvaluateScript", "v8.evaluateModule", "v8.compile", "v8.compileModule", "v8.produceCache",
+                  "FunctionCall", "TimerFire", "EventDispatch", "FireAnimationFrame", "FireIdleCallback",
+                  "XHRReadyStateChange", "XHRLoad", "RunMicrotasks", "V8.Execute"),
+    "style_layout": ("UpdateLayoutTree", "RecalculateStyles", "Layout", "UpdateLayerTree",
+                     "ParseAuthorStyleSheet", "HitTest"),
+    "paint": ("Paint", "PaintImage", "PrePaint", "Layerize", "CompositeLayers", "Decode Image", "Commit"),
+    "gc": ("MinorGC", "MajorGC", "V8.GCScavenger", "V8.GCCompactor", "V8.GCFinalizeMC",
+           "V8.GCIncrementalMarking", "V8.GCIncrementalMarkingFinalize", "BlinkGC.AtomicPhase",
+           "ThreadState::performIdleLazySweep"),
+}
+GROUP_OF = {name: group for group, names in EVENT_GROUPS.items() for name in names}
+GROUPS = tuple(EVENT_GROUPS) + ("other",)
+
+# Events carrying the URL of the script they run
+SCRIPT_EVENTS = ("EvaluateScript", "v8.evaluateModule", "v8.compile", "v8.compileModule", "FunctionCall")
+
+LONG_TASK_MS = 50
+TOP_LONG_TASKS = 10
+
+# Bytes per IO.read and per parsed chunk of a trace file
+CHUNK_SIZE = 1024 ** 2
+
+
+class TraceEventParser:
+    """Incremental parser of Chrome's JSON trace format ``{"traceEvents": [...], ...}``."""
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._in_array = False
+        self._done = False
+
+    def feed(self, text):
+        """Add the next piece of the trace and return the events completed by it."""
+        if self._done:
+            return []
+        self._buffer += text
+        events = []
+        if not self._in_array:
+            start = self._buffer.find("[")
+            if start < 0:
+                return events
+            self._buffer = self._buffer[start + 1:]
+            self._in_array = True
+        position = 0
+        while True:
+            while position < len(self._buffer) and self._buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(self._buffer) and self._buffer[position] == "]":
+                self._done = True
+                break
+            try:
+                event, position = self._decoder.raw_decode(self._buffer, position)
+            except ValueError:
+                # The event continues in the next piece
+                break
+            events.append(event)
+        self._buffer = self._buffer[position:]
+        return events
+
+
+def read_trace(path, chunk_size=CHUNK_SIZE):
+    """Yield the events of the trace file at ``path`` without loading it as a whole."""
+    parser = TraceEventParser()
+    with open(path, encoding="utf-8") as f:
+        for text in iter(lambda: f.read(chunk_size), ""):
+            yield from parser.feed(text)
+
+
+def _script_url(event):
+    args = event.get("args") or {}
+    return (args.get("data") or {}).get("url") or args.get("fileName") or ""
+
+
+def _thread_breakdown(events):
+    """Self time per group and the long tasks of one thread's complete events ``(ts, dur, name, url)``."""
+    times = dict.fromkeys(GROUPS, 0.0)
+    long_tasks = []
+    # Entries: [end, group, task, own-duration-left]
+    stack = []
+    task = None
+    for ts, dur, name, url in sorted(events, key=lambda event: (event[0], -event[1])):
+        while stack and stack[-1][0] <= ts:
+            _, group, _, self_time = stack.pop()
+            times[group] += max(self_time, 0)
+        if stack:
+            stack[-1][3] -= dur
+            group = GROUP_OF.get(name, stack[-1][1])
+            task = stack[-1][2]
+        else:
+            group = GROUP_OF.get(name, "other")
+            task = {"duration": dur / 1000, "scripts": {}}
+            if dur / 1000 >= LONG_TASK_MS:
+                long_tasks.append(task)
+        if url and name in SCRIPT_EVENTS:
+            task["scripts"][url] = task["scripts"].get(url, 0.0) + dur / 1000
+        stack.append([ts + dur, group, task, dur])
+    for _, group, _, self_time in stack:
+        times[group] += max(self_time, 0)
+    return {group: time / 1000 for group, time in times.items()}, long_tasks
+
+
+def summarise(path):
+    """Main-thread time per group (ms) and the long tasks by script URL of the trace at ``path``.
+
+    Returns ``{main_thread: {group: ms}, main_thread_total, long_tasks: [{url, count, total, max}],
+    events}`` with long tasks sorted by their total duration.
+    """
+    threads = {}
+    main_threads = set()
+    count = 0
+    for event in read_trace(path):
+        count += 1
+        key = (event.get("pid"), event.get("tid"))
+        if event.get("ph") == "M" and event.get("name") == "thread_name":
+            if (event.get("args") or {}).get("name") == "CrRendererMain":
+                main_threads.add(key)
+        elif event.get("ph") == "X" and "dur" in event:
+            threads.setdefault(key, []).append((event["ts"], event["dur"], event.get("name", ""),
+                                                _script_url(event)))
+
+    breakdown = dict.fromkeys(GROUPS, 0.0)
+    by_url = {}
+    for key in main_threads:
+        times, long_tasks = _thread_breakdown(threads.get(key, []))
+        for group, time in times.items():
+            breakdown[group] += time
+        for task in long_tasks:
+            # A long task is blamed on the script it spent the most time in
+            url = max(task["scripts"], key=task["scripts"].get) if task["scripts"] else "(no script)"
+            entry = by_url.setdefault(url, {"url": url, "count": 0, "total": 0.0, "max": 0.0})
+            entry["count"] += 1
+            entry["total"] += task["duration"]
+            entry["max"] = max(entry["max"], task["duration"])
+
+    return {
+        "main_thread": breakdown,
+        "main_thread_total": sum(breakdown.values()),
+        "long_tasks": sorted(by_url.values(), key=lambda entry: -entry["total"])[:TOP_LONG_TASKS],
+        "events": count,
+    }
+
+
+async def _record(session, devtools, path, categories, started, stop):
+    await session.execute(devtools.tracing.start(
+        transfer_mode="ReturnAsStream",
+        stream_format=devtools.tracing.StreamFormat.JSON,
+        trace_config=devtools.tracing.TraceConfig(included_categories=categories),
+    ))
+    started.set()
+    while not stop.is_set():
+        await trio.sleep(0.05)
+
+    async with session.wait_for(devtools.tracing.TracingComplete) as complete:
+        await session.execute(devtools.tracing.end())
+    handle = complete.value.stream
+    if complete.value.data_loss_occurred:
+        logger.warning(f"Chrome lost part of the trace {path} (trace buffer full)")
+    # Written as bytes: a base64 chunk can end in the middle of a UTF-8 sequence
+    with open(path, "wb") as f:
+        while True:
+            base64_encoded, data, eof = await session.execute(devtools.io.read(handle, size=CHUNK_SIZE))
+            f.write(base64.b64decode(data) if base64_encoded else data.encode("utf-8"))
+            if eof:
+                break
+    await session.execute(devtools.io.close(handle))
+
+
+class TraceRecorder:
+    """Records a Chrome trace of ``driver``'s page between start() and stop()."""
+
+    def __init__(self, driver, path, categories=TRACE_CATEGORIES, start_timeout=10):
+        self.driver = driver
+        self.path = path
+        self.categories = list(categories)
+        self.start_timeout = start_timeout
+        self.error = None
+        self._started = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        try:
+            cdp.run_session(self.driver, _record, self.path, self.categories, self._started, self._stop)
+        except Exception as e:
+            self.error = e
+            self._started.set()
+
+    def start(self):
+        """Start tracing; returns once Chrome records."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # The DevTools session lives on its own thread for as long as the trace runs
+        self._thread = threading.Thread(target=self._run, name="trace", daemon=True)
+        self._thread.start()
+        if not self._started.wait(self.start_timeout):
+            self._stop.set()
+            raise TimeoutError(f"Tracing did not start within {self.start_timeout}s")
+        if self.error is not None:
+            raise self.error
+        return self
+
+    def stop(self):
+        """Stop tracing and return the path of the trace written to disk."""
+        self._stop.set()
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+        logger.info(f"Trace {self.path} ({os.path.getsize(self.path) / 1e6:.1f} MB) written")
+        return self.path
+
+
+def format_summary(summary):
+    """One-line main-thread breakdown of a trace summary."""
+    total = summary["main_thread_total"]
+    parts = [f"{group.replace('_', '/')} {summary['main_thread'][group]:.0f}" for group in GROUPS]
+    return f"main thread {total:.0f} ms: " + ", ".join(parts)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Visual regression checks against per-platform, per-resolution baselines.
+Both images are cut into tiles; tiles whose content hash matches the
+baseline are skipped, and only the changed ones are compared pixel by pixel
+and with a per-tile SSIM on luminance, all vectorised with NumPy. A
+mismatch produces a highlighted diff image for the report.
+"""
+
+import os
+import time
+import shutil
+import hashlib
+import logging
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+BASELINES_DIR = "baselines"
+DIFFS_DIR = "artifacts/visual_diffs"
+TILE_SIZE = 64
+
+# A pixel counts as changed when a channel differs by more than this
+PIXEL_THRESHOLD = 16
+# A capture matches when at most this fraction of pixels changed and the SSIM stays above MIN_SSIM
+MAX_CHANGED_RATIO = 0.001
+MIN_SSIM = 0.98
+
+# SSIM stabilising constants for 8-bit images
+_C1 = (0.01 * 255) ** 2
+_C2 = (0.03 * 255) ** 2
+
+
+def load_image(path):
+    """RGB image as a (height, width, 3) uint8 array."""
+    with Image.open(path) as image:
+        return np.asarray(image.convert("RGB"))
+
+
+def to_tiles(pixels, tile_size=TILE_SIZE):
+    """Cut an image into a (rows, columns, tile, tile, channels) array, padding the edges with zeros."""
+    height, width, channels = pixels.shape
+    rows, columns = -(-height // tile_size), -(-width // tile_size)
+    padded = np.zeros((rows * tile_size, columns * tile_size, channels), dtype=pixels.dtype)
+    padded[:height, :width] = pixels
+    return padded.reshape(rows, tile_size, columns, tile_size, channels).swapaxes(1, 2)
+
+
+def tile_hashes(tiles):
+    """One 64-bit content hash per tile, as a (rows, columns) array of bytes objects."""
+    rows, columns = tiles.shape[:2]
+    flat = np.ascontiguousarray(tiles).reshape(rows * columns, -1)
+    hashes = np.array([hashlib.blake2b(tile.tobytes(), digest_size=8).digest() for tile in flat], dtype=object)
+    return hashes.reshape(rows, columns)
+
+
+def tile_ssim(baseline_tiles, current_tiles):
+    """Structural similarity of each pair of (n, tile, tile, 3) tiles, computed on luminance."""
+    weights = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    x = baseline_tiles.astype(np.float32) @ weights
+    y = current_tiles.astype(np.float32) @ weights
+    axes = (1, 2)
+    mean_x, mean_y = x.mean(axis=axes), y.mean(axis=axes)
+    var_x, var_y = x.var(axis=axes), y.var(axis=axes)
+    covariance = ((x - mean_x[:, None, None]) * (y - mean_y[:, None, None])).mean(axis=axes)
+    return ((2 * mean_x * mean_y + _C1) * (2 * covariance + _C2) /
+            ((mean_x ** 2 + mean_y ** 2 + _C1) * (var_x + var_y + _C2)))
+
+
+def highlight(current, changed_mask, changed_tiles, tile_size=TILE_SIZE):
+    """The current image dimmed, with changed pixels in red and changed tiles outlined."""
+    image = (current.astype(np.float32) * 0.4).astype(np.uint8)
+    image[changed_mask] = (255, 0, 0)
+    height, width = current.shape[:2]
+    for row, column in zip(*np.nonzero(changed_tiles)):
+        top, left = row * tile_size, column * tile_size
+        bottom, right = min(top + tile_size, height) - 1, min(left + tile_size, width) - 1
+        image[top, left:right + 1] = image[bottom, left:right + 1] = (255, 255, 0)
+        image[top:bottom + 1, left] = image[top:bottom + 1, right] = (255, 255, 0)
+    return image
+
+
+class VisualDiff:
+    """Compares captures with stored baselines and keeps the results per test."""
+
+    def __init__(self, baselines_dir=BASELINES_DIR, diffs_dir=DIFFS_DIR, update=False, fail_on_mismatch=False,
+                 tile_size=TILE_SIZE, max_changed_ratio=MAX_CHANGED_RATIO, min_ssim=MIN_SSIM):
+        self.baselines_dir = baselines_dir
+        self.diffs_dir = diffs_dir
+        # Replace baselines with the new captures instead of comparing
+        self.update = update
+        # Make verify() fail the test on a mismatch instead of only reporting it
+        self.fail_on_mismatch = fail_on_mismatch
+        self.tile_size = tile_size
+        self.max_changed_ratio = max_changed_ratio
+        self.min_ssim = min_ssim
+        self.results = []
+        # Baseline tile hashes, keyed by (path, mtime), so each baseline is hashed once per session
+        self._baseline_cache = {}
+
+    def baseline_path(self, platform, name, width, height):
+        return os.path.join(self.baselines_dir, platform, f"{width}x{height}", f"{name}.png")
+
+    def _baseline(self, path):
+        key = (path, os.path.getmtime(path))
+        if key not in self._baseline_cache:
+            pixels = load_image(path)
+            tiles = to_tiles(pixels, self.tile_size)
+            self._baseline_cache[key] = (pixels, tiles, tile_hashes(tiles))
+        return self._baseline_cache[key]
+
+    def check(self, capture_path, platform, name, width, height, test=None):
+        """Compare the image at ``capture_path`` with its baseline and return the result.
+
+        ``status`` is "match", "mismatch", "size mismatch" or, when there is no
+        baseline yet (or baselines are being updated), "new baseline".
+        """
+        start_time = time.time()
+        baseline = self.baseline_path(platform, name, width, height)
+        result = {
+            "test": test, "platform": platform, "name": name, "resolution": f"{width}x{height}",
+            "capture": capture_path, "baseline": baseline, "diff": None,
+            "changed_tiles": 0, "total_tiles": 0, "changed_pixels": 0, "changed_ratio": 0.0, "ssim": 1.0,
+        }
+
+        if self.update or not os.path.exists(baseline):
+            os.makedirs(os.path.dirname(baseline), exist_ok=True)
+            shutil.copyfile(capture_path, baseline)
+            result["status"] = "new baseline"
+            return self._finish(result, start_time)
+
+        baseline_pixels, baseline_tiles, baseline_hashes = self._baseline(baseline)
+        current = load_image(capture_path)
+        if current.shape != baseline_pixels.shape:
+            result["status"] = "size mismatch"
+            return self._finish(result, start_time)
+
+        current_tiles = to_tiles(current, self.tile_size)
+        changed_tiles = tile_hashes(current_tiles) != baseline_hashes
+        result["total_tiles"] = int(changed_tiles.size)
+        result["changed_tiles"] = int(changed_tiles.sum())
+
+        if result["changed_tiles"]:
+            # Pixel and structural comparison of the changed tiles only
+            before, after = baseline_tiles[changed_tiles], current_tiles[changed_tiles]
+            difference = np.abs(before.astype(np.int16) - after.astype(np.int16)).max(axis=-1)
+            result["changed_pixels"] = int((difference > PIXEL_THRESHOLD).sum())
+            result["changed_ratio"] = result["changed_pixels"] / (current.shape[0] * current.shape[1])
+            # Unchanged tiles have an SSIM of exactly 1
+            ssim = tile_ssim(before, after)
+            result["ssim"] = float((ssim.sum() + result["total_tiles"] - len(ssim)) / result["total_tiles"])
+
+        matched = result["changed_ratio"] <= self.max_changed_ratio and result["ssim"] >= self.min_ssim
+        result["status"] = "match" if matched else "mismatch"
+        if not matched:
+            changed_mask = np.abs(baseline_pixels.astype(np.int16) - current.astype(np.int16)).max(axis=-1)
+            result["diff"] = self._save_diff(
+                highlight(current, changed_mask > PIXEL_THRESHOLD, changed_tiles, self.tile_size),
+                platform, name, width, height
+            )
+        return self._finish(result, start_time)
+
+    def verify(self, capture_path, platform, name, width, height, test=None):
+        """check(), raising AssertionError on a mismatch when ``fail_on_mismatch`` is set."""
+        result = self.check(capture_path, platform, name, width, height, test=test)
+        if self.fail_on_mismatch and result["status"] in ("mismatch", "size mismatch"):
+            raise AssertionError(f"Visual regression: {format_result(result)}")
+        return result
+
+    def _save_diff(self, pixels, platform, name, width, height):
+        os.makedirs(self.diffs_dir, exist_ok=True)
+        path = os.path.join(self.diffs_dir, f"{platform}_{name}_{width}x{height}.png")
+        Image.fromarray(pixels).save(path)
+        return path
+
+    def _finish(self, result, start_time):
+        result["elapsed"] = time.time() - start_time
+        self.results.append(result)
+        logger.info(f"Visual check {result['platform']} {result['name']} {result['resolution']}: "
+                    f"{result['status']} ({result['changed_tiles']}/{result['total_tiles']} tiles changed, "
+                    f"SSIM {result['ssim']:.4f}, {result['elapsed'] * 1000:.0f} ms)")
+        return result
+
+    def results_for(self, test):
+        return [result for result in self.results if result["test"] == test]
+
+
+def format_result(result):
+    """One-line description of a check() result."""
+    return (f"{result['platform']} {result['name']} {result['resolution']}: {result['status']}, "
+            f"{result['changed_ratio']:.3%} pixels changed, SSIM {result['ssim']:.4f}")
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Minimal WebM writer for a single video track of already encoded frames.
+Writes the Matroska subset a browser needs to play and seek a file: the EBML
+header, a segment with a SeekHead, Info (with the duration), Tracks and Cues
+ahead of the clusters, and one cluster per key frame. Cues come first so the
+file is seekable while it is still being downloaded.
+"""
+
+import struct
+
+# Matroska element ids (already carrying their length marker)
+EBML = 0x1A45DFA3
+EBML_VERSION = 0x4286
+EBML_READ_VERSION = 0x42F7
+EBML_MAX_ID_LENGTH = 0x42F2
+EBML_MAX_SIZE_LENGTH = 0x42F3
+DOC_TYPE = 0x4282
+DOC_TYPE_VERSION = 0x4287
+DOC_TYPE_READ_VERSION = 0x4285
+SEGMENT = 0x18538067
+SEEK_HEAD = 0x114D9B74
+SEEK = 0x4DBB
+SEEK_ID = 0x53AB
+SEEK_POSITION = 0x53AC
+INFO = 0x1549A966
+TIMECODE_SCALE = 0x2AD7B1
+DURATION = 0x4489
+MUXING_APP = 0x4D80
+WRITING_APP = 0x5741
+TRACKS = 0x1654AE6B
+TRACK_ENTRY = 0xAE
+TRACK_NUMBER = 0xD7
+TRACK_UID = 0x73C5
+TRACK_TYPE = 0x83
+FLAG_LACING = 0x9C
+CODEC_ID = 0x86
+VIDEO = 0xE0
+PIXEL_WIDTH = 0xB0
+PIXEL_HEIGHT = 0xBA
+CUES = 0x1C53BB6B
+CUE_POINT = 0xBB
+CUE_TIME = 0xB3
+CUE_TRACK_POSITIONS = 0xB7
+CUE_TRACK = 0xF7
+CUE_CLUSTER_POSITION = 0xF1
+CLUSTER = 0x1F43B675
+TIMECODE = 0xE7
+SIMPLE_BLOCK = 0xA3
+
+# Timestamps are written in milliseconds
+TIMECODE_SCALE_NS = 1000000
+VIDEO_TRACK = 1
+# Width of positions inside the file, so that the layout does not depend on their values
+POSITION_BYTES = 8
+
+
+def encode_id(element_id):
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, "big")
+
+
+def encode_size(size):
+    """EBML variable-length integer of ``size`` in the fewest bytes."""
+    length = 1
+    # All ones is reserved for "unknown size"
+    while size >= (1 << (7 * length)) - 1:
+        length += 1
+    return (size | (1 << (7 * length))).to_bytes(length, "big")
+
+
+def element(element_id, payload):
+    return encode_id(element_id) + encode_size(len(payload)) + payload
+
+
+def uint(element_id, value, width=None):
+    width = width or max(1, (value.bit_length() + 7) // 8)
+    return element(element_id, value.to_bytes(width, "big"))
+
+
+def string(element_id, value):
+    return element(element_id, value.encode("ascii"))
+
+
+def simple_block(relative_ms, key, data):
+    """Frame of the video track ``relative_ms`` after its cluster's timecode."""
+    header = encode_size(VIDEO_TRACK) + struct.pack(">hB", relative_ms, 0x80 if key else 0)
+    return element(SIMPLE_BLOCK, header + data)
+
+
+def write_webm(path, frames, width, height, codec="V_VP8", duration_ms=None):
+    """Write ``frames`` (``[(timestamp_ms, is_key, data), ...]`` in order, starting with a key frame) to ``path``."""
+    if not frames or not frames[0][1]:
+        raise ValueError("A WebM stream has to start with a key frame")
+
+    clusters = []
+    for timestamp, key, data in frames:
+        # A new cluster at every key frame, or before the block's int16 relative time would overflow
+        if key or timestamp - clusters[-1][0] > 32767:
+            clusters.append((timestamp, []))
+        clusters[-1][1].append(simple_block(timestamp - clusters[-1][0], key, data))
+    clusters = [(timestamp, element(CLUSTER, uint(TIMECODE, timestamp) + b"".join(blocks)))
+                for timestamp, blocks in clusters]
+    if duration_ms is None:
+        duration_ms = frames[-1][0] + (frames[-1][0] - frames[-2][0] if len(frames) > 1 else 0)
+
+    ebml_header = element(EBML, uint(EBML_VERSION, 1) + uint(EBML_READ_VERSION, 1) + uint(EBML_MAX_ID_LENGTH, 4)
+                          + uint(EBML_MAX_SIZE_LENGTH, 8) + string(DOC_TYPE, "webm")
+                          + uint(DOC_TYPE_VERSION, 2) + uint(DOC_TYPE_READ_VERSION, 2))
+    info = element(INFO, uint(TIMECODE_SCALE, TIMECODE_SCALE_NS) + element(DURATION, struct.pack(">d", duration_ms))
+                   + string(MUXING_APP, "tvqa") + string(WRITING_APP, "tvqa"))
+    tracks = element(TRACKS, element(TRACK_ENTRY, uint(TRACK_NUMBER, VIDEO_TRACK) + uint(TRACK_UID, VIDEO_TRACK)
+                                     + uint(TRACK_TYPE, 1) + uint(FLAG_LACING, 0) + string(CODEC_ID, codec)
+                                     + element(VIDEO, uint(PIXEL_WIDTH, width) + uint(PIXEL_HEIGHT, height))))
+
+    def seek_head(positions):
+        return element(SEEK_HEAD, b"".join(
+            element(SEEK, element(SEEK_ID, encode_id(element_id)) + uint(SEEK_POSITION, position, POSITION_BYTES))
+            for element_id, position in positions))
+
+    def cues(positions):
+        return element(CUES, b"".join(
+            element(CUE_POINT, uint(CUE_TIME, timestamp, POSITION_BYTES) + element(
+                CUE_TRACK_POSITIONS, uint(CUE_TRACK, VIDEO_TRACK) + uint(CUE_CLUSTER_POSITION, position, POSITION_BYTES)))
+            for timestamp, position in positions))
+
+    # Positions are relative to the start of the segment's payload; with fixed-width positions
+    # the SeekHead and Cues have the same size whatever they point at
+    head_size = len(seek_head([(INFO, 0), (TRACKS, 0), (CUES, 0)]))
+    cues_size = len(cues([(timestamp, 0) for timestamp, _ in clusters]))
+    info_at = head_size
+    tracks_at = info_at + len(info)
+    cues_at = tracks_at + len(tracks)
+    cluster_positions = []
+    position = cues_at + cues_size
+    for timestamp, cluster in clusters:
+        cluster_positions.append((timestamp, position))
+        position += len(cluster)
+
+    payload = (seek_head([(INFO, info_at), (TRACKS, tracks_at), (CUES, cues_at)]) + info + tracks
+               + cues(cluster_positions) + b"".join(cluster for _, cluster in clusters))
+    with open(path, "wb") as f:
+        f.write(ebml_header + encode_id(SEGMENT) + encode_size(len(payload)) + payload)
+    return path
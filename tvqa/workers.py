@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Helpers for running under pytest-xdist.
+Each worker is a separate process, so per-session state (browser pools, stats)
+lives per worker and is handed to the controller through ``workeroutput``.
+"""
+
+import os
+import pytest
+from datetime import datetime
+
+_SHARED_KEY = pytest.StashKey()
+_RUN_ID_KEY = pytest.StashKey()
+_PREFIX = "tvqa:"
+
+
+def worker_id():
+    """Return the xdist worker id (gw0, gw1, ...) or "main" outside xdist."""
+    return os.environ.get("PYTEST_XDIST_WORKER") or os.environ.get("TVQA_WORKER") or "main"
+
+
+def worker_count():
+    """Return how many xdist workers take part in this run (1 without xdist)."""
+    return int(os.environ.get("PYTEST_XDIST_WORKER_COUNT", "1"))
+
+
+def run_id(config):
+    """Identifier of this test run, shared by the controller and all xdist workers.
+
+    run_tests.py passes one id to all of its pytest processes through TVQA_RUN_ID;
+    xdist workers receive the controller's id in ``workerinput``.
+    """
+    if _RUN_ID_KEY not in config.stash:
+        config.stash[_RUN_ID_KEY] = (
+            os.environ.get("TVQA_RUN_ID")
+            or getattr(config, "workerinput", {}).get("tvqa_run_id")
+            or new_run_id()
+        )
+    return config.stash[_RUN_ID_KEY]
+
+
+def new_run_id():
+    """Run identifier that sorts by start time."""
+    return datetime.now().strftime("%Y%m%d-%H%M%S-") + str(os.getpid())
+
+
+def is_worker(config):
+    """True when this process is an xdist worker rather than the controller."""
+    return hasattr(config, "workeroutput")
+
+
+def share(config, key, value):
+    """Hand a JSON-serialisable value to the process printing the summary."""
+    if is_worker(config):
+        config.workeroutput[_PREFIX + key] = value
+    else:
+        config.stash.setdefault(_SHARED_KEY, {}).setdefault(key, []).append((worker_id(), value))
+
+
+def collect_node(config, node):
+    """Store everything a finished xdist worker shared (call from pytest_testnodedown)."""
+    output = getattr(node, "workeroutput", None) or {}
+    node_id = node.workerinput.get("workerid", "?")
+    shared = config.stash.setdefault(_SHARED_KEY, {})
+    for key, value in output.items():
+        if key.startswith(_PREFIX):
+            shared.setdefault(key[len(_PREFIX):], []).append((node_id, value))
+
+
+def shared(config, key):
+    """Return ``[(worker_id, value), ...]`` for every process that shared ``key``."""
+    return config.stash.get(_SHARED_KEY, {}).get(key, [])